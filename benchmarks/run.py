@@ -0,0 +1,301 @@
+"""
+Suite de benchmarks du pipeline sur données synthétiques.
+
+Chaque scénario (type de buffer, mode de jointure, jeu de métriques) est exécuté de
+bout en bout avec run_pipeline, à froid (sans cache d'étapes, d'accrochage ni de
+points de reprise), dans un répertoire de travail temporaire. Le temps total et le
+temps de chaque étape (rapport du profiler) sont conservés ; la médiane sur
+--repeat exécutions est comparée à une référence enregistrée.
+
+Le temps d'import des points d'entrée (main, app), mesuré avec python -X importtime,
+est aussi contrôlé : budget par point d'entrée et modules lourds qui ne doivent pas
+être chargés au démarrage (pile réseau, visualisation).
+
+    python benchmarks/run.py --scale small --baseline benchmarks/baselines/small.json
+    python benchmarks/run.py --scale small --save-baseline
+"""
+import argparse
+import contextlib
+import copy
+import io
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+from typing import Dict, List, Optional
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCHMARKS_DIR)
+SRC_DIR = os.path.join(ROOT_DIR, "src")
+sys.path.insert(0, SRC_DIR)
+
+import synthetic  # noqa: E402
+
+BASELINES_DIR = os.path.join(BENCHMARKS_DIR, "baselines")
+OSM_FILENAME = "synthetic_grid.osm"
+
+METRIC_SETS = {
+    "counts": {
+        "count_columns": ["polygon_name as nbr_batiments"],
+        "count_distinct_columns": ["line_name as nbr_lignes", "polygon_name as nbr_polygones"],
+    },
+    "approximate_counts": {
+        "count_distinct_columns": [{"column": "line_name", "name": "nbr_lignes", "approximate": True},
+                                   {"column": "polygon_name", "name": "nbr_polygones", "approximate": True}],
+    },
+    "numeric": {
+        "sum_columns": ["population as population_totale"],
+        "mean_columns": ["lanes as voies_moyennes"],
+        "max_columns": ["population as population_max"],
+        "min_columns": ["lanes as voies_min"],
+        "std_columns": ["population as population_std"],
+    },
+    "weighted": {
+        "weighted_sum_columns": ["population as population_couverte", "length_m as longueur_couverte"],
+        "weighted_mean_columns": [{"column": "lanes", "weight": "length_m", "name": "voies_moyennes"}],
+    },
+    "quantiles": {
+        "quantile_columns": [{"column": "population", "quantiles": [0.5, 0.85, 0.95], "name": "population"},
+                             "length_m as longueur_mediane"],
+    },
+    "post_aggregation": {
+        "sum_columns": ["population as population_totale"],
+        "post_aggregation_metrics": {"ratio": [{"name": "densite", "numerator": "population_totale",
+                                                 "denominator": "area_km2"}]},
+    },
+}
+
+BUFFERS = {
+    "circular": {"buffer_type": "circular", "distance": 300},
+    "grid": {"buffer_type": "grid", "wide": 300, "length": 300},
+    "network": {"buffer_type": "network", "distance": 300, "osm_file": OSM_FILENAME},
+    "network_join": {"buffer_type": "network", "distance": 300, "osm_file": OSM_FILENAME,
+                     "join_mode": "network", "snap_tolerance": 100},
+    "isochrone": {"buffer_type": "isochrone", "travel_time": [3, 5], "speed": 4.5, "osm_file": OSM_FILENAME},
+}
+
+# Points d'entrée de src/ : budget d'import (secondes) et modules qui ne doivent pas être importés
+NETWORK_STACK = ("osmnx", "networkx", "scipy")
+IMPORT_BUDGETS = {
+    "main": {"budget_s": 1.2, "excluded": NETWORK_STACK + ("pydeck", "plotly")},
+    "app": {"budget_s": 1.2, "excluded": NETWORK_STACK + ("pydeck", "plotly", "utils.pipeline.stages")},
+}
+
+def scenarios() -> Dict[str, Dict]:
+    """Chaque type de buffer et mode de jointure avec les comptages, et chaque jeu de métriques en circulaire."""
+    selected = {f"{buffer_name}/counts": (buffer_name, "counts") for buffer_name in BUFFERS}
+    selected.update({f"circular/{metric_set}": ("circular", metric_set) for metric_set in METRIC_SETS})
+    return {name: build_config(*args) for name, args in selected.items()}
+
+def build_config(buffer_name: str, metric_set: str) -> Dict:
+    layer = dict(BUFFERS[buffer_name], geometry_type="Point", snap_cache=False, checkpoint=False)
+    config = {
+        "activate_visualisation": False,
+        "stage_cache": False,
+        "data_files": [{"name": name, "path": f"./data/input/geojson/{name}.geojson"}
+                       for name in ("lines_geojson", "points_geojson", "polygons_geojson")],
+        "filter_data_files": {},
+        "filter_global": [],
+        "buffer_layer": {"points_geojson": layer},
+        "join_layers": {"points": {"type": "contains"}, "linestrings": {"type": "intersects"},
+                        "polygons": {"type": "intersects"}, "multipolygons": {"type": "intersects"}},
+        "groupby_columns": ["buffer_id", "point_name"],
+        "post_aggregation_metrics": {},
+        "colors": {},
+    }
+    for key in ("sum", "max", "min", "mean", "std", "ratio", "multiply", "count", "count_distinct",
+                "weighted_sum", "weighted_mean", "quantile"):
+        config[f"{key}_columns"] = []
+    config.update(copy.deepcopy(METRIC_SETS[metric_set]))
+    return config
+
+def prepare_workspace(workspace: str, scale: synthetic.Scale, seed: int) -> None:
+    synthetic.write_dataset(workspace, scale, seed, osm_filename=OSM_FILENAME)
+    for directory in ("agg", "fusion", "buffers"):
+        os.makedirs(os.path.join(workspace, "data", "output", "data", directory), exist_ok=True)
+    os.makedirs(os.path.join(workspace, "data", "output", "visualisation"), exist_ok=True)
+
+def run_once(config: Dict) -> Dict:
+    """Exécution à froid : le cache Parquet des couches d'entrée et les caches disque sont supprimés."""
+    import utils.pipeline.stages as stages
+
+    for directory in ("./data/input/parquet", "./data/cache"):
+        shutil.rmtree(directory, ignore_errors=True)
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        run = stages.run_pipeline(config)
+    wall = time.perf_counter() - start
+
+    report = run.profiler.report()
+    return {
+        "wall_s": wall,
+        "stages": {entry["stage"]: entry["wall_s"] for entry in report["stages"]},
+        "rows": {entry["stage"]: entry["rows_out"] for entry in report["stages"]},
+        "max_rss_mb": report["max_rss_mb"],
+    }
+
+def run_scenario(config: Dict, repeat: int) -> Dict:
+    runs = [run_once(config) for _ in range(repeat)]
+    return {
+        "wall_s": round(statistics.median(run["wall_s"] for run in runs), 4),
+        "stages": {stage: round(statistics.median(run["stages"][stage] for run in runs), 4)
+                   for stage in runs[0]["stages"]},
+        "rows": runs[-1]["rows"],
+        "max_rss_mb": max(run["max_rss_mb"] or 0 for run in runs),
+    }
+
+def parse_importtime(output: str) -> Dict[str, float]:
+    """Temps d'import cumulé (secondes) de chaque module, d'après la sortie de python -X importtime."""
+    modules = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = int(cumulative) / 1e6
+    return modules
+
+def measure_imports(repeat: int) -> Dict:
+    """Médiane sur repeat interpréteurs neufs du temps d'import de chaque point d'entrée, et modules lourds chargés."""
+    results = {}
+    for module, budget in IMPORT_BUDGETS.items():
+        times, loaded = [], set()
+        for _ in range(repeat):
+            completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=SRC_DIR,
+                                       capture_output=True, text=True, check=True)
+            modules = parse_importtime(completed.stderr)
+            times.append(modules[module])
+            loaded.update(name for name in budget["excluded"] if name in modules)
+        results[module] = {"import_s": round(statistics.median(times), 4), "excluded_loaded": sorted(loaded)}
+    return results
+
+def check_imports(imports: Dict) -> List[str]:
+    """Dépassements du budget d'import et modules lourds chargés au démarrage."""
+    violations = []
+    for module, measured in imports.items():
+        budget = IMPORT_BUDGETS[module]["budget_s"]
+        if measured["import_s"] > budget:
+            violations.append(f"import {module} : {measured['import_s']:.3f} s > budget {budget:.3f} s")
+        if measured["excluded_loaded"]:
+            violations.append(f"import {module} : charge {', '.join(measured['excluded_loaded'])}")
+    return violations
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_suite(scale_name: str, seed: int, repeat: int, selected: Optional[List[str]] = None) -> Dict:
+    configs = scenarios()
+    if selected:
+        configs = {name: config for name, config in configs.items()
+                   if any(name == pattern or name.startswith(f"{pattern}/") for pattern in selected)}
+
+    results = {
+        "scale": scale_name,
+        "seed": seed,
+        "repeat": repeat,
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "scenarios": {},
+        "imports": measure_imports(repeat),
+    }
+    for module, measured in results["imports"].items():
+        print(f"{'import ' + module:<28} {measured['import_s']:8.3f} s")
+    cwd = os.getcwd()
+    workspace = tempfile.mkdtemp(prefix="mdf_bench_")
+    logging.disable(logging.WARNING)
+    try:
+        prepare_workspace(workspace, synthetic.SCALES[scale_name], seed)
+        os.chdir(workspace)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            # Exécution de chauffe (imports, initialisation de pyproj/GDAL), non mesurée ; les modules
+            # importés à la demande (pile réseau, visualisation) sont chargés ici pour tous les scénarios
+            import utils.buffer.isochrone, utils.buffer.network_join, utils.visualisation.visualisation  # noqa: F401
+            run_once(next(iter(configs.values())))
+            for name, config in configs.items():
+                results["scenarios"][name] = run_scenario(config, repeat)
+                print(f"{name:<28} {results['scenarios'][name]['wall_s']:8.3f} s")
+    finally:
+        logging.disable(logging.NOTSET)
+        os.chdir(cwd)
+        shutil.rmtree(workspace, ignore_errors=True)
+    return results
+
+def compare(results: Dict, baseline: Dict, tolerance: float, min_delta: float) -> List[str]:
+    """Régressions : temps (total ou d'étape) supérieur de plus de tolerance et de min_delta secondes à la référence."""
+    regressions = check_imports(results.get("imports", {}))
+    for module, measured in results.get("imports", {}).items():
+        reference = baseline.get("imports", {}).get(module)
+        if reference and measured["import_s"] > reference["import_s"] * (1 + tolerance) \
+                and measured["import_s"] - reference["import_s"] > min_delta:
+            regressions.append(f"import {module} : {reference['import_s']:.3f} s -> {measured['import_s']:.3f} s")
+    for name, scenario in results["scenarios"].items():
+        reference = baseline.get("scenarios", {}).get(name)
+        if reference is None:
+            continue
+        timings = [("total", scenario["wall_s"], reference["wall_s"])]
+        timings += [(stage, value, reference["stages"][stage]) for stage, value in scenario["stages"].items()
+                    if stage in reference["stages"]]
+        for label, value, reference_value in timings:
+            if value > reference_value * (1 + tolerance) and value - reference_value > min_delta:
+                regressions.append(f"{name} [{label}] : {reference_value:.3f} s -> {value:.3f} s "
+                                   f"(+{(value / reference_value - 1) * 100:.0f} %)")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks du pipeline sur données synthétiques.")
+    parser.add_argument("--scale", choices=sorted(synthetic.SCALES), default="small")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--scenario", action="append", help="Scénario ou type de buffer (ex. network, circular/numeric)")
+    parser.add_argument("--output", help="Fichier JSON des résultats")
+    parser.add_argument("--baseline", help="Référence à comparer (défaut : baselines/<scale>.json si présent)")
+    parser.add_argument("--save-baseline", action="store_true", help="Enregistre les résultats comme référence")
+    parser.add_argument("--tolerance", type=float, default=0.3)
+    parser.add_argument("--min-delta", type=float, default=0.15)
+    args = parser.parse_args()
+
+    results = run_suite(args.scale, args.seed, args.repeat, args.scenario)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+    baseline_path = args.baseline or os.path.join(BASELINES_DIR, f"{args.scale}.json")
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(baseline_path), exist_ok=True)
+        with open(baseline_path, "w") as file:
+            json.dump(results, file, indent=2)
+        print(f"Référence enregistrée : {baseline_path}")
+    elif os.path.exists(baseline_path):
+        with open(baseline_path) as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline, args.tolerance, args.min_delta)
+        print(f"Comparaison avec {baseline_path} (commit {baseline.get('commit')}) : "
+              f"{len(regressions)} régression(s)")
+        for regression in regressions:
+            print(f"  {regression}")
+        if regressions:
+            sys.exit(1)
+    else:
+        violations = check_imports(results["imports"])
+        for violation in violations:
+            print(f"  {violation}")
+        if violations:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
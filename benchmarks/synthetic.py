@@ -0,0 +1,138 @@
+"""
+Générateur de données de mobilité synthétiques et reproductibles (graine fixe).
+
+Toutes les couches sont posées sur une grille de rues régulière centrée sur le
+centre-ville de Montréal :
+- points : arrêts proches des intersections (capacité, achalandage, type) ;
+- lignes : tronçons de rue entre deux intersections voisines (nom de ligne, nombre de voies) ;
+- polygones : bâtiments rectangulaires dans les îlots (catégorie, population) ;
+- réseau : la grille elle-même au format OSM XML, lisible par osmnx (osm_file).
+"""
+import argparse
+import os
+from dataclasses import dataclass
+from typing import Dict
+
+import geopandas as gpd
+import numpy as np
+from shapely.geometry import LineString, Point, box
+
+CENTER_LAT, CENTER_LON = 45.5017, -73.5673
+METERS_PER_DEGREE = 111320.0
+
+POINT_TYPES = ["bus_stop", "metro_station", "bike_station"]
+HIGHWAYS = ["residential", "secondary", "primary"]
+CATEGORIES = ["residential", "commercial", "office", "school"]
+
+@dataclass(frozen=True)
+class Scale:
+    grid_size: int       # intersections par côté
+    spacing: float       # mètres entre deux intersections
+    points: int
+    lines: int
+    polygons: int
+
+SCALES = {
+    "tiny": Scale(grid_size=15, spacing=100.0, points=10, lines=200, polygons=50),
+    "small": Scale(grid_size=30, spacing=100.0, points=50, lines=1500, polygons=300),
+    "medium": Scale(grid_size=60, spacing=100.0, points=200, lines=6000, polygons=1500),
+    "large": Scale(grid_size=120, spacing=100.0, points=1000, lines=25000, polygons=8000),
+}
+
+def _degrees(scale: Scale):
+    dlat = scale.spacing / METERS_PER_DEGREE
+    dlon = scale.spacing / (METERS_PER_DEGREE * np.cos(np.radians(CENTER_LAT)))
+    lat0 = CENTER_LAT - dlat * (scale.grid_size - 1) / 2
+    lon0 = CENTER_LON - dlon * (scale.grid_size - 1) / 2
+    return lat0, lon0, dlat, dlon
+
+def generate_layers(scale: Scale, seed: int = 42) -> Dict[str, gpd.GeoDataFrame]:
+    """Couches 'points_geojson', 'lines_geojson' et 'polygons_geojson' (EPSG:4326)."""
+    rng = np.random.default_rng(seed)
+    lat0, lon0, dlat, dlon = _degrees(scale)
+    n = scale.grid_size
+
+    # Arrêts : intersection tirée au hasard, décalée de moins d'un quart d'îlot
+    cells = rng.integers(0, n, size=(scale.points, 2))
+    jitter = rng.uniform(-0.25, 0.25, size=(scale.points, 2))
+    points = gpd.GeoDataFrame({
+        "point_name": [f"Arrêt {i + 1}" for i in range(scale.points)],
+        "point_type": rng.choice(POINT_TYPES, scale.points),
+        "capacity": rng.integers(10, 200, scale.points),
+        "ridership": np.round(rng.gamma(2.0, 150.0, scale.points), 1),
+    }, geometry=[Point(lon0 + (j + dj) * dlon, lat0 + (i + di) * dlat)
+                 for (i, j), (di, dj) in zip(cells, jitter)], crs="EPSG:4326")
+
+    # Tronçons : une arête de la grille (horizontale ou verticale)
+    starts = rng.integers(0, n - 1, size=(scale.lines, 2))
+    horizontal = rng.random(scale.lines) < 0.5
+    ends = starts + np.column_stack([~horizontal, horizontal]).astype(int)
+    lines = gpd.GeoDataFrame({
+        "line_name": [f"Ligne {k}" for k in rng.integers(1, max(2, scale.lines // 20), scale.lines)],
+        "highway": rng.choice(HIGHWAYS, scale.lines, p=[0.7, 0.2, 0.1]),
+        "lanes": rng.integers(1, 5, scale.lines),
+        "length_m": np.full(scale.lines, scale.spacing),
+    }, geometry=[LineString([(lon0 + a[1] * dlon, lat0 + a[0] * dlat), (lon0 + b[1] * dlon, lat0 + b[0] * dlat)])
+                 for a, b in zip(starts, ends)], crs="EPSG:4326")
+
+    # Bâtiments : rectangle à l'intérieur d'un îlot
+    blocks = rng.integers(0, n - 1, size=(scale.polygons, 2))
+    offsets = rng.uniform(0.1, 0.5, size=(scale.polygons, 2))
+    sizes = rng.uniform(0.1, 0.4, size=(scale.polygons, 2))
+    polygons = gpd.GeoDataFrame({
+        "polygon_name": [f"Bâtiment {i + 1}" for i in range(scale.polygons)],
+        "category": rng.choice(CATEGORIES, scale.polygons),
+        "population": rng.integers(0, 500, scale.polygons),
+        "area_m2": np.round(sizes[:, 0] * sizes[:, 1] * scale.spacing ** 2, 1),
+    }, geometry=[box(lon0 + (j + oj) * dlon, lat0 + (i + oi) * dlat,
+                     lon0 + (j + oj + sj) * dlon, lat0 + (i + oi + si) * dlat)
+                 for (i, j), (oi, oj), (si, sj) in zip(blocks, offsets, sizes)], crs="EPSG:4326")
+
+    return {"points_geojson": points, "lines_geojson": lines, "polygons_geojson": polygons}
+
+def street_grid_osm(scale: Scale) -> str:
+    """Réseau en grille (grid_size x grid_size intersections) au format OSM XML."""
+    lat0, lon0, dlat, dlon = _degrees(scale)
+    n = scale.grid_size
+    node_id = lambda i, j: i * n + j + 1
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>', '<osm version="0.6" generator="MobilityDataFusion benchmarks">']
+    for i in range(n):
+        for j in range(n):
+            lines.append(f'<node id="{node_id(i, j)}" lat="{lat0 + i * dlat:.7f}" lon="{lon0 + j * dlon:.7f}" version="1"/>')
+    way_id = 1
+    for k in range(n):
+        for refs in ([node_id(k, j) for j in range(n)], [node_id(i, k) for i in range(n)]):
+            nds = "".join(f'<nd ref="{ref}"/>' for ref in refs)
+            lines.append(f'<way id="{way_id}" version="1">{nds}<tag k="highway" v="residential"/></way>')
+            way_id += 1
+    lines.append('</osm>')
+    return "\n".join(lines)
+
+def write_dataset(workspace: str, scale: Scale, seed: int = 42, osm_filename: str = "synthetic_grid.osm") -> Dict[str, str]:
+    """
+    Écrit les couches dans <workspace>/data/input/geojson et le réseau dans
+    <workspace>/utils/buffer/networks (l'arborescence attendue par le pipeline,
+    exécuté depuis <workspace>). Retourne le chemin relatif de chaque couche.
+    """
+    input_dir = os.path.join(workspace, "data", "input", "geojson")
+    networks_dir = os.path.join(workspace, "utils", "buffer", "networks")
+    os.makedirs(input_dir, exist_ok=True)
+    os.makedirs(networks_dir, exist_ok=True)
+
+    paths = {}
+    for name, gdf in generate_layers(scale, seed).items():
+        gdf.to_file(os.path.join(input_dir, f"{name}.geojson"), driver="GeoJSON")
+        paths[name] = f"./data/input/geojson/{name}.geojson"
+    with open(os.path.join(networks_dir, osm_filename), "w") as file:
+        file.write(street_grid_osm(scale))
+    return paths
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Génère un jeu de données synthétique reproductible.")
+    parser.add_argument("workspace", help="Répertoire de travail (data/input/geojson et utils/buffer/networks y sont créés)")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    for name, path in write_dataset(args.workspace, SCALES[args.scale], args.seed).items():
+        print(f"{name}: {path}")
@@ -801,6 +801,32 @@ const App = () => {
     setFormData(updatedFormData);
   };
 
+  // Interroge /jobs/<id> jusqu'à la fin de la tâche en affichant l'étape en cours
+  const waitForJob = (jobId) => new Promise((resolve, reject) => {
+    const poll = () => {
+      fetch(`http://127.0.0.1:5000/jobs/${jobId}`)
+        .then(response => {
+          if (!response.ok) throw new Error('Network response was not ok');
+          return response.json();
+        })
+        .then(job => {
+          if (job.status === 'succeeded') {
+            resolve(job);
+          } else if (job.status === 'failed' || job.status === 'cancelled') {
+            reject(new Error(job.error || `Job ${job.status}`));
+          } else {
+            const { completed, total, current_stage } = job.progress;
+            setSubmitMessage(job.status === 'queued'
+              ? 'Job queued...'
+              : `Running ${current_stage || '...'} (${completed}/${total} stages)`);
+            setTimeout(poll, 1000);
+          }
+        })
+        .catch(reject);
+    };
+    poll();
+  });
+
   const onSubmit = ({ formData }) => {
     const bufferLayerData = {
       [formData.buffer_layer.layer_name]: {
@@ -862,9 +888,10 @@ const App = () => {
       if (!response.ok) throw new Error('Network response was not ok');
       return response.json();
     })
-    .then(data => {
-      setSubmitMessage('Configuration submitted successfully!');
-      console.log('Success:', data);
+    .then(data => waitForJob(data.job_id))
+    .then(job => {
+      setSubmitMessage(`Configuration executed successfully (${job.elapsed_s} s)`);
+      console.log('Success:', job);
 
       const bufferType = formData.buffer_layer.buffer_type;
       let fetchParams;
@@ -1,39 +1,99 @@
 import logging
-from flask import Flask, jsonify, request, send_from_directory
-import yaml
+from flask import Flask, Response, jsonify, request, send_from_directory
+from werkzeug.http import is_resource_modified
 from flask_cors import CORS
-import subprocess
 import os
 import json
-from geopandas import GeoDataFrame
 import geopandas as gpd
-import utils.metrics.metrics as metrics
-import utils.visualisation.visualisation as visualisation
-import pandas as pd
+import utils.metrics.chart_cache as chart_cache
+import utils.gdf.dataset_cache as dataset_cache
+import utils.gdf.geojson_cache as geojson_cache
+import utils.pipeline.jobs as jobs
+import utils.visualisation.tiles as tiles
 
 app = Flask(__name__)
+# Jeux de données chargés (GeoJSON, aperçus, table de fusion), partagés entre les requêtes
+datasets = dataset_cache.DatasetCache()
+# Tables par groupe des histogrammes et bar charts, partagées entre les requêtes
+chart_aggregates = chart_cache.ChartAggregateCache(datasets=datasets)
+# Corps GeoJSON (compressés, par précision, emprise et page) gardés dans le cache de jeux de données
+geojson_responses = geojson_cache.GeoJSONResponseCache(datasets=datasets)
+# Exécutions du pipeline en arrière-plan, chacune dans son espace de travail, par des
+# moteurs résidents qui gardent couches et réseaux en mémoire d'une soumission à l'autre
+job_manager = jobs.JobManager(engine=True)
+# Tuiles vectorielles des couches, calculées à la demande et conservées sur disque
+vector_tiles = tiles.VectorTileCache(datasets=datasets)
 CORS(app, resources={r"/*": {"origins": "http://localhost:3000"}})
 logging.basicConfig(level=logging.DEBUG)
 
 @app.route('/submit', methods=['POST'])
 def submit():
+    """
+    Soumet la configuration comme tâche asynchrone et retourne son id (202) ; l'avancement
+    se suit avec GET /jobs/<id>. ?wait=true attend la fin de la tâche (ancien comportement).
+    """
     try:
         data = request.json
         print("Configuration reçue du frontend :", data)
-        with open('config.yaml', 'w') as file:
-            yaml.dump(data, file)
-        
-        process = subprocess.Popen(['python3', 'main.py'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        stdout, stderr = process.communicate()
-        
-        if process.returncode != 0:
-            raise Exception(f"Erreur lors de l'exécution de main.py: {stderr.decode()}")
-        
-        return jsonify({"message": "Configuration saved and main.py executed", "output": stdout.decode()}), 200
+        job = job_manager.submit(data)
+
+        if request.args.get('wait', '').lower() in ('1', 'true'):
+            job_manager.wait(job.id)
+            if job.status != jobs.SUCCEEDED:
+                raise Exception(f"Erreur lors de l'exécution de main.py: {job.error or job.status}")
+            return jsonify({"message": "Configuration saved and main.py executed", "job_id": job.id,
+                            "output": "\n".join(job.log)}), 200
+
+        return jsonify({"message": "Job submitted", "job_id": job.id, "status": job.status,
+                        "status_url": f"/jobs/{job.id}"}), 202
     except Exception as e:
         logging.error(f"An error occurred: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/jobs', methods=['GET'])
+def list_jobs():
+    return jsonify([job.to_dict(log_lines=0) for job in job_manager.list()]), 200
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Job {job_id} not found"}), 404
+    return jsonify(job.to_dict()), 200
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    job = job_manager.cancel(job_id)
+    if job is None:
+        return jsonify({"error": f"Job {job_id} not found"}), 404
+    return jsonify(job.to_dict(log_lines=0)), 200
+
+@app.route('/jobs/<job_id>/files/<path:filename>', methods=['GET'])
+def get_job_file(job_id, filename):
+    """Fichier de sortie d'une tâche (ex. data/agg/circular_buffer_200m.csv), lu dans son espace de travail."""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Job {job_id} not found"}), 404
+    return send_from_directory(os.path.join(job.workspace, 'data', 'output'), filename)
+
+@app.route('/get_run_report', methods=['GET'])
+def get_run_report():
+    try:
+        report_path = './data/output/run_report.json'
+        if not os.path.exists(report_path):
+            return jsonify({"error": "Run report not found. Run main.py first."}), 404
+
+        with open(report_path, 'r') as file:
+            return jsonify(json.load(file)), 200
+    except Exception as e:
+        logging.error(f"An error occurred while loading the run report: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/get_cache_stats', methods=['GET'])
+def get_cache_stats():
+    return jsonify({"datasets": datasets.stats(), "chart_aggregates": chart_aggregates.stats(),
+                    "vector_tiles": vector_tiles.stats()}), 200
+
 @app.route('/list_files', methods=['GET'])
 def list_files():
     try:
@@ -45,34 +105,80 @@ def list_files():
         logging.error(f"An error occurred while listing files: {str(e)}")
         return jsonify({"error": "Failed to list files"}), 500
 
+def find_layer_file(filename):
+    """Fichier d'une couche : GeoJSON d'entrée, puis buffer (output), puis table de fusion ('fusion')."""
+    # Chercher le fichier GeoJSON dans les répertoires input et output
+    input_dir = './data/input/geojson/'
+    output_dir = './data/output/data/buffers/'
+
+    # Essayer d'abord dans le répertoire input
+    file_path = os.path.join(input_dir, f'{filename}.geojson')
+
+    # Si pas trouvé, essayer dans le répertoire output (pour les buffers)
+    if not os.path.exists(file_path):
+        file_path = os.path.join(output_dir, f'{filename}.geojson')
+
+    if not os.path.exists(file_path) and filename == 'fusion':
+        file_path = chart_cache.FUSION_GDF_PATH
+
+    return file_path if os.path.exists(file_path) else None
+
 @app.route('/get_geojson_data/<filename>', methods=['GET'])
 def get_geojson_data(filename):
+    """
+    GeoJSON d'une couche d'entrée ou d'un buffer. Paramètres optionnels : precision
+    (décimales des coordonnées), bbox=minx,miny,maxx,maxy, limit et offset.
+    """
     try:
-        # Chercher le fichier GeoJSON dans les répertoires input et output
-        input_dir = './data/input/geojson/'
-        output_dir = './data/output/data/buffers/'
-        
-        # Essayer d'abord dans le répertoire input
-        file_path = os.path.join(input_dir, f'{filename}.geojson')
-        
-        # Si pas trouvé, essayer dans le répertoire output (pour les buffers)
-        if not os.path.exists(file_path):
-            file_path = os.path.join(output_dir, f'{filename}.geojson')
-        
-        if not os.path.exists(file_path):
+        file_path = find_layer_file(filename)
+        if file_path is None or not file_path.endswith('.geojson'):
             return jsonify({'error': f'Fichier {filename} non trouvé'}), 404
-        
-        # Charger le GeoJSON
-        gdf = gpd.read_file(file_path)
-        
-        # Convertir en GeoJSON
-        geojson_data = gdf.to_json()
-        
-        return geojson_data
+
+        query = geojson_responses.query(request.args)
+        etag, last_modified = geojson_responses.validators(file_path, query)
+        return conditional_response(etag, last_modified, lambda: geojson_responses.bodies(file_path, query),
+                                    mimetype='application/geo+json')
+    except ValueError as ve:
+        return jsonify({'error': str(ve)}), 400
     except Exception as e:
         logging.error(f"An error occurred while loading GeoJSON data: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+def conditional_response(etag, last_modified, build_bodies, mimetype='application/json'):
+    """
+    304 si le client a déjà cette version (If-None-Match, If-Modified-Since) ; sinon le
+    corps dans l'encodage accepté par le client (brotli, gzip ou brut).
+    """
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = Response(status=304)
+    else:
+        bodies = build_bodies()
+        encoding = geojson_cache.negotiate_encoding(request.accept_encodings, bodies)
+        response = Response(bodies[encoding], mimetype=mimetype)
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag, weak=True)
+    response.last_modified = last_modified
+    # Le navigateur garde la réponse mais la revalide à chaque utilisation
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Accept-Encoding')
+    return response
+
+@app.route('/tiles/<layer>/<int:z>/<int:x>/<int:y>.mvt', methods=['GET'])
+def get_vector_tile(layer, z, x, y):
+    """Tuile vectorielle (Mapbox Vector Tile) z/x/y d'une couche d'entrée, d'un buffer ou de la table de fusion."""
+    try:
+        file_path = find_layer_file(layer)
+        if file_path is None:
+            return jsonify({'error': f'Couche {layer} non trouvée'}), 404
+        data = vector_tiles.tile(layer, file_path, z, x, y)
+        return Response(data, mimetype=tiles.MIME_TYPE)
+    except ValueError as ve:
+        return jsonify({'error': str(ve)}), 400
+    except Exception as e:
+        logging.error(f"An error occurred while building vector tile {layer}/{z}/{x}/{y}: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/list_buffer_files', methods=['GET'])
 def list_buffer_files():
     try:
@@ -80,8 +186,11 @@ def list_buffer_files():
         if not os.path.exists(buffer_dir):
             return jsonify([])
         
-        files = [f.replace('.geojson', '') for f in os.listdir(buffer_dir) if f.endswith('.geojson')]
-        return jsonify(files)
+        files = sorted(f for f in os.listdir(buffer_dir) if f.endswith('.geojson'))
+        names = [f.replace('.geojson', '') for f in files]
+        # Version de la liste : noms, tailles et dates de modification des fichiers
+        etag, last_modified = geojson_cache.validators([os.path.join(buffer_dir, f) for f in files], "buffers")
+        return conditional_response(etag, last_modified, lambda: geojson_cache.encode_bodies(json.dumps(names).encode()))
     except Exception as e:
         logging.error(f"An error occurred while listing buffer files: {str(e)}")
         return jsonify({'error': str(e)}), 500
@@ -114,36 +223,19 @@ def generate_histogram():
         if not histogram_config or 'columns' not in histogram_config:
             return jsonify({"error": "Missing or invalid histogram_config. 'columns' is required."}), 400
 
-        # Define the path to the GeoDataFrame
-        fusion_gdf_path = './data/output/fusion_gdf.parquet'
-        if not os.path.exists(fusion_gdf_path):
+        # Table par groupe matérialisée : la table de fusion n'est lue qu'une fois par (groupby, agrégation)
+        if not os.path.exists(chart_aggregates.path):
             return jsonify({"error": "Fusion GeoDataFrame not found. Run main.py first."}), 400
-
-        # Load the GeoDataFrame
-        fusion_gdf = gpd.read_parquet(fusion_gdf_path)
-
-        # Log basic info for debugging
-        logging.info(f"Loaded fusion_gdf with columns: {list(fusion_gdf.columns)}")
-        logging.info(f"Sample data:\n{fusion_gdf.head().to_string()}")
-
-        # Validate requested columns exist in the GeoDataFrame
         requested_columns = histogram_config.get('columns', [])
-        missing_columns = [col for col in requested_columns if col not in fusion_gdf.columns]
+        missing_columns = [col for col in requested_columns if col not in chart_aggregates.columns()]
         if missing_columns:
             return jsonify({"error": f"Columns not found in GeoDataFrame: {missing_columns}"}), 400
 
-        # Convert columns to numeric where possible, coercing errors to NaN
-        for col in requested_columns:
-            if col in fusion_gdf.columns:
-                fusion_gdf[col] = pd.to_numeric(fusion_gdf[col], errors='coerce')
-                logging.info(f"Column '{col}' after conversion: {fusion_gdf[col].dtype}")
-                logging.info(f"Sample values for '{col}': {fusion_gdf[col].head(10).tolist()}")
-                logging.info(f"NaN count in '{col}': {fusion_gdf[col].isna().sum()}")
-
-        # Calculate histogram data (assumed to be a function in metrics module)
-        histogram_data = metrics.calculate_histogram_data(fusion_gdf, histogram_config)
+        histogram_data = chart_aggregates.histogram_data(histogram_config)
+        logging.info(f"Chart aggregate cache: {chart_aggregates.stats()}")
 
-        # Generate histograms for each column
+        # Generate histograms for each column (plotly chargé à la première requête de graphique)
+        import utils.visualisation.visualisation as visualisation
         generated_histograms = {}
         for col in requested_columns:
             try:
@@ -182,27 +274,25 @@ def get_histogram_html(filename):
 def get_file_preview(filename):
     try:
         filepath = os.path.join('./data/input/geojson/', filename + '.geojson')
-        gdf = GeoDataFrame.from_file(filepath)
-        
-        geojson = json.loads(gdf.head(100).to_json())
-        
-        columns = list(gdf.columns)
-        
-        data = []
-        for feature in geojson['features']:
-            row = feature['properties'].copy()
-            row['geometry'] = feature['geometry']
-            data.append(row)
-        
-        return jsonify({
-            'columns': columns,
-            'data': data
-        }), 200
+        return jsonify(datasets.get(filepath, read_file_preview, kind="preview")), 200
         
     except Exception as e:
         logging.error(f"Error getting file preview: {str(e)}")
         return jsonify({"error": str(e)}), 500
     
+def read_file_preview(filepath, rows=100):
+    """Colonnes et premières lignes d'un fichier (seules ces lignes sont lues)."""
+    gdf = gpd.read_file(filepath, rows=rows)
+    geojson = json.loads(gdf.to_json())
+
+    data = []
+    for feature in geojson['features']:
+        row = feature['properties'].copy()
+        row['geometry'] = feature['geometry']
+        data.append(row)
+
+    return {'columns': list(gdf.columns), 'data': data}
+
 @app.route('/generate_barchart', methods=['POST'])
 def generate_barchart():
     try:
@@ -211,36 +301,19 @@ def generate_barchart():
         if not barchart_config or 'columns' not in barchart_config:
             return jsonify({"error": "Missing or invalid barchart_config. 'columns' is required."}), 400
         
-        # Define the path to the GeoDataFrame
-        fusion_gdf_path = './data/output/fusion_gdf.parquet'
-        if not os.path.exists(fusion_gdf_path):
+        # Table par groupe matérialisée : la table de fusion n'est lue qu'une fois par (groupby, agrégation)
+        if not os.path.exists(chart_aggregates.path):
             return jsonify({"error": "Fusion GeoDataFrame not found. Run main.py first."}), 400
-
-        # Load the GeoDataFrame
-        fusion_gdf = gpd.read_parquet(fusion_gdf_path)
-
-        # Log basic info for debugging
-        logging.info(f"Loaded fusion_gdf with columns: {list(fusion_gdf.columns)}")
-        logging.info(f"Sample data:\n{fusion_gdf.head().to_string()}")
-
-        # Validate requested columns exist in the GeoDataFrame
         requested_columns = barchart_config.get('columns', [])
-        missing_columns = [col for col in requested_columns if col not in fusion_gdf.columns]
+        missing_columns = [col for col in requested_columns if col not in chart_aggregates.columns()]
         if missing_columns:
             return jsonify({"error": f"Columns not found in GeoDataFrame: {missing_columns}"}), 400
 
-        # Convert columns to numeric where possible, coercing errors to NaN
-        for col in requested_columns:
-            if col in fusion_gdf.columns:
-                fusion_gdf[col] = pd.to_numeric(fusion_gdf[col], errors='coerce')
-                logging.info(f"Column '{col}' after conversion: {fusion_gdf[col].dtype}")
-                logging.info(f"Sample values for '{col}': {fusion_gdf[col].head(10).tolist()}")
-                logging.info(f"NaN count in '{col}': {fusion_gdf[col].isna().sum()}")
-
-        # Calculate bar chart data
-        barchart_data = metrics.calculate_barchart_data(fusion_gdf, barchart_config)
+        barchart_data = chart_aggregates.barchart_data(barchart_config)
+        logging.info(f"Chart aggregate cache: {chart_aggregates.stats()}")
 
-        # Generate bar charts for each column
+        # Generate bar charts for each column (plotly chargé à la première requête de graphique)
+        import utils.visualisation.visualisation as visualisation
         generated_barcharts = {}
         for col in requested_columns:
             try:
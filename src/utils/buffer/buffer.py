@@ -1,10 +1,13 @@
+import logging
 import geopandas as gpd
 import itertools
 import utils.buffer.buffer as buffer
 import utils.buffer.grid as grid
 import geopandas as gpd
-import utils.buffer.isochrone as isochrone
-import utils.buffer.network as network
+# isochrone et network (osmnx, networkx, scipy) sont importés dans les branches qui les utilisent :
+# un buffer circulaire ou en grille ne charge pas la pile réseau
+
+logger = logging.getLogger(__name__)
 
 def apply_points_buffer(points_gdf: gpd.GeoDataFrame, layer_name: str, buffer_layers: dict) -> gpd.GeoDataFrame:
     buffer_gdf = points_gdf.copy()
@@ -29,9 +32,9 @@ def apply_points_buffer(points_gdf: gpd.GeoDataFrame, layer_name: str, buffer_la
                 buffer_gdf = buffer_gdf.to_crs(epsg=4326)
 
             except Exception as e:
-                print(f"Erreur lors de la reprojection ou du buffer : {e}")
+                logger.error(f"Erreur lors de la reprojection ou du buffer : {e}")
         else:
-            print(f"Le type de géométrie '{geometry_type}' n'est pas supporté pour cette couche.")
+            logger.warning(f"Le type de géométrie '{geometry_type}' n'est pas supporté pour cette couche.")
     
     return buffer_gdf
 
@@ -56,9 +59,9 @@ def apply_linestring_buffer(linestrings_gdf: gpd.GeoDataFrame, layer_name: str,
                 buffer_gdf = buffer_gdf.to_crs(epsg=4326)
 
             except Exception as e:
-                print(f"Erreur lors de la reprojection ou du buffer : {e}")
+                logger.error(f"Erreur lors de la reprojection ou du buffer : {e}")
         else:
-            print(f"Le type de géométrie '{geometry_type}' n'est pas supporté pour cette couche.")
+            logger.warning(f"Le type de géométrie '{geometry_type}' n'est pas supporté pour cette couche.")
     
     return buffer_gdf
 
@@ -90,9 +93,9 @@ def apply_polygon_buffer(polygon_gdf: gpd.GeoDataFrame, layer_name: str, buffer_
                 buffer_gdf = buffer_gdf.to_crs(epsg=4326)
 
             except Exception as e:
-                print(f"Erreur lors de la reprojection ou du buffer : {e}")
+                logger.error(f"Erreur lors de la reprojection ou du buffer : {e}")
         else:
-            print(f"Le type de géométrie '{geometry_type}' n'est pas supporté pour cette couche.")
+            logger.warning(f"Le type de géométrie '{geometry_type}' n'est pas supporté pour cette couche.")
     
     return buffer_gdf
 
@@ -210,6 +213,7 @@ def create_buffers(gdf, buffer_layer):
                     buffer_gdfs[key]["area_km2"] = buffer_gdf.geometry.area / 1_000_000  # Assume already in a projected CRS
 
         elif geometry_type == "Point" and buffer_type == "isochrone":
+            import utils.buffer.isochrone as isochrone
             buffer_gdfs = {
                 f"{layer_name}_buffer": isochrone.apply_points_isochrones(gdf[layer_name], layer_name, buffer_layer)
                 .assign(layer_name=f"{layer_name}_buffer",
@@ -236,6 +240,7 @@ def create_buffers(gdf, buffer_layer):
                     buffer_gdfs[key]["area_km2"] = buffer_gdf.geometry.area / 1_000_000  # Assume already in a projected CRS
 
         elif geometry_type == "LineString" and buffer_type == "isochrone":
+            import utils.buffer.isochrone as isochrone
             buffer_gdfs = {
                 f"{layer_name}_buffer": isochrone.apply_lines_isochrones(gdf[layer_name], layer_name, buffer_layer)
                 .assign(layer_name=f"{layer_name}_buffer",
@@ -262,6 +267,7 @@ def create_buffers(gdf, buffer_layer):
                     buffer_gdfs[key]["area_km2"] = buffer_gdf.geometry.area / 1_000_000  # Assume already in a projected CRS
 
         elif geometry_type == "Polygon" and buffer_type == "isochrone":
+            import utils.buffer.isochrone as isochrone
             buffer_gdfs = {
                 f"{layer_name}_buffer": isochrone.apply_polygon_isochrones(gdf[layer_name], layer_name, buffer_layer)
                 .assign(layer_name=f"{layer_name}_buffer",
@@ -288,6 +294,7 @@ def create_buffers(gdf, buffer_layer):
                     buffer_gdfs[key]["area_km2"] = buffer_gdf.geometry.area / 1_000_000  # Assume already in a projected CRS
 
         elif geometry_type == "Point" and buffer_type == "network":
+            import utils.buffer.network as network
             buffer_gdfs = {
                 f"{layer_name}_buffer": network.apply_points_network_buffer(gdf[layer_name], layer_name, buffer_layer)
                 .assign(layer_name=f"{layer_name}_buffer",
@@ -314,6 +321,7 @@ def create_buffers(gdf, buffer_layer):
                     buffer_gdfs[key]["area_km2"] = buffer_gdf.geometry.area / 1_000_000  # Assume already in a projected CRS
 
         elif geometry_type == "LineString" and buffer_type == "network":
+            import utils.buffer.network as network
             buffer_gdfs = {
                 f"{layer_name}_buffer": network.apply_lines_network_buffer(gdf[layer_name], layer_name, buffer_layer)
                 .assign(layer_name=f"{layer_name}_buffer",
@@ -340,6 +348,7 @@ def create_buffers(gdf, buffer_layer):
                     buffer_gdfs[key]["area_km2"] = buffer_gdf.geometry.area / 1_000_000  # Assume already in a projected CRS
 
         elif geometry_type == "Polygon" and buffer_type == "network":
+            import utils.buffer.network as network
             buffer_gdfs = {
                 f"{layer_name}_buffer": network.apply_polygons_network_buffer(gdf[layer_name], layer_name, buffer_layer)
                 .assign(layer_name=f"{layer_name}_buffer",
@@ -366,6 +375,7 @@ def create_buffers(gdf, buffer_layer):
                     buffer_gdfs[key]["area_km2"] = buffer_gdf.geometry.area / 1_000_000  # Assume already in a projected CRS
 
         elif geometry_type == "Polygon" and buffer_type == "network":
+            import utils.buffer.network as network
             buffer_gdfs = {
                 f"{layer_name}_buffer": network.apply_polygons_network_buffer(gdf[layer_name], layer_name, buffer_layer)
                 .assign(layer_name=f"{layer_name}_buffer",
@@ -1,13 +1,18 @@
+import logging
 import utils.buffer.buffer as buffer
+import utils.pipeline.profiler as profiler
 from typing import Dict, Union
 import geopandas as gpd
 import os
 
+logger = logging.getLogger(__name__)
+
 def calculate_buffer(buffer_layer: Dict[str, Dict[str, str]],
                      points_gdfs: gpd.GeoDataFrame,
                      polygons_gdfs: gpd.GeoDataFrame,
                      multipolygons_gdfs: gpd.GeoDataFrame,
-                     linestrings_gdfs: gpd.GeoDataFrame) -> Union[gpd.GeoDataFrame, None]:
+                     linestrings_gdfs: gpd.GeoDataFrame,
+                     save: bool = True) -> Union[gpd.GeoDataFrame, None]:
 
     buffer_gdfs = None
 
@@ -17,30 +22,35 @@ def calculate_buffer(buffer_layer: Dict[str, Dict[str, str]],
         distance = buffer_layer[layer_name].get('distance')
         wide = buffer_layer[layer_name].get('wide')
 
-        if geometry_type == "Point":
-            buffer_gdfs = buffer.create_buffers(points_gdfs, buffer_layer)
-        elif geometry_type == "Polygon":
-            buffer_gdfs = buffer.create_buffers(polygons_gdfs, buffer_layer)
-        elif geometry_type == "MultiPolygon":
-            buffer_gdfs = buffer.create_buffers(multipolygons_gdfs, buffer_layer)
-        elif geometry_type == "LineString":
-            buffer_gdfs = buffer.create_buffers(linestrings_gdfs, buffer_layer)
-        else:
-            print("The geometry_type is unsupported (must be Point, LineString, Polygon or MultiPolygon)")
+        source_gdfs = {"Point": points_gdfs, "Polygon": polygons_gdfs,
+                       "MultiPolygon": multipolygons_gdfs, "LineString": linestrings_gdfs}.get(geometry_type)
+        if source_gdfs is None:
+            logger.warning("The geometry_type is unsupported (must be Point, LineString, Polygon or MultiPolygon)")
             continue
 
-        # Sauvegarde avec le bon suffixe
-        if buffer_type in ["grid", "zones_grid"]:
-            save_buffers_to_geojson(buffer_type, wide, buffer_gdfs)
-        else:
-            save_buffers_to_geojson(buffer_type, distance, buffer_gdfs)
+        source_gdf = source_gdfs.get(layer_name)
+        with profiler.section("buffer", layer=layer_name, rows_in=None if source_gdf is None else len(source_gdf)) as entry:
+            buffer_gdfs = buffer.create_buffers(source_gdfs, buffer_layer)
+            entry["rows_out"] = len(buffer_gdfs.get(f"{layer_name}_buffer", []))
+
+        if save:
+            save_layer_buffers(buffer_layer[layer_name], buffer_gdfs)
 
     return buffer_gdfs
 
+def save_layer_buffers(layer_params: Dict[str, str], buffer_gdfs: Dict[str, gpd.GeoDataFrame]):
+    buffer_type = layer_params.get('buffer_type')
+
+    # Sauvegarde avec le bon suffixe
+    if buffer_type in ["grid", "zones_grid"]:
+        save_buffers_to_geojson(buffer_type, layer_params.get('wide'), buffer_gdfs)
+    else:
+        save_buffers_to_geojson(buffer_type, layer_params.get('distance'), buffer_gdfs)
+
 def save_buffers_to_geojson(buffer_type, distance, buffer_gdfs, output_dir="./data/output/data/buffers"):
     os.makedirs(output_dir, exist_ok=True)
 
     for layer_name, gdf in buffer_gdfs.items():
         output_path = os.path.join(output_dir, f"{layer_name}_{buffer_type}_{distance}m.geojson")
         gdf.to_file(output_path, driver="GeoJSON")
-        print(f"{layer_name} saved to {output_path}")
+        logger.info(f"{layer_name} saved to {output_path}")
@@ -0,0 +1,108 @@
+import glob
+import hashlib
+import json
+import logging
+import os
+import shutil
+import geopandas as gpd
+import numpy as np
+from typing import Dict, Iterable, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_DIR = "./data/cache/checkpoints"
+# Only the CHECKPOINT_MAX_STORES most recently written stores are kept on disk;
+# a store is deleted as soon as a non-sharded run has assembled all of its chunks
+CHECKPOINT_MAX_STORES = 8
+
+def checkpoint_dir(params: dict) -> Optional[str]:
+    """Checkpoint directory of a layer ('checkpoint': true enables it, implied by 'shard')."""
+    return CHECKPOINT_DIR if params.get("checkpoint", "shard" in params) else None
+
+def run_key(fingerprint: str, params: dict) -> str:
+    """Key of a run: fingerprint of the graph and of the origins, plus the buffer parameters."""
+    payload = json.dumps({"fingerprint": fingerprint, "params": params}, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+class ShardComplete(Exception):
+    """
+    Raised by a sharded run once its chunks are checkpointed while the store still
+    misses chunks of other shards: its buffers are incomplete and must not be joined,
+    aggregated or exported.
+    """
+
+    def __init__(self, shard, done: int, total: int, path: str):
+        self.shard, self.done, self.total, self.path = tuple(shard), done, total, path
+        super().__init__(f"Shard {self.shard[0]}/{self.shard[1]} done: {done}/{total} chunks in {path}; "
+                         f"merge the stores (checkpoint.merge_stores) and rerun with 'checkpoint' but without 'shard' to assemble the buffers")
+
+class ChunkStore:
+    """
+    On-disk store of the completed chunks of a run: one GeoParquet file per chunk
+    (column 'position' + geometry), written atomically, in <root>/<key>/.
+
+    Several processes or machines can fill the same store (or stores merged with
+    merge_stores) and a later run only computes the missing chunks.
+    """
+
+    def __init__(self, root: str, key: str, crs, metadata: Optional[dict] = None):
+        self.path = os.path.join(root, key)
+        self.crs = crs
+        os.makedirs(self.path, exist_ok=True)
+        prune_stores(root, keep=self.path)
+        metadata_path = os.path.join(self.path, "metadata.json")
+        if metadata is not None and not os.path.exists(metadata_path):
+            with open(metadata_path, "w") as file:
+                json.dump(metadata, file, default=str)
+
+    def _chunk_path(self, chunk_id: int) -> str:
+        return os.path.join(self.path, f"chunk_{chunk_id:06d}.parquet")
+
+    def done_chunks(self) -> Set[int]:
+        return {int(os.path.basename(path)[6:12]) for path in glob.glob(os.path.join(self.path, "chunk_*.parquet"))}
+
+    def save(self, chunk_id: int, positions: np.ndarray, geometries: np.ndarray) -> None:
+        chunk_gdf = gpd.GeoDataFrame({"position": positions}, geometry=list(geometries), crs=self.crs)
+        os.makedirs(self.path, exist_ok=True)
+        tmp_path = self._chunk_path(chunk_id) + f".{os.getpid()}.tmp"
+        chunk_gdf.to_parquet(tmp_path)
+        os.replace(tmp_path, self._chunk_path(chunk_id))
+
+    def load(self, chunk_ids: Iterable[int]) -> Dict[int, object]:
+        """Geometries of the given chunks, by position."""
+        geometries = {}
+        for chunk_id in chunk_ids:
+            chunk_gdf = gpd.read_parquet(self._chunk_path(chunk_id))
+            geometries.update(zip(chunk_gdf["position"].to_numpy(), chunk_gdf.geometry.to_numpy()))
+        return geometries
+
+    def remove(self) -> None:
+        """Deletes the store, once its chunks have been assembled."""
+        shutil.rmtree(self.path, ignore_errors=True)
+
+def prune_stores(root: str, max_stores: Optional[int] = None, keep: Optional[str] = None) -> None:
+    """Keeps the max_stores most recently written stores of root (and keep, the store in use)."""
+    max_stores = CHECKPOINT_MAX_STORES if max_stores is None else max_stores
+    stores = [path for path in glob.glob(os.path.join(root, "*")) if os.path.isdir(path) and path != keep]
+    stores.sort(key=os.path.getmtime, reverse=True)
+    for path in stores[max(max_stores - (keep is not None), 0):]:
+        logger.info(f"Removing checkpoint store {path}")
+        shutil.rmtree(path, ignore_errors=True)
+
+def merge_stores(source_paths: Iterable[str], target_path: str) -> int:
+    """
+    Copies the chunks of several stores of the same run (e.g. one per machine) into one store.
+
+    Returns:
+        Number of chunks copied.
+    """
+    os.makedirs(target_path, exist_ok=True)
+    copied = 0
+    for source_path in source_paths:
+        for path in glob.glob(os.path.join(source_path, "*")):
+            target = os.path.join(target_path, os.path.basename(path))
+            if not os.path.exists(target):
+                shutil.copy2(path, target)
+                copied += path.endswith(".parquet")
+    logger.info(f"Merged {copied} chunks into {target_path}")
+    return copied
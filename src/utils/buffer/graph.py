@@ -0,0 +1,131 @@
+import logging
+import geopandas as gpd
+import networkx as nx
+import numpy as np
+import osmnx as ox
+import shapely
+from shapely.geometry import LineString
+from typing import Optional
+import utils.buffer.snapping as snapping
+
+logger = logging.getLogger(__name__)
+
+def clip_graph(G: nx.MultiDiGraph, origins_utm: gpd.GeoSeries, max_distance: float,
+               cache_dir: Optional[str] = None) -> nx.MultiDiGraph:
+    """
+    Keeps only the part of the graph that can be reached from the origins.
+
+    The study area is the convex hull of the origins and of their nearest nodes, expanded
+    by max_distance: a node outside of it is farther than max_distance (as the crow flies,
+    hence on the network too) from every node an origin can snap to.
+
+    Args:
+        G: Projected street graph.
+        origins_utm: Origins in the graph CRS.
+        max_distance: Maximum network distance from an origin, in graph weight units
+            equivalent to meters (length).
+        cache_dir: Snap cache directory (see snapping.snap_to_nodes).
+
+    Returns:
+        Clipped copy of the graph, with the study area polygon in G.graph['study_area'].
+    """
+    X = origins_utm.x.to_numpy()
+    Y = origins_utm.y.to_numpy()
+    nearest, _ = snapping.snap_to_nodes(G, X, Y, cache_dir)
+    snapped = np.array([(G.nodes[n]['x'], G.nodes[n]['y']) for n in nearest])
+    anchors = np.vstack([np.column_stack([X, Y]), snapped])
+
+    study_area = shapely.convex_hull(shapely.multipoints(anchors)).buffer(max_distance + 1)
+    shapely.prepare(study_area)
+
+    nodes = np.array(list(G.nodes))
+    coords = np.array([(data['x'], data['y']) for _, data in G.nodes(data=True)])
+    inside = shapely.contains_xy(study_area, coords[:, 0], coords[:, 1])
+    clipped = G.subgraph(nodes[inside]).copy()
+    clipped.graph['study_area'] = study_area
+    return clipped
+
+def _merge_edges(G: nx.MultiDiGraph, u, node, v) -> dict:
+    """Attributes of the edge u -> v replacing u -> node -> v (geometry concatenated, length summed)."""
+    first = next(iter(G.get_edge_data(u, node).values()))
+    second = next(iter(G.get_edge_data(node, v).values()))
+
+    merged = dict(first)
+    merged['length'] = first.get('length', 0) + second.get('length', 0)
+    coords = list(snapping.edge_geometry(G, u, node, first).coords) + list(snapping.edge_geometry(G, node, v, second).coords)[1:]
+    merged['geometry'] = LineString(coords)
+    return merged
+
+def contract_degree_two(G: nx.MultiDiGraph) -> nx.MultiDiGraph:
+    """
+    Removes interstitial nodes (exactly two neighbours, no branching) and merges their edges.
+
+    Both one-way chains (a -> n -> b) and two-way chains (a <-> n <-> b) are contracted.
+    Merged edges keep the concatenated geometry, so polygonization stays exact, and the
+    summed 'length'. Other attributes are taken from the first edge of the chain.
+
+    Returns:
+        Contracted copy of the graph.
+    """
+    G = G.copy()
+    for node in list(G.nodes):
+        preds = set(G.predecessors(node))
+        succs = set(G.successors(node))
+        neighbours = preds | succs
+        if node in neighbours or len(neighbours) != 2:
+            continue
+        if any(G.number_of_edges(a, b) != 1 for a, b in
+               [(p, node) for p in preds] + [(node, s) for s in succs]):
+            continue
+
+        a, b = neighbours
+        if preds == succs == neighbours:
+            # Tronçon à double sens
+            new_edges = [(a, b, _merge_edges(G, a, node, b)), (b, a, _merge_edges(G, b, node, a))]
+        elif len(preds) == 1 and len(succs) == 1:
+            # Tronçon à sens unique
+            (u,), (v,) = preds, succs
+            new_edges = [(u, v, _merge_edges(G, u, node, v))]
+        else:
+            continue
+
+        G.remove_node(node)
+        for u, v, data in new_edges:
+            G.add_edge(u, v, **data)
+    return G
+
+def prepare_routing_graph(G: nx.MultiDiGraph, origins_utm: gpd.GeoSeries, max_distance: float,
+                          params: dict) -> nx.MultiDiGraph:
+    """
+    Shrinks a projected graph before routing, according to the layer parameters:
+      - clip_graph (default True): clip to the origins' hull expanded by max_distance
+      - contract_graph (default False): contract degree-2 nodes (coarser snapping of origins)
+      - merge_intersections (default None): tolerance in meters to merge near-duplicate intersections
+
+    Node and edge counts before and after each step are logged and stored in
+    G.graph['preprocessing']. The input graph is not modified, apart from the snapping
+    index built on it (see snapping.get_snap_index).
+    """
+    source = G
+    steps = [("loaded", G.number_of_nodes(), G.number_of_edges())]
+
+    if params.get("clip_graph", True) and not origins_utm.empty:
+        G = clip_graph(G, origins_utm, max_distance, snapping.cache_dir(params))
+        steps.append(("clipped", G.number_of_nodes(), G.number_of_edges()))
+
+    tolerance = params.get("merge_intersections")
+    if tolerance and G.number_of_nodes() > 0:
+        G = ox.simplification.consolidate_intersections(G, tolerance=tolerance, rebuild_graph=True, dead_ends=True)
+        steps.append(("merged", G.number_of_nodes(), G.number_of_edges()))
+
+    if params.get("contract_graph", False):
+        G = contract_degree_two(G)
+        steps.append(("contracted", G.number_of_nodes(), G.number_of_edges()))
+
+    if G is source:
+        # The loaded graph may be shared (see network.load_network_graph): callers get their own copy
+        G = G.copy()
+
+    G.graph['preprocessing'] = [{"step": step, "nodes": nodes, "edges": edges} for step, nodes, edges in steps]
+    logger.info("Routing graph: " + " -> ".join(f"{step} {nodes} nodes/{edges} edges" for step, nodes, edges in steps))
+    return G
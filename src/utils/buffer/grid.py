@@ -1,7 +1,10 @@
+import logging
 import geopandas as gpd
 from shapely.geometry import Polygon, box, Point
 from shapely.ops import unary_union
 
+logger = logging.getLogger(__name__)
+
 def apply_points_grid(points_gdf: gpd.GeoDataFrame, layer_name: str, grid_layers: dict) -> gpd.GeoDataFrame:
     grid_gdf = points_gdf.copy()
     
@@ -39,9 +42,9 @@ def apply_points_grid(points_gdf: gpd.GeoDataFrame, layer_name: str, grid_layers
                 grid_gdf = grid_gdf.to_crs(epsg=4326)
             
             except Exception as e:
-                print(f"Erreur lors de la reprojection ou de la création de la grille : {e}")
+                logger.error(f"Erreur lors de la reprojection ou de la création de la grille : {e}")
         else:
-            print(f"Le type de géométrie '{geometry_type}' n'est pas supporté pour cette couche.")
+            logger.warning(f"Le type de géométrie '{geometry_type}' n'est pas supporté pour cette couche.")
     
     return grid_gdf
 
@@ -103,10 +106,10 @@ def apply_line_grid(line_gdf: gpd.GeoDataFrame, layer_name: str, grid_layers: di
                 return result_gdf
                 
             except Exception as e:
-                print(f"Erreur lors de la création de la grille: {e}")
+                logger.error(f"Erreur lors de la création de la grille: {e}")
                 return grid_gdf
         else:
-            print(f"Type de géométrie '{geometry_type}' non supporté pour cette couche")
+            logger.warning(f"Type de géométrie '{geometry_type}' non supporté pour cette couche")
     
     return grid_gdf
 
@@ -148,9 +151,9 @@ def apply_polygon_grid(polygons_gdf: gpd.GeoDataFrame, layer_name: str, grid_lay
                 grid_gdf = grid_gdf.to_crs(epsg=4326)
             
             except Exception as e:
-                print(f"Erreur lors de la reprojection ou de la création de la grille : {e}")
+                logger.error(f"Erreur lors de la reprojection ou de la création de la grille : {e}")
         else:
-            print(f"Le type de géométrie '{geometry_type}' n'est pas supporté pour cette couche.")
+            logger.warning(f"Le type de géométrie '{geometry_type}' n'est pas supporté pour cette couche.")
     
     return grid_gdf
 
@@ -1,280 +1,276 @@
 import geopandas as gpd
 import networkx as nx
 import osmnx as ox
-from shapely.geometry import Point
+import numpy as np
+import shapely
+import logging
+import time
+import utils.buffer.graph as graph
+import utils.buffer.network as network
+import utils.buffer.routing as routing
+import utils.buffer.snapping as snapping
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+UTM_CRS = "EPSG:32618"  # UTM Zone 18N pour Montréal
+
+def get_travel_bands(params: dict) -> List[float]:
+    """Retourne les seuils de temps de parcours (minutes) demandés, triés et sans doublons."""
+    travel_time = params.get("travel_time", [5])
+    if not isinstance(travel_time, (list, tuple)):
+        travel_time = [travel_time]
+    return sorted(set(travel_time))
+
+def load_isochrone_graph(bounds: np.ndarray, network_buffer: float, network_type: str,
+                         truncate_by_edge: bool = False, osm_file_path: Optional[str] = None) -> nx.MultiDiGraph:
+    """
+    Télécharge le réseau autour de l'emprise des entités et le projette en UTM, ou le
+    lit depuis un fichier OSM XML local lorsque 'osm_file' est configuré pour la couche.
+    """
+    if osm_file_path:
+        return network.load_network_graph(osm_file_path)
+
+    buffer_degrees = network_buffer / 111320  # Approximation
+    west, south, east, north = bounds
+    G = ox.graph_from_bbox(
+        (west - buffer_degrees, south - buffer_degrees, east + buffer_degrees, north + buffer_degrees),
+        network_type=network_type,
+        simplify=True,
+        truncate_by_edge=truncate_by_edge
+    )
+    G = ox.project_graph(G, to_crs=UTM_CRS)
+    logger.debug(f"Projection du graphe : {G.graph['crs']}")
+    return G
+
+def prepare_isochrone_graph(G: nx.MultiDiGraph, origins_utm: gpd.GeoSeries, bands: List[float],
+                            speed: float, params: dict) -> nx.MultiDiGraph:
+    """
+    Réduit le graphe à la zone d'étude (voir graph.prepare_routing_graph) puis ajoute
+    le temps de parcours (minutes) de chaque arête dans l'attribut 'time'.
+    """
+    meters_per_minute = speed * 1000 / 60
+    G = graph.prepare_routing_graph(G, origins_utm, bands[-1] * meters_per_minute, params)
+
+    for _, _, _, data in G.edges(data=True, keys=True):
+        data["time"] = data["length"] / meters_per_minute
+    return G
+
+def osm_file_path(layer_name: str, params: dict) -> Optional[str]:
+    """Chemin du fichier OSM local de la couche, None pour télécharger le réseau."""
+    return network.resolve_osm_file(layer_name, params) if params.get("osm_file") else None
+
+# Tableaux du graphe partagés par les processus du pool (initialisés par _init_worker)
+_WORKER_ARRAYS = None
+
+def _init_worker(adjacency, coords) -> None:
+    global _WORKER_ARRAYS
+    _WORKER_ARRAYS = (adjacency, coords)
+
+def hulls_from_distances(distances: np.ndarray, coords: np.ndarray, bands: List[float]) -> np.ndarray:
+    """
+    Construit en bloc les isochrones emboîtées à partir d'une matrice de temps de parcours.
+
+    Args:
+        distances: Matrice (origines, nœuds) des temps de parcours, np.inf si non atteint
+        coords: Coordonnées (n, 2) des nœuds
+        bands: Seuils de temps triés (minutes)
+
+    Returns:
+        Tableau (origines, seuils) des enveloppes convexes des nœuds atteints, None si moins de 3 nœuds
+    """
+    n_origins = distances.shape[0]
+    hulls = np.empty((n_origins, len(bands)), dtype=object)
+    for b, band in enumerate(bands):
+        rows, cols = np.nonzero(distances <= band)
+        multipoints = np.full(n_origins, None, dtype=object)
+        if len(rows):
+            shapely.multipoints(coords[cols], indices=rows, out=multipoints)
+        band_hulls = shapely.convex_hull(multipoints)
+        band_hulls[np.bincount(rows, minlength=n_origins) < 3] = None
+        hulls[:, b] = band_hulls
+    return hulls
+
+def _isochrone_chunk(task: Tuple[int, np.ndarray, List[float]]) -> Tuple[int, np.ndarray]:
+    """Une recherche bornée par origine du bloc, seuillée pour chaque bande."""
+    start, sources, bands = task
+    adjacency, coords = _WORKER_ARRAYS
+    try:
+        distances = routing.bounded_distances(adjacency, sources, bands[-1])
+        hulls = hulls_from_distances(distances, coords, bands)
+    except Exception as e:
+        logger.error(f"Origines {start} à {start + len(sources)}: Erreur lors du calcul des isochrones: {e}")
+        hulls = np.full((len(sources), len(bands)), None, dtype=object)
+    logger.debug(f"Origines {start} à {start + len(sources)}: {(~shapely.is_missing(hulls)).sum()} isochrones")
+    return start, hulls
+
+def compute_isochrones(G: nx.MultiDiGraph, origins_utm: gpd.GeoSeries, bands: List[float],
+                       weight: str = "time", snap_cache_dir: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Calcule les isochrones de toutes les origines pour tous les seuils.
+
+    Les temps de parcours sont calculés par blocs d'origines (matrice de distances bornée
+    par le plus grand seuil), répartis sur un pool de processus ; les origines rattachées
+    au même nœud ne sont calculées qu'une fois. Le rattachement des origines au graphe
+    passe par l'index de snapping du graphe (voir snapping.snap_to_nodes).
+
+    Returns:
+        Tuple (position de l'origine, seuil, polygone) pour chaque isochrone, dans l'ordre origine puis seuil
+    """
+    start_time = time.time()
+    arrays = routing.GraphArrays.from_graph(G, weight)
+    center_nodes, _ = snapping.snap_to_nodes(G, origins_utm.x.to_numpy(), origins_utm.y.to_numpy(), snap_cache_dir)
+    sources, inverse = np.unique(arrays.positions_of(center_nodes), return_inverse=True)
+
+    chunk_size = routing.distance_chunk_size(len(arrays.nodes))
+    tasks = [(start, sources[start:start + chunk_size], bands) for start in range(0, len(sources), chunk_size)]
+    results = routing.map_chunks(_isochrone_chunk, tasks, _init_worker, (arrays.adjacency, arrays.coords))
+
+    hulls = np.empty((len(sources), len(bands)), dtype=object)
+    for start, chunk_hulls in results:
+        hulls[start:start + len(chunk_hulls)] = chunk_hulls
+    polygons = hulls[inverse.reshape(-1)].reshape(-1)
+
+    logger.info(f"Isochrones: {len(origins_utm)} origines ({len(sources)} nœuds distincts, {len(tasks)} blocs), "
+                f"{len(bands)} seuils, {(~shapely.is_missing(polygons)).sum()} polygones "
+                f"en {time.time() - start_time:.2f} s")
+
+    origin_positions = np.repeat(np.arange(len(origins_utm)), len(bands))
+    band_values = np.tile(bands, len(origins_utm))
+    return origin_positions, band_values, polygons
+
+def build_isochrone_gdf(source_gdf: gpd.GeoDataFrame, origin_positions: np.ndarray, band_values: np.ndarray,
+                        polygons: np.ndarray, layer_name: str) -> gpd.GeoDataFrame:
+    """
+    Construit le GeoDataFrame final : une ligne par (entité, seuil) avec toutes les colonnes
+    d'origine, la colonne 'band' (minutes), l'aire et les métadonnées.
+    """
+    isochrone_gdf = source_gdf.iloc[origin_positions].copy()
+    isochrone_gdf['band'] = band_values
+    isochrone_gdf['geometry'] = gpd.GeoSeries(polygons, crs=UTM_CRS).to_crs(epsg=4326).to_numpy()
+    isochrone_gdf['area_km2'] = shapely.area(polygons) / 1e6  # Aire calculée en UTM
+
+    valid = ~shapely.is_missing(polygons)
+    logger.info(f"Géométries générées: {valid.sum()} isochrones valides sur {len(polygons)} ({len(source_gdf)} entités)")
+    isochrone_gdf = isochrone_gdf[valid].copy()
+
+    isochrone_gdf['buffer_type'] = 'isochrone'
+    isochrone_gdf['buffer_layer'] = layer_name
+    return isochrone_gdf.reset_index(drop=True)
 
 def apply_points_isochrones(points_gdf: gpd.GeoDataFrame, layer_name: str, isochrone_params: dict) -> gpd.GeoDataFrame:
     """
     Génère des isochrones pour chaque point en conservant toutes les colonnes d'origine.
     Même logique que apply_points_grid mais pour les isochrones.
-    
+    Une seule recherche par point produit une isochrone par seuil de 'travel_time'
+    (colonne 'band').
+
     Args:
         points_gdf: GeoDataFrame contenant les points avec toutes leurs colonnes
         layer_name: Nom de la couche pour les paramètres
         isochrone_params: Dictionnaire de paramètres des isochrones
-        
+
     Returns:
         GeoDataFrame avec les polygones d'isochrones et toutes les colonnes originales
     """
-    # Crée une copie pour ne pas modifier l'original
-    isochrone_gdf = points_gdf.copy()
-    
     # Vérifie si la couche est dans les paramètres
     if layer_name not in isochrone_params:
-        print(f"Aucun paramètre trouvé pour la couche '{layer_name}'")
-        return isochrone_gdf
-    
+        logger.warning(f"Aucun paramètre trouvé pour la couche '{layer_name}'")
+        return points_gdf.copy()
+
     # Extraction des paramètres avec valeurs par défaut
     params = isochrone_params[layer_name]
-    travel_time = params.get("travel_time", [5])
+    bands = get_travel_bands(params)
     speed = params.get("speed", 4.5)
     network_buffer = params.get("distance", 2000)
     network_type = params.get("network_type", "walk")
-    
+
     # Vérification du type de géométrie
-    if not all(isochrone_gdf.geometry.geom_type == "Point"):
+    if not all(points_gdf.geometry.geom_type == "Point"):
         raise ValueError("Toutes les géométries doivent être de type Point.")
-    
+
     try:
-        # 1. Téléchargement du réseau
-        bbox = isochrone_gdf.total_bounds
-        buffer_deg = network_buffer / 111000  # Approximation
-        
-        G = ox.graph_from_bbox(
-            north=bbox[3] + buffer_deg,
-            south=bbox[1] - buffer_deg,
-            east=bbox[2] + buffer_deg,
-            west=bbox[0] - buffer_deg,
-            network_type=network_type,
-            simplify=True
-        )
-        G = ox.projection.project_graph(G)
-        print(f"Projection du graphe : {G.graph['crs']}")
-        
-        # 2. Calcul du temps de parcours
-        meters_per_minute = speed * 1000 / 60
-        for _, _, _, data in G.edges(data=True, keys=True):
-            data["time"] = data["length"] / meters_per_minute
-        
-        # 3. Conversion CRS pour les calculs
-        isochrone_gdf = isochrone_gdf.to_crs(G.graph["crs"])
-        print(f"CRS de isochrone_gdf après projection : {isochrone_gdf.crs}")
-        
-        # 4. Calcul des isochrones pour chaque point
-        polygons = []
-        for idx, point in enumerate(isochrone_gdf.geometry):
-            try:
-                center_node = ox.distance.nearest_nodes(G, point.x, point.y)
-                print(f"Point {idx}: Nœud le plus proche trouvé: {center_node}")
-                
-                subgraph = nx.ego_graph(G, center_node, radius=max(travel_time), distance="time")
-                print(f"Point {idx}: Sous-graphe généré avec {subgraph.number_of_nodes()} nœuds")
-                
-                node_points = [Point((data["x"], data["y"])) 
-                             for _, data in subgraph.nodes(data=True)]
-                
-                print(f"Point {idx}: {len(node_points)} points de nœuds générés")
-                
-                if len(node_points) >= 3:
-                    poly = gpd.GeoSeries(node_points).unary_union.convex_hull
-                    print(f"Point {idx}: Polygone généré: {poly}")
-                    polygons.append(poly)
-                else:
-                    print(f"Point {idx}: Pas assez de points pour générer un polygone")
-                    polygons.append(None)
-            except Exception as e:
-                print(f"Point {idx}: Erreur lors du calcul de l'isochrone: {e}")
-                polygons.append(None)
-        
-        # 5. Mise à jour de la géométrie
-        isochrone_gdf['geometry'] = polygons
-        print(f"Géométries générées: {isochrone_gdf['geometry'].notnull().sum()} isochrones valides sur {len(isochrone_gdf)} points")
-        
-        # 6. Reprojeter en WGS84 (EPSG:4326) pour la visualisation
-        isochrone_gdf = isochrone_gdf.to_crs(epsg=4326)
-        print(f"CRS après reprojection finale : {isochrone_gdf.crs}")
-        
-        # 7. Calcul de l'aire (après reprojection, pour éviter des biais dans les unités)
-        isochrone_gdf['area_km2'] = isochrone_gdf.geometry.apply(
-            lambda x: x.area / 1e6 if x else None
-        )
-        
-        # 8. Ajout des métadonnées
-        isochrone_gdf['buffer_type'] = 'isochrone'
-        isochrone_gdf['buffer_layer'] = layer_name
-        
+        # 1. Téléchargement du réseau, réduction à la zone d'étude et calcul du temps de parcours
+        points_utm = points_gdf.geometry.to_crs(UTM_CRS)
+        G = load_isochrone_graph(points_gdf.total_bounds, network_buffer, network_type,
+                                 osm_file_path=osm_file_path(layer_name, params))
+        G = prepare_isochrone_graph(G, points_utm, bands, speed, params)
+
+        # 2. Calcul des isochrones pour chaque point et chaque seuil
+        origin_positions, band_values, polygons = compute_isochrones(G, points_utm, bands, snap_cache_dir=snapping.cache_dir(params))
+
+        # 3. Une ligne par point et par seuil
+        isochrone_gdf = build_isochrone_gdf(points_gdf, origin_positions, band_values, polygons, layer_name)
+
     except Exception as e:
-        print(f"Erreur lors du calcul des isochrones: {e}")
+        logger.error(f"Erreur lors du calcul des isochrones: {e}")
         return points_gdf
-    
+
     return isochrone_gdf
 
 def apply_lines_isochrones(lines_gdf: gpd.GeoDataFrame, layer_name: str, isochrone_params: dict) -> gpd.GeoDataFrame:
-    # Crée une copie pour ne pas modifier l'original
-    isochrone_gdf = lines_gdf.copy()
-    
     if layer_name not in isochrone_params:
-        print(f"Aucun paramètre trouvé pour la couche '{layer_name}'")
-        return isochrone_gdf
-    
+        logger.warning(f"Aucun paramètre trouvé pour la couche '{layer_name}'")
+        return lines_gdf.copy()
+
     params = isochrone_params[layer_name]
-    travel_time = params.get("travel_time", [5])
+    bands = get_travel_bands(params)
     speed = params.get("speed", 4.5)  # 4.5 km/h pour la marche
     network_buffer = params.get("distance", 2000)  # 2km
     network_type = params.get("network_type", "walk")
-    
+
     # Vérification du type de géométrie
-    if not all(isochrone_gdf.geometry.geom_type == "LineString"):
+    if not all(lines_gdf.geometry.geom_type == "LineString"):
         raise ValueError("Toutes les géométries doivent être de type LineString.")
-    
+
     try:
-        # 1. Calcul des centroïdes en WGS84 d'abord
-        isochrone_gdf['centroid'] = isochrone_gdf.geometry.centroid
-        
-        # 2. Déterminer la zone UTM appropriée pour Montréal (EPSG:32618)
-        utm_crs = "EPSG:32618"
-        
-        # 3. Téléchargement du réseau dans la zone appropriée
-        bbox = isochrone_gdf.total_bounds
-        buffer_meters = network_buffer
-        buffer_degrees = buffer_meters / 111320  # Conversion plus précise
-        
-        G = ox.graph_from_bbox(
-            north=bbox[3] + buffer_degrees,
-            south=bbox[1] - buffer_degrees,
-            east=bbox[2] + buffer_degrees,
-            west=bbox[0] - buffer_degrees,
-            network_type=network_type,
-            simplify=True,
-            truncate_by_edge=True
-        )
-        
-        # 4. Projection du graphe en UTM
-        G = ox.project_graph(G, to_crs=utm_crs)
-        
-        # 5. Calcul du temps de parcours
-        meters_per_minute = speed * 1000 / 60
-        for _, _, _, data in G.edges(data=True, keys=True):
-            data["time"] = data["length"] / meters_per_minute
-        
-        # 6. Conversion des centroïdes en UTM
-        centroids_utm = isochrone_gdf['centroid'].to_crs(utm_crs)
-        
-        # 7. Calcul des isochrones pour chaque centroïde
-        polygons = []
-        for idx, centroid in enumerate(centroids_utm):
-            try:
-                center_node = ox.distance.nearest_nodes(G, centroid.x, centroid.y)
-                
-                subgraph = nx.ego_graph(G, center_node, radius=max(travel_time), distance="time")
-                
-                node_points = [Point((data["x"], data["y"])) 
-                             for _, data in subgraph.nodes(data=True)]
-                
-                if len(node_points) >= 3:
-                    poly = gpd.GeoSeries(node_points).unary_union.convex_hull
-                    polygons.append(poly)
-                else:
-                    polygons.append(None)
-            except Exception as e:
-                print(f"Erreur pour la ligne {idx}: {str(e)}")
-                polygons.append(None)
-        
-        # 8. Mise à jour de la géométrie et reprojection
-        isochrone_gdf['geometry'] = gpd.GeoSeries(polygons, crs=utm_crs).to_crs(epsg=4326)
-        isochrone_gdf = isochrone_gdf.drop(columns=['centroid'])
-        
-        # 9. Calcul de l'aire
-        isochrone_gdf['area_km2'] = isochrone_gdf.geometry.to_crs(utm_crs).area / 1e6
-        
-        # Métadonnées
-        isochrone_gdf['buffer_type'] = 'isochrone'
-        isochrone_gdf['buffer_layer'] = layer_name
-        
+        # 1. Téléchargement du réseau dans la zone appropriée
+        centroids_utm = lines_gdf.geometry.to_crs(UTM_CRS).centroid
+        G = load_isochrone_graph(lines_gdf.total_bounds, network_buffer, network_type, truncate_by_edge=True,
+                                 osm_file_path=osm_file_path(layer_name, params))
+        G = prepare_isochrone_graph(G, centroids_utm, bands, speed, params)
+
+        # 2. Isochrones autour des centroïdes (calculés en UTM)
+        origin_positions, band_values, polygons = compute_isochrones(G, centroids_utm, bands, snap_cache_dir=snapping.cache_dir(params))
+
+        # 3. Une ligne par entité et par seuil
+        isochrone_gdf = build_isochrone_gdf(lines_gdf, origin_positions, band_values, polygons, layer_name)
+
     except Exception as e:
-        print(f"Erreur majeure: {str(e)}")
+        logger.error(f"Erreur majeure: {str(e)}")
         return lines_gdf
-    
+
     return isochrone_gdf
 
 def apply_polygon_isochrones(polygons_gdf: gpd.GeoDataFrame, layer_name: str, isochrone_params: dict) -> gpd.GeoDataFrame:
-    # Crée une copie pour ne pas modifier l'original
-    isochrone_gdf = polygons_gdf.copy()
-    
     if layer_name not in isochrone_params:
-        print(f"Aucun paramètre trouvé pour la couche '{layer_name}'")
-        return isochrone_gdf
-    
+        logger.warning(f"Aucun paramètre trouvé pour la couche '{layer_name}'")
+        return polygons_gdf.copy()
+
     params = isochrone_params[layer_name]
-    travel_time = params.get("travel_time", [5])
+    bands = get_travel_bands(params)
     speed = params.get("speed", 4.5)
     network_buffer = params.get("distance", 2000)
     network_type = params.get("network_type", "walk")
-    
-    if not all(isochrone_gdf.geometry.geom_type.isin(["Polygon", "MultiPolygon"])):
+
+    if not all(polygons_gdf.geometry.geom_type.isin(["Polygon", "MultiPolygon"])):
         raise ValueError("Toutes les géométries doivent être de type Polygon ou MultiPolygon.")
-    
+
     try:
-        # 1. Calcul des centroïdes
-        isochrone_gdf['centroid'] = isochrone_gdf.geometry.centroid
-        
-        # 2. CRS UTM pour Montréal
-        utm_crs = "EPSG:32618"
-        
-        # 3. Téléchargement du réseau
-        bbox = isochrone_gdf.total_bounds
-        buffer_meters = network_buffer
-        buffer_degrees = buffer_meters / 111320  # Conversion précise
-        
-        G = ox.graph_from_bbox(
-            north=bbox[3] + buffer_degrees,
-            south=bbox[1] - buffer_degrees,
-            east=bbox[2] + buffer_degrees,
-            west=bbox[0] - buffer_degrees,
-            network_type=network_type,
-            simplify=True,
-            truncate_by_edge=True
-        )
-        G = ox.project_graph(G, to_crs=utm_crs)
-        
-        # 4. Calcul du temps de parcours
-        meters_per_minute = speed * 1000 / 60
-        for _, _, _, data in G.edges(data=True, keys=True):
-            data["time"] = data["length"] / meters_per_minute
-        
-        # 5. Conversion des centroïdes en UTM
-        centroids_utm = isochrone_gdf['centroid'].to_crs(utm_crs)
-        
-        # 6. Calcul des isochrones
-        polygons = []
-        for idx, centroid in enumerate(centroids_utm):
-            try:
-                center_node = ox.distance.nearest_nodes(G, centroid.x, centroid.y)
-                subgraph = nx.ego_graph(G, center_node, radius=max(travel_time), distance="time")
-                node_points = [Point((data["x"], data["y"])) for _, data in subgraph.nodes(data=True)]
-                
-                if len(node_points) >= 3:
-                    poly = gpd.GeoSeries(node_points).unary_union.convex_hull
-                    polygons.append(poly)
-                else:
-                    polygons.append(None)
-            except Exception as e:
-                print(f"Erreur pour le polygone {idx}: {str(e)}")
-                polygons.append(None)
-        
-        # 7. Mise à jour de la géométrie
-        isochrone_gdf['geometry'] = gpd.GeoSeries(polygons, crs=utm_crs).to_crs(epsg=4326)
-        isochrone_gdf = isochrone_gdf.drop(columns=['centroid'])
-        
-        # 8. Calcul de l'aire
-        isochrone_gdf['area_km2'] = isochrone_gdf.geometry.to_crs(utm_crs).area / 1e6
-        
-        # Métadonnées
-        isochrone_gdf['buffer_type'] = 'isochrone'
-        isochrone_gdf['buffer_layer'] = layer_name
-        
+        # 1. Téléchargement du réseau
+        centroids_utm = polygons_gdf.geometry.to_crs(UTM_CRS).centroid
+        G = load_isochrone_graph(polygons_gdf.total_bounds, network_buffer, network_type, truncate_by_edge=True,
+                                 osm_file_path=osm_file_path(layer_name, params))
+        G = prepare_isochrone_graph(G, centroids_utm, bands, speed, params)
+
+        # 2. Isochrones autour des centroïdes (calculés en UTM)
+        origin_positions, band_values, polygons = compute_isochrones(G, centroids_utm, bands, snap_cache_dir=snapping.cache_dir(params))
+
+        # 3. Une ligne par entité et par seuil
+        isochrone_gdf = build_isochrone_gdf(polygons_gdf, origin_positions, band_values, polygons, layer_name)
+
     except Exception as e:
-        print(f"Erreur majeure: {str(e)}")
+        logger.error(f"Erreur majeure: {str(e)}")
         return polygons_gdf
-    
-    return isochrone_gdf
\ No newline at end of file
+
+    return isochrone_gdf
@@ -1,57 +1,95 @@
 import geopandas as gpd
 import networkx as nx
 import osmnx as ox
-from shapely.geometry import Point, Polygon, MultiPolygon
+import shapely
+from shapely.geometry import Polygon, MultiPolygon
 from shapely.ops import unary_union
-from multiprocessing import Pool, cpu_count, set_start_method
+from multiprocessing import cpu_count, get_context
 from tqdm import tqdm
 import numpy as np
 import os
 import logging
-from typing import Dict, Tuple
+from collections import OrderedDict
+import utils.buffer.checkpoint as checkpoint
+import utils.buffer.graph as graph
+import utils.buffer.snapping as snapping
+from typing import Dict, List, Optional, Tuple
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG, format="%(asctime)s - %(processName)s - %(message)s")
 logger = logging.getLogger(__name__)
 
-# Set multiprocessing start method to 'spawn' for macOS compatibility
-try:
-    set_start_method('spawn', force=True)
-except RuntimeError:
-    pass  # Already set
+# Worker pools use the 'spawn' start method (macOS compatibility), without changing the global default
+MP_CONTEXT = get_context("spawn")
 
-def create_network_buffer(args: Tuple[int, int, float, float, float, bool, str, nx.MultiDiGraph]) -> Tuple[int, Polygon]:
+UTM_CRS = "EPSG:32618"  # UTM Zone 18N for Montreal
+
+# Graph shared by the pool workers (set once per worker by _init_worker)
+_WORKER_GRAPH = None
+
+def _init_worker(G: nx.MultiDiGraph) -> None:
+    """Store the street graph in the worker process so tasks don't pickle it again."""
+    global _WORKER_GRAPH
+    _WORKER_GRAPH = G
+
+EDGE_BUFFER = 10  # meters around reached edges
+POLYGONIZATION_METHODS = ("exact", "concave")
+
+def polygonize_reachable(G: nx.MultiDiGraph, reachable_nodes: list, method: str = "exact",
+                         concave_ratio: float = 0.05) -> Polygon:
     """
-    Create a network buffer for a single point using a provided graph.
-    
+    Turns the set of nodes reached from an origin into a polygon.
+
     Args:
-        args: Tuple of (idx, nearest_node, x, y, distance, remove_holes, crs, G).
-    
+        G: Projected street graph.
+        reachable_nodes: Nodes within the network distance.
+        method: "exact" unions the reached edges buffered by EDGE_BUFFER meters;
+            "concave" builds a concave hull of the reached nodes and edge vertices
+            (much cheaper, slightly less exact on sparse networks).
+        concave_ratio: Concave hull ratio (0 = tightest hull, 1 = convex hull).
+
     Returns:
-        Tuple of (index, buffer geometry in WGS84).
+        Polygon in the graph CRS, empty if no edge was reached.
     """
-    idx, nearest_node, x, y, distance, remove_holes, crs, G = args
+    edges = list(G.subgraph(reachable_nodes).edges(data=True))
+    if not edges:
+        return Polygon()
+
+    if method == "exact":
+        edge_geoms = [snapping.edge_geometry(G, u, v, data) for u, v, data in edges]
+        return unary_union(edge_geoms).buffer(EDGE_BUFFER)
+
+    if method == "concave":
+        node_coords = np.array([(G.nodes[n]['x'], G.nodes[n]['y']) for n in reachable_nodes])
+        edge_coords = shapely.get_coordinates([data['geometry'] for _, _, data in edges if 'geometry' in data])
+        coords = np.vstack([node_coords, edge_coords]) if len(edge_coords) else node_coords
+        hull = shapely.concave_hull(shapely.multipoints(coords), ratio=concave_ratio)
+        return hull.buffer(EDGE_BUFFER)
+
+    raise ValueError(f"Unknown polygonization method '{method}', expected one of {POLYGONIZATION_METHODS}")
+
+def create_network_buffer(args: Tuple[int, int, float, bool, str, float]) -> Tuple[int, Optional[Polygon]]:
+    """
+    Create a network buffer for a single origin node using the worker graph.
+
+    Args:
+        args: Tuple of (idx, nearest_node, distance, remove_holes, polygonization, concave_ratio).
+
+    Returns:
+        Tuple of (index, buffer geometry in the graph CRS). The geometry is empty when
+        no edge is reachable and None when an error occurred.
+    """
+    idx, nearest_node, distance, remove_holes, polygonization, concave_ratio = args
+    G = _WORKER_GRAPH
     try:
-        logger.debug(f"Point {idx}: Processing nearest node {nearest_node}")
+        logger.debug(f"Origin {idx}: Processing nearest node {nearest_node}")
 
         # Calculate reachable nodes within distance
         lengths = nx.single_source_dijkstra_path_length(G, nearest_node, weight='length', cutoff=distance)
         reachable_nodes = list(lengths.keys())
-        logger.debug(f"Point {idx}: Found {len(reachable_nodes)} reachable nodes")
-
-        # Combine edge geometries
-        edge_geoms = [
-            data['geometry'] for u, v, data in G.edges(data=True)
-            if u in reachable_nodes and v in reachable_nodes and 'geometry' in data
-        ]
-        logger.debug(f"Point {idx}: Found {len(edge_geoms)} edge geometries")
-
-        if not edge_geoms:
-            logger.warning(f"No edge geometries for point {idx}, using circular buffer")
-            point_utm = Point(x, y)
-            buffer = point_utm.buffer(distance)  # Fallback to circular buffer
-        else:
-            buffer = unary_union(edge_geoms).buffer(10)  # 10m buffer around edges
+        logger.debug(f"Origin {idx}: Found {len(reachable_nodes)} reachable nodes")
+
+        buffer = polygonize_reachable(G, reachable_nodes, polygonization, concave_ratio)
+        if buffer.is_empty:
+            return idx, buffer
 
         # Remove holes if requested
         if remove_holes and buffer.geom_type in ['Polygon', 'MultiPolygon']:
@@ -59,21 +97,231 @@ def create_network_buffer(args: Tuple[int, int, float, float, float, bool, str,
                 buffer = Polygon(buffer.exterior)
             elif buffer.geom_type == 'MultiPolygon':
                 buffer = MultiPolygon([Polygon(poly.exterior) for poly in buffer.geoms])
-            logger.debug(f"Point {idx}: Removed holes from geometry")
+            logger.debug(f"Origin {idx}: Removed holes from geometry")
 
         if not buffer.is_valid:
             buffer = buffer.buffer(0)
-            logger.debug(f"Point {idx}: Fixed invalid geometry")
+            logger.debug(f"Origin {idx}: Fixed invalid geometry")
 
-        # Convert to WGS84
-        buffer_wgs84 = gpd.GeoSeries([buffer], crs=crs).to_crs('EPSG:4326').iloc[0]
-        logger.debug(f"Point {idx}: Converted to WGS84")
-        return idx, buffer_wgs84
+        return idx, buffer
 
     except Exception as e:
-        logger.error(f"Error processing point {idx}: {e}")
+        logger.error(f"Error processing origin {idx}: {e}")
         return idx, None
 
+def resolve_osm_file(layer_name: str, params: Dict) -> str:
+    """
+    Returns the absolute path of the OSM XML file configured for a layer.
+
+    Raises:
+        ValueError: if 'osm_file' is missing from the parameters.
+        FileNotFoundError: if the file does not exist in ./utils/buffer/networks.
+    """
+    osm_filename = params.get("osm_file")
+    if not osm_filename:
+        raise ValueError(f"Missing 'osm_file' name in buffer_params for layer '{layer_name}'")
+
+    osm_file_path = os.path.abspath(os.path.join("./utils/buffer/networks", osm_filename))
+    if not os.path.exists(osm_file_path):
+        logger.error(f"OSM file not found: {osm_file_path}")
+        raise FileNotFoundError(f"OSM file not found: {osm_file_path}")
+    return osm_file_path
+
+# Projected graphs kept in memory, keyed by (path, size, mtime). Disabled by default (one-shot
+# runs); a resident process (see utils.pipeline.engine) raises GRAPH_CACHE_SIZE to keep its
+# graphs, and their snapping index, warm between runs.
+GRAPH_CACHE_SIZE = 0
+_GRAPH_CACHE: "OrderedDict[Tuple, nx.MultiDiGraph]" = OrderedDict()
+
+def load_network_graph(osm_file_path: str) -> nx.MultiDiGraph:
+    """
+    Loads a street network from an OSM XML file and projects it to UTM.
+
+    The returned graph may be shared with later calls (GRAPH_CACHE_SIZE > 0) and must not be
+    modified in place; graph.prepare_routing_graph always returns a new graph.
+
+    Args:
+        osm_file_path: Absolute path to the OSM XML file.
+
+    Returns:
+        Projected MultiDiGraph (may be empty).
+    """
+    stat = os.stat(osm_file_path)
+    key = (osm_file_path, stat.st_size, stat.st_mtime_ns)
+    if key in _GRAPH_CACHE:
+        _GRAPH_CACHE.move_to_end(key)
+        logger.info(f"Network reused from memory: {osm_file_path}")
+        return _GRAPH_CACHE[key]
+
+    logger.info(f"Loading OSM file: {osm_file_path}")
+    G = ox.graph_from_xml(osm_file_path, simplify=True)
+    logger.info(f"Loaded network: {G.number_of_nodes()} nodes, {G.number_of_edges()} edges")
+
+    if G.number_of_nodes() > 0:
+        G = ox.project_graph(G, to_crs=UTM_CRS)
+        logger.debug(f"Projected to UTM CRS: {G.graph['crs']}")
+
+    if GRAPH_CACHE_SIZE > 0:
+        for stale in [k for k in _GRAPH_CACHE if k[0] == osm_file_path]:
+            del _GRAPH_CACHE[stale]
+        _GRAPH_CACHE[key] = G
+        while len(_GRAPH_CACHE) > GRAPH_CACHE_SIZE:
+            _GRAPH_CACHE.popitem(last=False)
+    return G
+
+def _network_buffer_chunk(task: Tuple[int, list]) -> Tuple[int, list]:
+    """Buffers of one chunk of origins, computed with the worker graph."""
+    chunk_id, chunk_args = task
+    return chunk_id, [create_network_buffer(args) for args in chunk_args]
+
+def _route_chunks(G: nx.MultiDiGraph, tasks: List[Tuple[int, list]]):
+    """
+    Yields (chunk_id, results) as chunks complete, through a single worker pool that
+    receives the graph once per process. Chunks left by a failed pool are computed
+    in the current process.
+    """
+    remaining = dict(tasks)
+    num_cores = max(min(cpu_count() - 1, 4), 1)
+    if num_cores > 1 and len(tasks) > 1:
+        logger.info(f"Using {num_cores} CPU cores for {len(tasks)} chunks")
+        try:
+            with MP_CONTEXT.Pool(num_cores, initializer=_init_worker, initargs=(G,)) as pool:
+                for chunk_id, results in pool.imap_unordered(_network_buffer_chunk, tasks):
+                    del remaining[chunk_id]
+                    yield chunk_id, results
+        except Exception as e:
+            logger.warning(f"Multiprocessing failed: {e}. Falling back to single-threaded")
+
+    _init_worker(G)
+    for task in list(remaining.items()):
+        yield _network_buffer_chunk(task)
+
+def compute_network_buffers(G: nx.MultiDiGraph, origins_utm: gpd.GeoSeries, distance: float,
+                            remove_holes: bool = True, chunk_size: int = 50,
+                            polygonization: str = "exact", concave_ratio: float = 0.05,
+                            snap_cache_dir: Optional[str] = None, checkpoint_dir: Optional[str] = None,
+                            shard: Optional[Tuple[int, int]] = None) -> gpd.GeoSeries:
+    """
+    Computes network buffers for a batch of origins in a single multi-origin pass.
+
+    Origins are snapped to the graph in one vectorized query, origins sharing a
+    nearest node are routed once, and all remaining tasks go through a single worker
+    pool that receives the graph once per process.
+
+    With a checkpoint directory, every completed chunk is written to a store keyed by
+    the graph, the origins and the buffer parameters (see checkpoint.ChunkStore): a
+    restarted run only computes the chunks that are missing from the store. The store
+    is deleted once a non-sharded run has assembled every chunk.
+
+    Args:
+        G: Projected street graph.
+        origins_utm: Point geometries in the graph CRS.
+        distance: Maximum network distance in meters.
+        remove_holes: Remove interior rings from the buffers.
+        chunk_size: Number of tasks sent to a worker at once (and checkpointed together).
+        polygonization: "exact" (buffered edge union) or "concave" (concave hull), see polygonize_reachable.
+        concave_ratio: Concave hull ratio used by the "concave" polygonization.
+        snap_cache_dir: Snap cache directory (see snapping.snap_to_nodes), None to disable.
+        checkpoint_dir: Chunk store root directory, None to disable checkpointing.
+        shard: (index, count) to compute only the chunks such that chunk_id % count == index,
+            e.g. one shard per machine sharing (or later merging) the checkpoint store.
+            Requires checkpoint_dir.
+
+    Returns:
+        GeoSeries of buffers in the graph CRS, aligned on the positions of origins_utm
+        (None where the buffer could not be computed).
+
+    Raises:
+        checkpoint.ShardComplete: A sharded run checkpointed its chunks but the store
+            does not hold every chunk yet; the buffers are only assembled once it does.
+    """
+    if polygonization not in POLYGONIZATION_METHODS:
+        raise ValueError(f"Unknown polygonization method '{polygonization}', expected one of {POLYGONIZATION_METHODS}")
+    if shard is not None and not checkpoint_dir:
+        raise ValueError("A sharded run needs a checkpoint directory to store its chunks")
+
+    utm_crs = G.graph['crs']
+    if origins_utm.empty:
+        return gpd.GeoSeries([], crs=utm_crs)
+
+    # 1. Snap every origin in one query, then route each distinct node only once
+    X = origins_utm.x.to_numpy()
+    Y = origins_utm.y.to_numpy()
+    nearest_nodes, _ = snapping.snap_to_nodes(G, X, Y, snap_cache_dir)
+    unique_nodes, inverse = np.unique(nearest_nodes, return_inverse=True)
+    logger.info(f"Snapped {len(origins_utm)} origins to {len(unique_nodes)} distinct nodes")
+
+    worker_args = [(i, node, distance, remove_holes, polygonization, concave_ratio)
+                   for i, node in enumerate(unique_nodes)]
+    chunks = [worker_args[start:start + chunk_size] for start in range(0, len(worker_args), chunk_size)]
+    node_buffers = np.full(len(unique_nodes), None, dtype=object)
+
+    # 2. Resume from the chunks already in the checkpoint store
+    store = None
+    done = set()
+    if checkpoint_dir:
+        buffer_params = {"distance": distance, "remove_holes": remove_holes, "chunk_size": chunk_size,
+                         "polygonization": polygonization, "concave_ratio": concave_ratio}
+        fingerprint = f"{snapping.get_snap_index(G).signature}:{snapping.layer_fingerprint(X, Y)}"
+        store = checkpoint.ChunkStore(checkpoint_dir, checkpoint.run_key(fingerprint, buffer_params), utm_crs,
+                                      metadata={**buffer_params, "origins": len(origins_utm), "chunks": len(chunks)})
+        done = store.done_chunks() & set(range(len(chunks)))
+        for position, buffer in store.load(sorted(done)).items():
+            node_buffers[position] = buffer
+        logger.info(f"Checkpoint {store.path}: {len(done)}/{len(chunks)} chunks already computed")
+
+    pending = [(chunk_id, chunk) for chunk_id, chunk in enumerate(chunks)
+               if chunk_id not in done and (shard is None or chunk_id % shard[1] == shard[0])]
+
+    # 3. Route the pending chunks through a single pool, checkpointing each one as it completes
+    for chunk_id, results in tqdm(_route_chunks(G, pending), total=len(pending), desc="Network buffers"):
+        positions = np.array([idx for idx, _ in results])
+        buffers = np.empty(len(results), dtype=object)
+        buffers[:] = [buffer for _, buffer in results]
+        node_buffers[positions] = buffers
+        if store is not None:
+            if shapely.is_missing(buffers).any():
+                logger.warning(f"Chunk {chunk_id} has failed origins, not checkpointed")
+            else:
+                store.save(chunk_id, positions, buffers)
+
+    # A shard stops here until the store holds the chunks of every shard
+    if shard is not None:
+        stored = store.done_chunks() & set(range(len(chunks)))
+        if len(stored) < len(chunks):
+            raise checkpoint.ShardComplete(shard, len(stored), len(chunks), store.path)
+        for position, buffer in store.load(sorted(stored - done)).items():
+            if node_buffers[position] is None:
+                node_buffers[position] = buffer
+    elif store is not None and store.done_chunks() >= set(range(len(chunks))):
+        # Every chunk is assembled: the store is no longer needed for a restart
+        store.remove()
+
+    # 4. Spread node buffers back to origins, falling back to a circular buffer
+    #    around the origin itself when no edge was reachable
+    origin_buffers = node_buffers[inverse]
+    fallback = shapely.is_empty(origin_buffers)
+    if fallback.any():
+        logger.warning(f"No edge geometries for {fallback.sum()} origins, using circular buffers")
+        origin_buffers[fallback] = shapely.buffer(origins_utm.to_numpy()[fallback], distance)
+
+    logger.info(f"Generated {(~shapely.is_missing(origin_buffers)).sum()}/{len(origins_utm)} valid buffer polygons")
+    return gpd.GeoSeries(origin_buffers, crs=utm_crs)
+
+def _finalize_buffer_gdf(source_gdf: gpd.GeoDataFrame, buffers_utm: gpd.GeoSeries, layer_name: str) -> gpd.GeoDataFrame:
+    """Replaces the geometries of source_gdf by the buffers (positionally aligned) and adds metadata."""
+    buffer_gdf = source_gdf.copy()
+    buffer_gdf['geometry'] = buffers_utm.to_crs("EPSG:4326").to_numpy()
+    buffer_gdf = buffer_gdf[buffer_gdf.geometry.notnull()]
+
+    if buffer_gdf.empty:
+        return buffer_gdf
+
+    buffer_gdf['area_km2'] = buffers_utm[buffers_utm.notna()].area.to_numpy() / 1_000_000
+    buffer_gdf['buffer_type'] = 'network_buffer'
+    buffer_gdf['buffer_layer'] = layer_name
+    return buffer_gdf
+
 def apply_points_network_buffer(points_gdf: gpd.GeoDataFrame, layer_name: str, buffer_params: Dict) -> gpd.GeoDataFrame:
     """
     Generates network-based buffers for points, preserving original columns, using a pre-downloaded OSM XML file.
@@ -81,7 +329,8 @@ def apply_points_network_buffer(points_gdf: gpd.GeoDataFrame, layer_name: str, b
     Args:
         points_gdf: GeoDataFrame with Point geometries.
         layer_name: Name of the layer for buffer parameters.
-        buffer_params: Dictionary of buffer parameters (e.g., distance, network_type, osm_file, use_envelope).
+        buffer_params: Dictionary of buffer parameters (e.g., distance, network_type, osm_file, use_envelope,
+            polygonization, concave_ratio, and the graph preprocessing options of graph.prepare_routing_graph).
 
     Returns:
         GeoDataFrame with network buffer polygons.
@@ -102,106 +351,167 @@ def apply_points_network_buffer(points_gdf: gpd.GeoDataFrame, layer_name: str, b
     distance = params.get("distance", 500)  # meters
     network_type = params.get("network_type", "walk")
     use_envelope = params.get("use_envelope", True)
+    polygonization = params.get("polygonization", "exact")
+    concave_ratio = params.get("concave_ratio", 0.05)
 
-    osm_filename = params.get("osm_file")
-    if not osm_filename:
-        raise ValueError(f"Missing 'osm_file' name in buffer_params for layer '{layer_name}'")
-    
-    osm_file = os.path.join("./utils/buffer/networks", osm_filename)
+    osm_file_path = resolve_osm_file(layer_name, params)
 
     if distance <= 0:
         logger.warning(f"Invalid buffer distance {distance} for {layer_name}, returning unchanged")
         return points_gdf.copy()
 
-    if not osm_file:
-        logger.error(f"No OSM file specified for {layer_name}")
-        raise ValueError(f"OSM file must be specified in buffer_params for {layer_name}")
-
-    osm_file_path = os.path.abspath(osm_file)
-    if not os.path.exists(osm_file_path):
-        logger.error(f"OSM file not found: {osm_file_path}")
-        raise FileNotFoundError(f"OSM file not found: {osm_file_path}")
-
     logger.info(f"Creating network buffers for {layer_name}: distance={distance}m, network_type={network_type}, "
-                f"use_envelope={use_envelope}, osm_file={osm_file_path}")
+                f"use_envelope={use_envelope}, polygonization={polygonization}, osm_file={osm_file_path}")
 
     try:
-        # 1. Load street network from OSM XML file
-        logger.info(f"Loading OSM file: {osm_file_path}")
-        G = ox.graph_from_xml(osm_file_path, simplify=True)
-        logger.info(f"Loaded network: {G.number_of_nodes()} nodes, {G.number_of_edges()} edges")
-
+        G = load_network_graph(osm_file_path)
         if G.number_of_nodes() == 0:
             logger.error(f"No nodes in network for {layer_name}, returning original GDF")
             return points_gdf.copy()
 
-        # 2. Project to UTM
-        G = ox.project_graph(G, to_crs="EPSG:32618")  # UTM Zone 18N for Montreal
-        points_utm = points_gdf.to_crs("EPSG:32618").geometry
-        utm_crs = G.graph['crs']
-        logger.debug(f"Projected to UTM CRS: {utm_crs}")
-
-        # 3. Find nearest nodes
-        X = np.array([p.x for p in points_utm])
-        Y = np.array([p.y for p in points_utm])
-        nearest_nodes = ox.distance.nearest_nodes(G, X, Y)
-        logger.debug(f"Found nearest nodes for {len(points_gdf)} points")
-
-        # 4. Process buffers with multiprocessing
-        num_cores = min(cpu_count() - 1, 4)
-        logger.info(f"Using {num_cores} CPU cores for processing")
-        chunk_size = 50
-        buffer_gdf = points_gdf.copy()
-
-        for start in range(0, len(points_gdf), chunk_size):
-            end = min(start + chunk_size, len(points_gdf))
-            chunk_utm = points_utm[start:end]
-            chunk_nodes = nearest_nodes[start:end]
-            logger.info(f"Processing chunk {start//chunk_size + 1} ({start} to {end})")
-
-            # Prepare arguments for workers
-            worker_args = [
-                (i + start, chunk_nodes[i], chunk_utm.iloc[i].x, chunk_utm.iloc[i].y, distance, use_envelope, utm_crs, G)
-                for i in range(len(chunk_utm))
-            ]
-
-            try:
-                with Pool(num_cores) as pool:
-                    results = list(tqdm(
-                        pool.imap(create_network_buffer, worker_args),
-                        total=len(chunk_utm),
-                        desc=f"Chunk {start//chunk_size + 1}"
-                    ))
-            except Exception as e:
-                logger.warning(f"Multiprocessing failed for chunk {start//chunk_size + 1}: {e}. Falling back to single-threaded")
-                results = [create_network_buffer(args) for args in tqdm(worker_args, desc=f"Chunk {start//chunk_size + 1}")]
-
-            # Update geometries
-            valid_buffers = 0
-            for idx, buffer in results:
-                if buffer is not None:
-                    buffer_gdf.at[idx, 'geometry'] = buffer
-                    valid_buffers += 1
-            logger.info(f"Chunk {start//chunk_size + 1}: Generated {valid_buffers}/{len(chunk_utm)} valid buffers")
-
-        # 5. Filter valid geometries and add metadata
-        buffer_gdf = buffer_gdf[buffer_gdf.geometry.notnull()]
-        logger.info(f"Generated {len(buffer_gdf)}/{len(points_gdf)} valid buffer polygons")
-
-        if not buffer_gdf.empty:
-            buffer_gdf['area_km2'] = buffer_gdf.geometry.to_crs("EPSG:32618").area / 1_000_000
-            buffer_gdf['buffer_type'] = 'network_buffer'
-            buffer_gdf['buffer_layer'] = layer_name
-        else:
+        points_utm = points_gdf.to_crs(UTM_CRS).geometry
+        G = graph.prepare_routing_graph(G, points_utm, distance, params)
+        buffers_utm = compute_network_buffers(G, points_utm, distance, use_envelope,
+                                              polygonization=polygonization, concave_ratio=concave_ratio,
+                                              snap_cache_dir=snapping.cache_dir(params),
+                                              checkpoint_dir=checkpoint.checkpoint_dir(params),
+                                              shard=params.get("shard"))
+
+        buffer_gdf = _finalize_buffer_gdf(points_gdf, buffers_utm, layer_name)
+        if buffer_gdf.empty:
             logger.warning(f"No valid buffers created for {layer_name}, returning original GDF")
             return points_gdf.copy()
 
         return buffer_gdf
 
+    except checkpoint.ShardComplete:
+        raise
     except Exception as e:
         logger.error(f"Major error in network buffering for {layer_name}: {e}")
         return points_gdf.copy()
 
+def sample_line_points(lines_utm: gpd.GeoSeries, mode: str = "all",
+                       sample_distance: Optional[float] = None) -> Tuple[np.ndarray, gpd.GeoSeries]:
+    """
+    Samples origin points along lines for network buffering, in bulk.
+
+    Args:
+        lines_utm: (Multi)LineString geometries in a projected CRS.
+        mode: "centroid" for the centroid only, "all" for the centroid and both ends.
+        sample_distance: If set, also samples a point every sample_distance meters
+            along each line (ends included).
+
+    Returns:
+        Tuple of (positions of the parent line for each point, sampled points).
+    """
+    positions = np.arange(len(lines_utm))
+    geoms = lines_utm.to_numpy()
+
+    parents = [positions]
+    points = [shapely.centroid(geoms)]
+
+    if mode == "all":
+        parents += [positions, positions]
+        points += [shapely.line_interpolate_point(geoms, 0.0, normalized=True),
+                   shapely.line_interpolate_point(geoms, 1.0, normalized=True)]
+
+    if sample_distance:
+        lengths = shapely.length(geoms)
+        counts = np.floor(lengths / sample_distance).astype(int) + 1
+        line_pos = np.repeat(positions, counts)
+        # Offset of each sample within its line: 0, d, 2d, ...
+        offsets = (np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)) * sample_distance
+        parents += [line_pos, positions]
+        points += [shapely.line_interpolate_point(geoms[line_pos], offsets),
+                   shapely.line_interpolate_point(geoms, 1.0, normalized=True)]
+
+    return np.concatenate(parents), gpd.GeoSeries(np.concatenate(points), crs=lines_utm.crs)
+
+def sample_polygon_points(polygons_utm: gpd.GeoSeries, mode: str = "all",
+                          sample_distance: Optional[float] = None) -> Tuple[np.ndarray, gpd.GeoSeries]:
+    """
+    Samples origin points on polygons for network buffering, in bulk.
+
+    Args:
+        polygons_utm: (Multi)Polygon geometries in a projected CRS.
+        mode: "centroid" for the centroid only, "all" for the centroid and bounding box corners.
+        sample_distance: If set, also samples a point every sample_distance meters
+            along the polygon boundaries.
+
+    Returns:
+        Tuple of (positions of the parent polygon for each point, sampled points).
+    """
+    positions = np.arange(len(polygons_utm))
+    geoms = polygons_utm.to_numpy()
+
+    parents = [positions]
+    points = [shapely.centroid(geoms)]
+
+    if mode == "all":
+        bounds = shapely.bounds(geoms)
+        for x_col, y_col in [(0, 1), (0, 3), (2, 1), (2, 3)]:
+            parents.append(positions)
+            points.append(shapely.points(bounds[:, x_col], bounds[:, y_col]))
+
+    if sample_distance:
+        boundaries = gpd.GeoSeries(shapely.boundary(geoms), index=positions, crs=polygons_utm.crs)
+        boundaries = boundaries.explode(index_parts=False)
+        ring_parents, ring_points = sample_line_points(boundaries, mode="centroid", sample_distance=sample_distance)
+        # Keep only the regular samples: the centroid of a ring is not on the boundary
+        # and its end point is its start point
+        sample_rank = np.arange(len(ring_parents))
+        on_ring = (sample_rank >= len(boundaries)) & (sample_rank < len(ring_parents) - len(boundaries))
+        parents.append(boundaries.index.to_numpy()[ring_parents[on_ring]])
+        points.append(ring_points.to_numpy()[on_ring])
+
+    return np.concatenate(parents), gpd.GeoSeries(np.concatenate(points), crs=polygons_utm.crs)
+
+def _apply_sampled_network_buffer(source_gdf: gpd.GeoDataFrame, layer_name: str, buffer_params: dict,
+                                  sampler, mode: str = "all") -> gpd.GeoDataFrame:
+    """
+    Routes the sample points of every feature in one batch and unions the buffers by parent feature.
+    """
+    params = buffer_params[layer_name]
+    distance = params.get("distance", 500)
+    use_envelope = params.get("use_envelope", True)
+    polygonization = params.get("polygonization", "exact")
+    concave_ratio = params.get("concave_ratio", 0.05)
+    mode = params.get("sample_mode", mode)
+    sample_distance = params.get("sample_distance")
+
+    osm_file_path = resolve_osm_file(layer_name, params)
+
+    if distance <= 0:
+        logger.warning(f"Invalid buffer distance {distance} for {layer_name}, returning unchanged")
+        return source_gdf.copy()
+
+    G = load_network_graph(osm_file_path)
+    if G.number_of_nodes() == 0:
+        logger.error(f"No nodes in network for {layer_name}, returning original GDF")
+        return source_gdf.copy()
+
+    # 1. Sample origins for all features at once
+    geoms_utm = source_gdf.geometry.to_crs(UTM_CRS)
+    parents, sample_points = sampler(geoms_utm, mode=mode, sample_distance=sample_distance)
+    logger.info(f"Sampled {len(sample_points)} origins from {len(source_gdf)} features of {layer_name}")
+    G = graph.prepare_routing_graph(G, sample_points, distance, params)
+
+    # 2. Single multi-origin routing pass
+    sample_buffers = compute_network_buffers(G, sample_points, distance, use_envelope,
+                                             polygonization=polygonization, concave_ratio=concave_ratio,
+                                             snap_cache_dir=snapping.cache_dir(params),
+                                             checkpoint_dir=checkpoint.checkpoint_dir(params),
+                                             shard=params.get("shard"))
+
+    # 3. Union the buffers by parent feature in bulk
+    valid = sample_buffers.notna().to_numpy()
+    merged = gpd.GeoDataFrame(
+        {'parent': parents[valid]}, geometry=sample_buffers[valid].to_numpy(), crs=G.graph['crs']
+    ).dissolve(by='parent')
+    buffers_utm = gpd.GeoSeries(merged.geometry.reindex(np.arange(len(source_gdf))).to_numpy(), crs=G.graph['crs'])
+
+    return _finalize_buffer_gdf(source_gdf, buffers_utm, layer_name)
+
 def apply_lines_network_buffer(
     lines_gdf: gpd.GeoDataFrame,
     layer_name: str,
@@ -209,52 +519,35 @@ def apply_lines_network_buffer(
     mode: str = "all"  # "centroid" ou "all"
 ) -> gpd.GeoDataFrame:
     """
-    Génère un buffer réseau autour des lignes :
+    Génère un buffer réseau autour des lignes, en un seul passage pour toutes les lignes.
+    Le mode peut être remplacé par le paramètre 'sample_mode' de la couche :
       - mode="centroid" : buffer autour du centroïde
-      - mode="all" : buffer autour du centroïde + extrémités, puis union
+      - mode="all" (défaut) : buffer autour du centroïde + extrémités, puis union
+      - sample_distance : ajoute un point d'échantillonnage tous les N mètres le long de la ligne
     """
     if lines_gdf.empty:
-        print(f"La couche '{layer_name}' est vide.")
+        logger.warning(f"La couche '{layer_name}' est vide.")
         return lines_gdf.copy()
 
     if layer_name not in buffer_params:
-        print(f"Aucun paramètre trouvé pour la couche '{layer_name}'")
+        logger.warning(f"Aucun paramètre trouvé pour la couche '{layer_name}'")
         return lines_gdf.copy()
 
     if not all(lines_gdf.geometry.geom_type == "LineString"):
         raise ValueError("Toutes les géométries doivent être de type LineString.")
 
     try:
-        buffer_list = []
-
-        for idx, row in lines_gdf.iterrows():
-            line = row.geometry
-
-            # Points à bufferiser
-            points = [line.centroid]
-            if mode == "all":
-                points.append(Point(line.coords[0]))       # Extrémité début
-                points.append(Point(line.coords[-1]))      # Extrémité fin
-
-            # Construire un GDF temporaire avec ces points
-            temp_gdf = gpd.GeoDataFrame([row] * len(points), geometry=points, crs=lines_gdf.crs)
-
-            # Appliquer les buffers réseaux
-            temp_buffers = apply_points_network_buffer(temp_gdf, layer_name, buffer_params)
-
-            if not temp_buffers.empty:
-                # Union des buffers
-                merged = temp_buffers.unary_union
-                buffer_list.append({"geometry": merged, **row.drop("geometry")})
+        buffer_gdf = _apply_sampled_network_buffer(lines_gdf, layer_name, buffer_params, sample_line_points, mode)
 
-        if buffer_list:
-            return gpd.GeoDataFrame(buffer_list, crs=lines_gdf.crs)
-        else:
-            print(f"Aucun buffer valide généré pour {layer_name}")
+        if buffer_gdf.empty:
+            logger.warning(f"Aucun buffer valide généré pour {layer_name}")
             return lines_gdf.copy()
+        return buffer_gdf
 
+    except checkpoint.ShardComplete:
+        raise
     except Exception as e:
-        print(f"Erreur dans apply_lines_network_buffer pour '{layer_name}': {e}")
+        logger.error(f"Erreur dans apply_lines_network_buffer pour '{layer_name}': {e}")
         return lines_gdf.copy()
 
 def apply_polygons_network_buffer(
@@ -264,101 +557,33 @@ def apply_polygons_network_buffer(
     mode: str = "all"  # "centroid" ou "all"
 ) -> gpd.GeoDataFrame:
     """
-    Génère un buffer réseau autour des polygones :
+    Génère un buffer réseau autour des polygones, en un seul passage pour tous les polygones.
+    Le mode peut être remplacé par le paramètre 'sample_mode' de la couche :
       - mode="centroid" : buffer autour du centroïde
-      - mode="all" : buffer autour du centroïde + coins du bounding box, puis union
+      - mode="all" (défaut) : buffer autour du centroïde + coins du bounding box, puis union
+      - sample_distance : ajoute un point d'échantillonnage tous les N mètres le long du contour
     """
     if polygons_gdf.empty:
-        print(f"La couche '{layer_name}' est vide.")
+        logger.warning(f"La couche '{layer_name}' est vide.")
         return polygons_gdf.copy()
 
     if layer_name not in buffer_params:
-        print(f"Aucun paramètre trouvé pour la couche '{layer_name}'")
+        logger.warning(f"Aucun paramètre trouvé pour la couche '{layer_name}'")
         return polygons_gdf.copy()
 
     if not polygons_gdf.geometry.geom_type.isin(["Polygon", "MultiPolygon"]).all():
         raise ValueError("Toutes les géométries doivent être de type Polygon ou MultiPolygon.")
 
     try:
-        buffer_list = []
-
-        for idx, row in polygons_gdf.iterrows():
-            poly = row.geometry
-
-            # Points à bufferiser
-            points = [poly.centroid]
-
-            if mode == "all":
-                minx, miny, maxx, maxy = poly.bounds
-                points.extend([
-                    Point(minx, miny),
-                    Point(minx, maxy),
-                    Point(maxx, miny),
-                    Point(maxx, maxy),
-                ])
-
-            # Construire un GDF temporaire avec ces points
-            temp_gdf = gpd.GeoDataFrame([row] * len(points), geometry=points, crs=polygons_gdf.crs)
-
-            # Appliquer les buffers réseaux
-            temp_buffers = apply_points_network_buffer(temp_gdf, layer_name, buffer_params)
-
-            if not temp_buffers.empty:
-                # Union des buffers
-                merged = temp_buffers.unary_union
-                buffer_list.append({"geometry": merged, **row.drop("geometry")})
-
-        if buffer_list:
-            return gpd.GeoDataFrame(buffer_list, crs=polygons_gdf.crs)
-        else:
-            print(f"Aucun buffer valide généré pour {layer_name}")
+        buffer_gdf = _apply_sampled_network_buffer(polygons_gdf, layer_name, buffer_params, sample_polygon_points, mode)
+
+        if buffer_gdf.empty:
+            logger.warning(f"Aucun buffer valide généré pour {layer_name}")
             return polygons_gdf.copy()
+        return buffer_gdf
 
+    except checkpoint.ShardComplete:
+        raise
     except Exception as e:
-        print(f"Erreur dans apply_polygons_network_buffer pour '{layer_name}': {e}")
+        logger.error(f"Erreur dans apply_polygons_network_buffer pour '{layer_name}': {e}")
         return polygons_gdf.copy()
-
-
-#TODO Add this logic too 
-# def apply_lines_network_buffer(lines_gdf: gpd.GeoDataFrame, layer_name: str, buffer_params: dict) -> gpd.GeoDataFrame:
-#     """
-#     Génère des zones tampon réseau pour chaque ligne (à partir de points équidistants).
-#     """
-#     buffer_gdf = lines_gdf.copy()
-    
-#     if layer_name not in buffer_params:
-#         print(f"Aucun paramètre trouvé pour la couche '{layer_name}'")
-#         return buffer_gdf
-    
-#     params = buffer_params[layer_name]
-#     distance = params.get("distance", 500)
-#     network_type = params.get("network_type", "walk")
-#     sample_distance = params.get("sample_distance", 50)  # Distance entre les points d'échantillonnage
-    
-#     if not all(buffer_gdf.geometry.geom_type == "LineString"):
-#         raise ValueError("Toutes les géométries doivent être de type LineString.")
-    
-#     try:
-#         # 1. Échantillonnage des points le long des lignes
-#         buffer_gdf['sample_points'] = buffer_gdf.geometry.apply(
-#             lambda geom: [Point(geom.interpolate(d).coords[0]) 
-#                          for d in np.arange(0, geom.length, sample_distance)]
-#         )
-        
-#         # 2. Explosion des points
-#         buffer_gdf = buffer_gdf.explode('sample_points')
-#         buffer_gdf['geometry'] = buffer_gdf['sample_points'].apply(lambda x: Point(x))
-#         buffer_gdf = buffer_gdf.drop(columns=['sample_points'])
-        
-#         # 3. Application du buffer réseau sur les points
-#         buffer_gdf = apply_points_network_buffer(buffer_gdf, layer_name, buffer_params)
-        
-#         # 4. Dissoudre les buffers par entité originale
-#         if 'buffer_id' in buffer_gdf.columns:
-#             buffer_gdf = buffer_gdf.dissolve(by='buffer_id').reset_index()
-        
-#     except Exception as e:
-#         print(f"Erreur majeure: {str(e)}")
-#         return lines_gdf
-    
-#     return buffer_gdf
\ No newline at end of file
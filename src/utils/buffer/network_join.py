@@ -0,0 +1,265 @@
+import geopandas as gpd
+import networkx as nx
+import numpy as np
+import pandas as pd
+import shapely
+import logging
+import time
+import utils.buffer.graph as graph
+import utils.buffer.network as network
+import utils.buffer.routing as routing
+import utils.buffer.snapping as snapping
+from typing import Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Join points are snapped to their nearest node, or onto their nearest edge ('snap_to' layer option)
+SNAP_TARGETS = ("node", "edge")
+
+# Arrays of the routing graph shared by the pool workers (set once per worker by _init_worker)
+_WORKER_ADJACENCY = None
+
+def _init_worker(adjacency) -> None:
+    global _WORKER_ADJACENCY
+    _WORKER_ADJACENCY = adjacency
+
+def sample_join_points(geoms_utm: gpd.GeoSeries, sample_distance: Optional[float] = None) -> Tuple[np.ndarray, gpd.GeoSeries]:
+    """
+    Points used to snap join features to the network: the point itself for points,
+    the samples of network.sample_line_points / network.sample_polygon_points otherwise.
+
+    Returns:
+        Tuple of (positions of the parent feature for each point, sampled points).
+    """
+    geom_types = geoms_utm.geom_type.to_numpy()
+    families = {
+        "point": np.isin(geom_types, ["Point"]),
+        "line": np.isin(geom_types, ["LineString", "MultiLineString"]),
+        "polygon": np.isin(geom_types, ["Polygon", "MultiPolygon"]),
+    }
+
+    parents, points = [], []
+    for family, mask in families.items():
+        if not mask.any():
+            continue
+        positions = np.flatnonzero(mask)
+        if family == "point":
+            family_parents, family_points = np.arange(len(positions)), geoms_utm.iloc[positions]
+        elif family == "line":
+            family_parents, family_points = network.sample_line_points(
+                geoms_utm.iloc[positions], mode="all", sample_distance=sample_distance)
+        else:
+            family_parents, family_points = network.sample_polygon_points(
+                geoms_utm.iloc[positions], mode="all", sample_distance=sample_distance)
+        parents.append(positions[family_parents])
+        points.append(family_points.to_numpy())
+
+    if not parents:
+        return np.array([], dtype=int), gpd.GeoSeries([], crs=geoms_utm.crs)
+    return np.concatenate(parents), gpd.GeoSeries(np.concatenate(points), crs=geoms_utm.crs)
+
+def snap_to_nodes(G: nx.MultiDiGraph, arrays: routing.GraphArrays, points_utm: gpd.GeoSeries,
+                  snap_tolerance: Optional[float] = None, cache_dir: Optional[str] = None) -> np.ndarray:
+    """
+    Snaps points to their nearest node in one query.
+
+    Points outside of the study area of a clipped graph (G.graph['study_area']) or farther
+    than snap_tolerance meters from their node are not snapped.
+
+    Returns:
+        Positions of the nodes in arrays, -1 for points that were not snapped.
+    """
+    snapped = np.full(len(points_utm), -1, dtype=int)
+    if points_utm.empty or len(arrays.nodes) == 0:
+        return snapped
+
+    X = points_utm.x.to_numpy()
+    Y = points_utm.y.to_numpy()
+    valid = np.ones(len(points_utm), dtype=bool)
+    study_area = G.graph.get('study_area')
+    if study_area is not None:
+        valid &= shapely.contains_xy(study_area, X, Y)
+    if not valid.any():
+        return snapped
+
+    nodes, offsets = snapping.snap_to_nodes(G, X[valid], Y[valid], cache_dir)
+    snapped[valid] = arrays.positions_of(nodes)
+    if snap_tolerance is not None:
+        snapped[np.flatnonzero(valid)[offsets > snap_tolerance]] = -1
+    return snapped
+
+def snap_to_edges(G: nx.MultiDiGraph, arrays: routing.GraphArrays, points_utm: gpd.GeoSeries,
+                  snap_tolerance: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Snaps points onto their nearest edge in one query (see snapping.SnapIndex.nearest_edges).
+
+    A point snapped on the edge (u, v) is reached through u, then along the edge up to the
+    point, or through v when the reverse edge (v, u) exists. Points outside of the study
+    area of a clipped graph or farther than snap_tolerance meters from their edge are not
+    snapped.
+
+    Returns:
+        Tuple of (positions in arrays of the entry nodes u and v, -1 when not snapped or
+        when v has no reverse edge; distances in meters from each entry node to the point
+        along the edge), both of shape (number of points, 2).
+    """
+    entries = np.full((len(points_utm), 2), -1, dtype=int)
+    offsets = np.zeros((len(points_utm), 2))
+    if points_utm.empty or len(arrays.nodes) == 0 or G.number_of_edges() == 0:
+        return entries, offsets
+
+    X = points_utm.x.to_numpy()
+    Y = points_utm.y.to_numpy()
+    valid = np.ones(len(points_utm), dtype=bool)
+    study_area = G.graph.get('study_area')
+    if study_area is not None:
+        valid &= shapely.contains_xy(study_area, X, Y)
+    edges, dist = snapping.get_snap_index(G).nearest_edges(X[valid], Y[valid], return_dist=True)
+    if snap_tolerance is not None:
+        valid[np.flatnonzero(valid)[dist > snap_tolerance]] = False
+        edges = edges[dist <= snap_tolerance]
+    if not valid.any():
+        return entries, offsets
+
+    geometries = [snapping.edge_geometry(G, u, v, G.edges[u, v, k]) for u, v, k in edges]
+    fractions = shapely.line_locate_point(geometries, points_utm.to_numpy()[valid], normalized=True)
+    lengths = np.array([G.edges[u, v, k]['length'] for u, v, k in edges], dtype=float)
+    reverse = np.array([G.has_edge(v, u) for u, v, _ in edges], dtype=bool)
+
+    rows = np.flatnonzero(valid)
+    entries[rows, 0] = arrays.positions_of([u for u, _, _ in edges])
+    entries[rows[reverse], 1] = arrays.positions_of([v for _, v, _ in edges[reverse]])
+    offsets[rows, 0] = fractions * lengths
+    offsets[rows, 1] = (1 - fractions) * lengths
+    return entries, offsets
+
+def _distance_chunk(task: Tuple[int, np.ndarray, np.ndarray, float]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Bounded search from a chunk of origin nodes, kept only on the nodes of the join features."""
+    start, sources, targets, distance = task
+    distances = routing.bounded_distances(_WORKER_ADJACENCY, sources, distance)[:, targets]
+    rows, cols = np.nonzero(distances <= distance)
+    return start + rows, cols, distances[rows, cols]
+
+def network_join_pairs(G: nx.MultiDiGraph, origin_parents: np.ndarray, origins_utm: gpd.GeoSeries,
+                       join_parents: np.ndarray, join_points_utm: gpd.GeoSeries, distance: float,
+                       snap_tolerance: Optional[float] = None, snap_cache_dir: Optional[str] = None,
+                       snap_to: str = "node") -> pd.DataFrame:
+    """
+    Finds the join features within a network distance of each origin feature.
+
+    Origins and join points are snapped to the graph once, every distinct origin node is
+    searched once (bounded by distance) and the distances are read directly on the nodes
+    of the join points: no buffer polygon is involved.
+
+    Args:
+        G: Projected (and usually clipped) routing graph.
+        origin_parents: Position of the origin feature of each origin point.
+        origins_utm: Origin points in the graph CRS.
+        join_parents: Position of the join feature of each join point.
+        join_points_utm: Join points in the graph CRS.
+        distance: Maximum network distance in meters.
+        snap_tolerance: Maximum distance in meters between a join point and its node (or edge).
+        snap_cache_dir: Snap cache directory (see snapping.snap_to_nodes), None to disable.
+        snap_to: "node" to snap join points to their nearest node, "edge" to snap them onto
+            their nearest edge (see snap_to_edges); origins are always snapped to nodes.
+
+    Returns:
+        DataFrame with one row per (origin, feature) pair: 'origin', 'feature', 'network_distance'
+        (meters, from the origin node to the join node, or to the join point on its edge) and
+        'proportion' (share of the feature's join points reached).
+    """
+    if snap_to not in SNAP_TARGETS:
+        raise ValueError(f"Unknown snap_to '{snap_to}', expected one of {SNAP_TARGETS}")
+    columns = ['origin', 'feature', 'network_distance', 'proportion']
+    start_time = time.time()
+    arrays = routing.GraphArrays.from_graph(G, "length")
+
+    origin_nodes = snap_to_nodes(G, arrays, origins_utm, cache_dir=snap_cache_dir)
+    if snap_to == "edge":
+        join_nodes, join_offsets = snap_to_edges(G, arrays, join_points_utm, snap_tolerance)
+    else:
+        join_nodes = snap_to_nodes(G, arrays, join_points_utm, snap_tolerance, snap_cache_dir)[:, None]
+        join_offsets = np.zeros(join_nodes.shape)
+    # Entry nodes of each join point (one per point for nodes, up to two for edges)
+    snapped = join_nodes >= 0
+    join_points = np.nonzero(snapped)[0]
+    if not snapped.any() or not (origin_nodes >= 0).any():
+        return pd.DataFrame(columns=columns)
+
+    sources, source_inverse = np.unique(origin_nodes[origin_nodes >= 0], return_inverse=True)
+    targets, target_inverse = np.unique(join_nodes[snapped], return_inverse=True)
+
+    chunk_size = routing.distance_chunk_size(len(arrays.nodes))
+    tasks = [(start, sources[start:start + chunk_size], targets, distance)
+             for start in range(0, len(sources), chunk_size)]
+    results = routing.map_chunks(_distance_chunk, tasks, _init_worker, (arrays.adjacency,))
+
+    node_pairs = pd.DataFrame({
+        'source': np.concatenate([rows for rows, _, _ in results]),
+        'target': np.concatenate([cols for _, cols, _ in results]),
+        'network_distance': np.concatenate([values for _, _, values in results]),
+    })
+
+    # Node pairs -> (origin feature, join point) -> (origin feature, join feature)
+    origin_index = pd.DataFrame({'source': source_inverse, 'origin': origin_parents[origin_nodes >= 0]}).drop_duplicates()
+    join_index = pd.DataFrame({'target': target_inverse, 'feature': join_parents[join_points],
+                               'point': join_points, 'offset': join_offsets[snapped]})
+    point_pairs = node_pairs.merge(origin_index, on='source').merge(join_index, on='target')
+    point_pairs['network_distance'] += point_pairs['offset']
+    point_pairs = (point_pairs[point_pairs['network_distance'] <= distance]
+                   .groupby(['origin', 'feature', 'point'], as_index=False)['network_distance'].min())
+
+    pairs = point_pairs.groupby(['origin', 'feature'], as_index=False).agg(
+        network_distance=('network_distance', 'min'), reached=('point', 'size'))
+    points_per_feature = np.bincount(join_parents)
+    pairs['proportion'] = pairs['reached'] / points_per_feature[pairs['feature'].to_numpy()]
+
+    logger.info(f"Network join: {len(sources)} origin nodes x {len(targets)} join nodes, "
+                f"{len(pairs)} pairs within {distance} m in {time.time() - start_time:.2f} s")
+    return pairs[columns]
+
+def origin_points(source_gdf: gpd.GeoDataFrame, params: dict) -> Tuple[np.ndarray, gpd.GeoSeries]:
+    """Origin points of a buffer layer, sampled like the network buffers of the same layer."""
+    geoms_utm = source_gdf.geometry.to_crs(network.UTM_CRS)
+    geom_types = geoms_utm.geom_type
+    mode = params.get("sample_mode", "all")
+    sample_distance = params.get("sample_distance")
+
+    if (geom_types == "Point").all():
+        return np.arange(len(geoms_utm)), geoms_utm.reset_index(drop=True)
+    if geom_types.isin(["LineString", "MultiLineString"]).all():
+        return network.sample_line_points(geoms_utm, mode=mode, sample_distance=sample_distance)
+    return network.sample_polygon_points(geoms_utm, mode=mode, sample_distance=sample_distance)
+
+def network_join(source_gdf: gpd.GeoDataFrame, join_gdfs: Dict[Hashable, gpd.GeoDataFrame], layer_name: str,
+                 buffer_params: dict) -> Dict[Hashable, pd.DataFrame]:
+    """
+    Network join of a buffer layer: for each join layer, the features within 'distance'
+    network meters of each feature of the buffer layer.
+
+    The graph is loaded and prepared once (see graph.prepare_routing_graph) for all the join
+    layers. Join features are sampled with 'join_sample_distance' (lines and polygons) and
+    dropped when farther than 'snap_tolerance' meters from the network.
+
+    Returns:
+        Pairs (see network_join_pairs) for each key of join_gdfs, 'origin' being the
+        position in source_gdf and 'feature' the position in the join layer.
+    """
+    params = buffer_params[layer_name]
+    distance = params.get("distance", 500)
+    G = network.load_network_graph(network.resolve_osm_file(layer_name, params))
+    if G.number_of_nodes() == 0:
+        logger.error(f"No nodes in network for {layer_name}, no network join")
+        return {}
+
+    parents, origins_utm = origin_points(source_gdf, params)
+    G = graph.prepare_routing_graph(G, origins_utm, distance, params)
+
+    pairs = {}
+    for key, join_gdf in join_gdfs.items():
+        join_parents, join_points_utm = sample_join_points(join_gdf.geometry.to_crs(network.UTM_CRS),
+                                                           params.get("join_sample_distance"))
+        pairs[key] = network_join_pairs(G, parents, origins_utm, join_parents, join_points_utm,
+                                                    distance, params.get("snap_tolerance"), snapping.cache_dir(params),
+                                                    params.get("snap_to", "node"))
+    return pairs
@@ -0,0 +1,90 @@
+import logging
+from multiprocessing import cpu_count, get_context
+from typing import Callable, List, Sequence, Tuple
+
+import networkx as nx
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+logger = logging.getLogger(__name__)
+
+# Budget mémoire d'une matrice de distances (origines x nœuds) calculée en une fois
+DISTANCE_MATRIX_BUDGET = 64 * 1024 * 1024  # octets
+
+class GraphArrays:
+    """
+    Représentation tabulaire d'un graphe projeté pour les calculs de plus courts chemins :
+    identifiants des nœuds, coordonnées (n, 2) et matrice d'adjacence creuse pondérée.
+    """
+
+    def __init__(self, nodes: np.ndarray, coords: np.ndarray, adjacency: csr_matrix, weight: str):
+        self.nodes = nodes
+        self.coords = coords
+        self.adjacency = adjacency
+        self.weight = weight
+        self._positions = None
+
+    @classmethod
+    def from_graph(cls, G: nx.MultiDiGraph, weight: str = "length") -> "GraphArrays":
+        nodes = np.array(list(G.nodes))
+        positions = {node: i for i, node in enumerate(nodes)}
+        coords = np.array([(data["x"], data["y"]) for _, data in G.nodes(data=True)], dtype=float)
+
+        edges = [(positions[u], positions[v], data.get(weight, np.inf)) for u, v, data in G.edges(data=True)]
+        if edges:
+            u_idx, v_idx, weights = (np.array(values) for values in zip(*edges))
+        else:
+            u_idx = v_idx = np.array([], dtype=int)
+            weights = np.array([], dtype=float)
+
+        # Arêtes parallèles : garder la plus courte (csr_matrix additionnerait les doublons)
+        order = np.lexsort((weights, v_idx, u_idx))
+        u_idx, v_idx, weights = u_idx[order], v_idx[order], weights[order].astype(float)
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = (u_idx[1:] != u_idx[:-1]) | (v_idx[1:] != v_idx[:-1])
+        # Un poids nul serait interprété comme une absence d'arête
+        weights = np.maximum(weights[first], 1e-9)
+
+        adjacency = csr_matrix((weights, (u_idx[first], v_idx[first])), shape=(len(nodes), len(nodes)))
+        return cls(nodes, coords, adjacency, weight)
+
+    def positions_of(self, node_ids: Sequence) -> np.ndarray:
+        """Convertit des identifiants de nœuds en positions dans les tableaux."""
+        if self._positions is None:
+            self._positions = {node: i for i, node in enumerate(self.nodes)}
+        return np.array([self._positions[node] for node in node_ids], dtype=int)
+
+def bounded_distances(adjacency: csr_matrix, sources: np.ndarray, limit: float) -> np.ndarray:
+    """
+    Distances (ou temps) depuis chaque source vers tous les nœuds, bornées par limit.
+
+    Returns:
+        Matrice (len(sources), n_nodes) ; np.inf au-delà de la borne
+    """
+    return dijkstra(adjacency, directed=True, indices=sources, limit=limit)
+
+def distance_chunk_size(n_nodes: int, budget: int = DISTANCE_MATRIX_BUDGET) -> int:
+    """Nombre d'origines traitées ensemble pour que la matrice de distances tienne dans le budget."""
+    return max(1, budget // (8 * max(n_nodes, 1)))
+
+def worker_count() -> int:
+    return max(min(cpu_count() - 1, 4), 1)
+
+def map_chunks(func: Callable, tasks: List[Tuple], initializer: Callable, initargs: Tuple,
+               min_tasks_for_pool: int = 2) -> list:
+    """
+    Exécute func sur chaque tâche, en parallèle sur un pool de processus quand il y a
+    assez de tâches. L'initializer reçoit les données partagées une seule fois par processus.
+    En cas d'échec du pool, les tâches sont exécutées dans le processus courant.
+    """
+    num_cores = worker_count()
+    if num_cores > 1 and len(tasks) >= min_tasks_for_pool:
+        try:
+            with get_context("spawn").Pool(min(num_cores, len(tasks)), initializer=initializer, initargs=initargs) as pool:
+                return pool.map(func, tasks)
+        except Exception as e:
+            logger.warning(f"Multiprocessing failed: {e}. Falling back to single-threaded")
+
+    initializer(*initargs)
+    return [func(task) for task in tasks]
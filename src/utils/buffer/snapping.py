@@ -0,0 +1,173 @@
+import hashlib
+import logging
+import os
+import networkx as nx
+import glob
+import numpy as np
+import shapely
+from scipy.spatial import cKDTree
+from shapely.geometry import LineString
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SNAP_CACHE_DIR = "./data/cache/snapping"
+# Seules les SNAP_CACHE_MAX_ENTRIES couches rattachées le plus récemment sont conservées sur disque
+SNAP_CACHE_MAX_ENTRIES = 64
+
+def edge_geometry(G: nx.MultiDiGraph, u, v, data: dict) -> LineString:
+    """Returns the geometry of an edge, or the straight segment between its nodes when simplified away."""
+    if 'geometry' in data:
+        return data['geometry']
+    return LineString([(G.nodes[u]['x'], G.nodes[u]['y']), (G.nodes[v]['x'], G.nodes[v]['y'])])
+
+class SnapIndex:
+    """
+    Nearest-neighbour structures of a projected graph, built once and stored in
+    G.graph['snap_index']: a KD-tree on the node coordinates and, built on first use,
+    an STRtree on the edge geometries.
+    """
+
+    def __init__(self, G: nx.MultiDiGraph):
+        self.nodes, self.coords = _node_arrays(G)
+        self.tree = cKDTree(self.coords)
+        self.size = (G.number_of_nodes(), G.number_of_edges())
+        self.signature = graph_signature(self.nodes, self.coords, self.size)
+        self._graph = G
+        self._edge_keys = None
+        self._edge_tree = None
+
+    def __getstate__(self):
+        # L'arbre des arêtes (STRtree) et le graphe ne sont pas envoyés aux processus du pool
+        state = self.__dict__.copy()
+        state.update(_graph=None, _edge_keys=None, _edge_tree=None)
+        return state
+
+    def matches(self, G: nx.MultiDiGraph) -> bool:
+        """
+        True if the index was built on G (copies and subgraphs carry the index of their source
+        in G.graph and must rebuild theirs). After unpickling, the index is re-attached to G.
+        """
+        if self._graph is None and len(self.nodes) == G.number_of_nodes():
+            # Ré-attaché seulement au graphe dont il a été construit : mêmes identifiants et coordonnées des nœuds
+            nodes, coords = _node_arrays(G)
+            if graph_signature(nodes, coords, (G.number_of_nodes(), G.number_of_edges())) == self.signature:
+                self._graph = G
+        return self._graph is G and len(self.nodes) == G.number_of_nodes()
+
+    def nearest_nodes(self, X: np.ndarray, Y: np.ndarray, return_dist: bool = False):
+        """Nearest node of each point, in one query."""
+        dist, pos = self.tree.query(np.column_stack([np.asarray(X, dtype=float), np.asarray(Y, dtype=float)]))
+        nodes = self.nodes[pos]
+        return (nodes, dist) if return_dist else nodes
+
+    def nearest_edges(self, X: np.ndarray, Y: np.ndarray, return_dist: bool = False):
+        """Nearest edge (u, v, key) of each point, in one query."""
+        if self._edge_tree is None:
+            if self._graph is None:
+                raise RuntimeError("Edge snapping needs the graph, which is not shipped to worker processes")
+            edges = list(self._graph.edges(keys=True, data=True))
+            self._edge_keys = np.empty(len(edges), dtype=object)
+            self._edge_keys[:] = [(u, v, k) for u, v, k, _ in edges]
+            self._edge_tree = shapely.STRtree([edge_geometry(self._graph, u, v, data) for u, v, _, data in edges])
+
+        points = shapely.points(np.asarray(X, dtype=float), np.asarray(Y, dtype=float))
+        (point_idx, edge_idx), dist = self._edge_tree.query_nearest(points, return_distance=True, all_matches=False)
+        edges = np.empty(len(points), dtype=object)
+        edges[point_idx] = self._edge_keys[edge_idx]
+        distances = np.full(len(points), np.inf)
+        distances[point_idx] = dist
+        return (edges, distances) if return_dist else edges
+
+def _node_arrays(G: nx.MultiDiGraph) -> Tuple[np.ndarray, np.ndarray]:
+    nodes = np.array(list(G.nodes))
+    coords = np.array([(data['x'], data['y']) for _, data in G.nodes(data=True)], dtype=float).reshape(-1, 2)
+    return nodes, coords
+
+def graph_signature(nodes: np.ndarray, coords: np.ndarray, size: Tuple[int, int]) -> str:
+    """Fingerprint of the graph topology and node coordinates."""
+    digest = hashlib.sha1()
+    digest.update(nodes.tobytes() if nodes.dtype != object else str(nodes.tolist()).encode())
+    digest.update(coords.tobytes())
+    digest.update(str(size).encode())
+    return digest.hexdigest()
+
+def get_snap_index(G: nx.MultiDiGraph) -> SnapIndex:
+    """Returns the snapping index stored with the graph, building it if the graph has none or changed since."""
+    index = G.graph.get('snap_index')
+    if index is None or not index.matches(G):
+        index = SnapIndex(G)
+        G.graph['snap_index'] = index
+        logger.debug(f"Snapping index built: {len(index.nodes)} nodes")
+    return index
+
+def cache_dir(params: dict) -> Optional[str]:
+    """Snap cache directory of a layer ('snap_cache': false disables it)."""
+    return SNAP_CACHE_DIR if params.get("snap_cache", True) else None
+
+def layer_fingerprint(X: np.ndarray, Y: np.ndarray) -> str:
+    digest = hashlib.sha1()
+    digest.update(np.ascontiguousarray(X, dtype=float).tobytes())
+    digest.update(np.ascontiguousarray(Y, dtype=float).tobytes())
+    return digest.hexdigest()
+
+def snap_to_nodes(G: nx.MultiDiGraph, X: np.ndarray, Y: np.ndarray,
+                  cache_dir: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Snaps a whole layer of points to the graph nodes in one vectorized query.
+
+    With a cache directory, results are stored per (graph, layer fingerprint) so that
+    a rerun on the same graph and points skips the query.
+
+    Returns:
+        Tuple of (nearest node ids, distances in meters to these nodes).
+    """
+    index = get_snap_index(G)
+    X = np.atleast_1d(np.asarray(X, dtype=float))
+    Y = np.atleast_1d(np.asarray(Y, dtype=float))
+
+    path = None
+    if cache_dir:
+        key = hashlib.sha1(f"{index.signature}:{layer_fingerprint(X, Y)}".encode()).hexdigest()
+        path = os.path.join(cache_dir, f"{key}.npz")
+        try:
+            with np.load(path) as cached:
+                nodes, dist = cached['nodes'].copy(), cached['dist'].copy()
+        except OSError:
+            # Absent, ou supprimé entre-temps par le _prune d'une autre tâche : recalculé
+            pass
+        else:
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+            logger.debug(f"Snapping: {len(X)} points read from {path}")
+            return nodes, dist
+
+    nodes, dist = index.nearest_nodes(X, Y, return_dist=True)
+
+    if path and nodes.dtype != object:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Écriture atomique : le cache est partagé entre les tâches exécutées en parallèle
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as file:
+            np.savez(file, nodes=nodes, dist=dist)
+        os.replace(tmp_path, path)
+        _prune(cache_dir)
+    return nodes, dist
+
+def _prune(cache_dir: str, max_entries: Optional[int] = None) -> None:
+    """Keeps the max_entries most recently used snapping results (as StageCache does per stage)."""
+    max_entries = SNAP_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+    entries = []
+    for path in glob.glob(os.path.join(cache_dir, "*.npz")):
+        try:
+            entries.append((os.path.getmtime(path), path))
+        except OSError:
+            continue
+    for _, path in sorted(entries, reverse=True)[max_entries:]:
+        try:
+            os.remove(path)
+        except OSError:
+            # Déjà supprimé par une autre tâche
+            pass
@@ -0,0 +1,149 @@
+"""
+Cache en mémoire des jeux de données chargés par l'application Flask (couches
+d'entrée, buffers, table de fusion, GeoJSON sérialisés).
+
+Chaque entrée est identifiée par (chemin, type de chargement) et validée à chaque
+accès par la taille et la date de modification du fichier : un fichier réécrit
+(nouvelle exécution du pipeline) est rechargé. La taille mémoire de chaque entrée
+est estimée au chargement ; au-delà du budget, les entrées les moins récemment
+utilisées sont évincées. Le cache est partagé entre les threads du serveur ; deux
+requêtes simultanées sur le même fichier ne le chargent qu'une fois.
+
+Les objets renvoyés sont partagés : un appelant qui les modifie doit les copier.
+"""
+import logging
+import os
+import sys
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import geopandas as gpd
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MEMORY_BUDGET_MB = 512
+
+@dataclass
+class _Entry:
+    value: Any
+    size: int
+    mtime_ns: int
+    file_size: int
+
+class DatasetCache:
+    """Cache LRU thread-safe de jeux de données, borné par un budget mémoire (en Mo)."""
+
+    def __init__(self, memory_budget_mb: float = DEFAULT_MEMORY_BUDGET_MB):
+        self.memory_budget = int(memory_budget_mb * 1024 * 1024)
+        self._entries: "OrderedDict[Tuple[str, str], _Entry]" = OrderedDict()
+        self._loading: Dict[Tuple[str, str], threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._memory = 0
+        self._counters = {"hits": 0, "misses": 0, "stale": 0, "evictions": 0, "uncached": 0}
+
+    def get(self, path: str, loader: Callable[[str], Any], kind: str = "dataset") -> Any:
+        """
+        Valeur de loader(path), chargée au premier appel puis servie depuis la mémoire tant
+        que le fichier n'a pas changé. kind distingue plusieurs représentations d'un même
+        fichier (ex. 'layer' et 'geojson').
+        """
+        key = (os.path.abspath(path), kind)
+        stat = os.stat(path)
+
+        with self._lock:
+            entry = self._lookup(key, stat)
+            if entry is not None:
+                return entry.value
+            key_lock = self._loading.setdefault(key, threading.Lock())
+
+        # Un seul chargement par clé ; les autres threads attendent puis relisent le cache
+        with key_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and (entry.mtime_ns, entry.file_size) == (stat.st_mtime_ns, stat.st_size):
+                    self._entries.move_to_end(key)
+                    return entry.value
+
+            try:
+                value = loader(path)
+                size = estimate_size(value)
+                with self._lock:
+                    self._store(key, _Entry(value, size, stat.st_mtime_ns, stat.st_size))
+            finally:
+                with self._lock:
+                    self._loading.pop(key, None)
+        return value
+
+    def _lookup(self, key: Tuple[str, str], stat: os.stat_result) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self._counters["misses"] += 1
+            return None
+        if (entry.mtime_ns, entry.file_size) != (stat.st_mtime_ns, stat.st_size):
+            self._counters["stale"] += 1
+            self._remove(key)
+            return None
+        self._counters["hits"] += 1
+        self._entries.move_to_end(key)
+        return entry
+
+    def _store(self, key: Tuple[str, str], entry: _Entry) -> None:
+        if key in self._entries:
+            self._remove(key)
+        if entry.size > self.memory_budget:
+            self._counters["uncached"] += 1
+            logger.info(f"{key[0]} ({entry.size / 1e6:.1f} Mo) dépasse le budget du cache, non conservé.")
+            return
+        self._entries[key] = entry
+        self._memory += entry.size
+        while self._memory > self.memory_budget:
+            evicted, _ = next(iter(self._entries.items()))
+            self._remove(evicted)
+            self._counters["evictions"] += 1
+
+    def _remove(self, key: Tuple[str, str]) -> None:
+        self._memory -= self._entries.pop(key).size
+
+    def invalidate(self, path: Optional[str] = None) -> None:
+        """Supprime les entrées d'un fichier (toutes les entrées si path est None)."""
+        with self._lock:
+            for key in [key for key in self._entries if path is None or key[0] == os.path.abspath(path)]:
+                self._remove(key)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"] + self._counters["stale"]
+            return {
+                "entries": len(self._entries),
+                "memory_mb": round(self._memory / 1024 / 1024, 2),
+                "budget_mb": round(self.memory_budget / 1024 / 1024, 2),
+                **self._counters,
+                "hit_rate": round(self._counters["hits"] / lookups, 4) if lookups else None,
+            }
+
+def estimate_size(value: Any) -> int:
+    """Taille mémoire approximative (octets) : colonnes pandas, géométries (coordonnées), chaînes, conteneurs."""
+    if isinstance(value, pd.DataFrame):
+        size = int(value.drop(columns=_geometry_columns(value)).memory_usage(deep=True).sum())
+        return size + sum(_geometry_size(value[column]) for column in _geometry_columns(value))
+    if isinstance(value, gpd.GeoSeries):
+        return _geometry_size(value)
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, (str, bytes)):
+        return sys.getsizeof(value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    return sys.getsizeof(value)
+
+def _geometry_columns(df: pd.DataFrame):
+    return [column for column in df.columns if isinstance(df[column].dtype, gpd.array.GeometryDtype)]
+
+def _geometry_size(geometries: pd.Series) -> int:
+    # Coordonnées (2 doubles) et en-tête GEOS approximatif par géométrie
+    return int(gpd.GeoSeries(geometries).count_coordinates().sum()) * 16 + len(geometries) * 100
@@ -1,6 +1,9 @@
+import logging
 import geopandas as gpd
 from typing import Dict
 
+logger = logging.getLogger(__name__)
+
 def process_geodataframes(geodataframes: Dict[str, gpd.GeoDataFrame], utils) -> Dict[str, gpd.GeoDataFrame]:
     for layer_name, gdf in geodataframes.items():
         # Déterminer le CRS en fonction des coordonnées si le CRS est absent
@@ -36,7 +39,7 @@ def extract_polygons_gdf(gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
     # Extraire et convertir les MultiPolygon en Polygon individuels
     multipolygons_gdf = gdf[gdf.geometry.type == "MultiPolygon"].copy()
     if not multipolygons_gdf.empty:
-        print(f"Conversion de {len(multipolygons_gdf)} MultiPolygon(s) en Polygon(s) individuels")
+        logger.info(f"Conversion de {len(multipolygons_gdf)} MultiPolygon(s) en Polygon(s) individuels")
         # Exploser les MultiPolygon en Polygon individuels
         exploded_multipolygons = multipolygons_gdf.explode(index_parts=False).reset_index(drop=True)
         
@@ -49,8 +52,8 @@ def extract_polygons_gdf(gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
         
         # Ajouter les Polygon convertis
         polygons_gdf = gpd.pd.concat([polygons_gdf, exploded_multipolygons], ignore_index=True)
-        print(f"Total de {len(polygons_gdf)} Polygon(s) après conversion")
-        print("Les MultiPolygons originaux sont supprimés - seules les parties explosées sont conservées")
+        logger.info(f"Total de {len(polygons_gdf)} Polygon(s) après conversion")
+        logger.info("Les MultiPolygons originaux sont supprimés - seules les parties explosées sont conservées")
     
     polygons_gdf = extract_poly_coordinates(polygons_gdf)
     return polygons_gdf
@@ -81,5 +84,5 @@ def extract_multipolygons_gdf(gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
     """Les MultiPolygons sont explosés en Polygons - cette fonction retourne un GeoDataFrame vide."""
     # Les MultiPolygons sont traités dans extract_polygons_gdf et explosés
     # Ils ne doivent plus apparaître comme MultiPolygons dans les résultats
-    print("Les MultiPolygons sont explosés en Polygons - aucun MultiPolygon ne sera conservé")
+    logger.info("Les MultiPolygons sont explosés en Polygons - aucun MultiPolygon ne sera conservé")
     return gpd.GeoDataFrame(columns=gdf.columns, crs=gdf.crs)
@@ -0,0 +1,153 @@
+"""
+Réponses GeoJSON de l'application Flask : compressées, conditionnelles et paginées.
+
+Une réponse est identifiée par l'empreinte du fichier (chemin, taille, date de
+modification) et par la requête (précision des coordonnées, bbox, limit/offset) :
+- ses corps (brut, gzip et brotli si le module brotli est installé) sont calculés
+  une fois puis servis depuis le cache de jeux de données (DatasetCache), et
+  recalculés lorsque le pipeline réécrit le fichier ;
+- son ETag et sa date de modification ne demandent qu'un stat du fichier : une
+  requête conditionnelle (If-None-Match, If-Modified-Since) sur une version déjà
+  connue du client est traitée sans charger la couche.
+
+Les coordonnées sont arrondies à precision décimales (6 par défaut, ~10 cm en
+degrés). bbox (minx,miny,maxx,maxy, dans le CRS de la couche) ne garde que les
+entités qui intersectent l'emprise ; limit/offset paginent les entités retenues,
+et la réponse indique alors numberMatched et numberReturned.
+"""
+import gzip
+import json
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+from utils.pipeline.cache import file_fingerprint, fingerprint
+
+try:
+    import brotli
+except ImportError:  # dépendance optionnelle : gzip seulement
+    brotli = None
+
+DEFAULT_PRECISION = 6
+MAX_PRECISION = 15
+# En dessous, la compression ne fait rien gagner
+MIN_COMPRESS_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+@dataclass(frozen=True)
+class GeoJSONQuery:
+    """Paramètres d'une requête GeoJSON : précision des coordonnées, emprise et pagination."""
+    precision: int = DEFAULT_PRECISION
+    bbox: Optional[Tuple[float, float, float, float]] = None
+    limit: Optional[int] = None
+    offset: int = 0
+
+    @property
+    def windowed(self) -> bool:
+        return self.bbox is not None or self.limit is not None or self.offset > 0
+
+    @classmethod
+    def from_args(cls, args, default_precision: int = DEFAULT_PRECISION) -> "GeoJSONQuery":
+        """Requête lue dans les paramètres d'URL (request.args) ; lève ValueError si un paramètre est invalide."""
+        precision = _int_arg(args, "precision", default_precision)
+        if not 0 <= precision <= MAX_PRECISION:
+            raise ValueError(f"precision doit être comprise entre 0 et {MAX_PRECISION}")
+        bbox = None
+        if args.get("bbox"):
+            try:
+                bbox = tuple(float(value) for value in args["bbox"].split(","))
+            except ValueError:
+                raise ValueError("bbox doit être de la forme minx,miny,maxx,maxy")
+            if len(bbox) != 4 or not np.all(np.isfinite(bbox)) or bbox[0] > bbox[2] or bbox[1] > bbox[3]:
+                raise ValueError("bbox doit être de la forme minx,miny,maxx,maxy")
+        limit = _int_arg(args, "limit", None)
+        offset = _int_arg(args, "offset", 0)
+        if (limit is not None and limit < 0) or offset < 0:
+            raise ValueError("limit et offset doivent être positifs")
+        return cls(precision, bbox, limit, offset)
+
+def _int_arg(args, name: str, default):
+    value = args.get(name)
+    if value in (None, ""):
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{name} doit être un entier")
+
+def validators(paths: Iterable[str], *parts) -> Tuple[str, datetime]:
+    """
+    (ETag, date de modification) d'une réponse construite à partir des fichiers paths
+    et des paramètres parts, calculés sans lire les fichiers.
+    """
+    files = [file_fingerprint(path) for path in paths]
+    mtime_ns = max((file.get("mtime_ns", 0) for file in files), default=0)
+    etag = fingerprint("response", files, *parts)[:20]
+    return etag, datetime.fromtimestamp(mtime_ns // 10 ** 9, tz=timezone.utc)
+
+def encode_bodies(body: bytes) -> Dict[str, bytes]:
+    """Corps brut et ses versions compressées (gzip, brotli si disponible) par Content-Encoding."""
+    bodies = {"identity": body}
+    if len(body) >= MIN_COMPRESS_SIZE:
+        bodies["gzip"] = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+        if brotli is not None:
+            bodies["br"] = brotli.compress(body, quality=BROTLI_QUALITY)
+    return bodies
+
+def negotiate_encoding(accept_encodings, bodies: Dict[str, bytes]) -> str:
+    """Content-Encoding préféré par le client (request.accept_encodings) parmi ceux disponibles."""
+    offered: List[str] = [encoding for encoding in ("br", "gzip") if encoding in bodies]
+    return accept_encodings.best_match(offered, default="identity") if offered else "identity"
+
+class GeoJSONResponseCache:
+    """Corps des réponses GeoJSON, gardés dans datasets (DatasetCache) tant que le fichier n'a pas changé."""
+
+    def __init__(self, datasets=None, precision: int = DEFAULT_PRECISION):
+        self.datasets = datasets
+        self.precision = precision
+
+    def query(self, args) -> GeoJSONQuery:
+        return GeoJSONQuery.from_args(args, default_precision=self.precision)
+
+    def validators(self, path: str, query: GeoJSONQuery) -> Tuple[str, datetime]:
+        return validators([path], "geojson", query.precision, query.bbox, query.limit, query.offset)
+
+    def bodies(self, path: str, query: GeoJSONQuery) -> Dict[str, bytes]:
+        def build(path: str) -> Dict[str, bytes]:
+            gdf = self.datasets.get(path, gpd.read_file, kind="layer") if self.datasets is not None else gpd.read_file(path)
+            return encode_bodies(serialize(gdf, query))
+
+        if self.datasets is None:
+            return build(path)
+        kind = f"geojson:{query.precision}:{query.bbox}:{query.limit}:{query.offset}"
+        return self.datasets.get(path, build, kind=kind)
+
+def serialize(gdf: gpd.GeoDataFrame, query: GeoJSONQuery) -> bytes:
+    """FeatureCollection des entités retenues par query, coordonnées arrondies à query.precision décimales."""
+    matched = gdf
+    if query.bbox is not None:
+        index = np.sort(gdf.sindex.query(shapely.box(*query.bbox), predicate="intersects"))
+        matched = gdf.iloc[index]
+    end = query.offset + query.limit if query.limit is not None else None
+    features = matched.iloc[query.offset:end].copy()
+
+    geometries = np.asarray(features.geometry.values, dtype=object)
+    features[features.geometry.name] = gpd.GeoSeries(
+        shapely.transform(geometries, lambda coords: np.round(coords, query.precision)),
+        index=features.index, crs=features.crs)
+
+    collection = features.to_geo_dict(na="null", drop_id=False)
+    if query.windowed:
+        collection.update(numberMatched=len(matched), numberReturned=len(features))
+    return json.dumps(collection, default=_json_default).encode()
+
+def _json_default(value):
+    # Attributs de type liste (lus comme tableaux numpy) et scalaires numpy
+    if isinstance(value, (np.ndarray, np.generic)):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
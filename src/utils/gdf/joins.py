@@ -1,7 +1,11 @@
+import logging
 import geopandas as gpd
 import pandas as pd
+import utils.pipeline.profiler as profiler
 from typing import Dict
 
+logger = logging.getLogger(__name__)
+
 # Fonction pour récupérer les couches de points et de polygones pour les jointures
 def get_join_layers(points_gdfs, polygons_gdfs, multipolygons_gdfs, linestrings_gdfs, join_layers):
     join_data = {}
@@ -32,21 +36,20 @@ def perform_spatial_joins(buffer_gdfs: Dict[str, gpd.GeoDataFrame], join_data: D
                 join_gdf = join_gdf.reset_index(drop=True).copy()
                 
                 try:
-                    joined = gpd.sjoin(
-                        buffer_gdf, 
-                        join_gdf, 
-                        how='inner', 
-                        predicate=join_type
-                    )
+                    with profiler.section("join", layer=f"{buffer_name}/{join_layer_name} ({geom_type})", rows_in=len(join_gdf)) as entry:
+                        joined = gpd.sjoin(
+                            buffer_gdf, 
+                            join_gdf, 
+                            how='inner', 
+                            predicate=join_type
+                        )
+                        entry["rows_out"] = len(joined)
                     
                     if joined.empty:
                         continue
                         
-                    # Add the joined geometry as a proper geometry column
-                    joined[f'{join_layer_name}_geometry'] = join_gdf.loc[
-                        joined['index_right'], 
-                        'geometry'
-                    ].values
+                    # Géométrie de l'objet joint, dans une seule colonne pour toutes les couches
+                    joined['join_geometry'] = join_gdf.geometry.values.take(joined['index_right'].to_numpy())
                     
                     # Add metadata
                     joined = joined.assign(
@@ -58,7 +61,7 @@ def perform_spatial_joins(buffer_gdfs: Dict[str, gpd.GeoDataFrame], join_data: D
                     buffer_joins.append(joined)
                     
                 except Exception as e:
-                    print(f"Error joining {buffer_name} with {join_layer_name}: {str(e)}")
+                    logger.error(f"Error joining {buffer_name} with {join_layer_name}: {str(e)}")
                     continue
 
     if not buffer_joins:
@@ -71,4 +74,108 @@ def perform_spatial_joins(buffer_gdfs: Dict[str, gpd.GeoDataFrame], join_data: D
 
     final_gdf = final_gdf.drop(columns=['index_right'], errors='ignore')
 
-    return final_gdf
\ No newline at end of file
+    return final_gdf
+
+def assemble_joined_geometries(fusion_gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+    """
+    Prépare le résultat des jointures pour le calcul des proportions, colonne par colonne :
+    la géométrie du buffer (géométrie active après la jointure) passe dans 'buffer_geometry'
+    et la géométrie de l'objet joint ('join_geometry') devient la géométrie active.
+    Les lignes sans géométrie jointe sont retirées.
+    """
+    if fusion_gdf.empty or 'join_geometry' not in fusion_gdf.columns:
+        return fusion_gdf
+
+    buffer_geometry = fusion_gdf.geometry.values
+    fusion_gdf['geometry'] = fusion_gdf.pop('join_geometry').values
+    fusion_gdf['buffer_geometry'] = buffer_geometry
+    return fusion_gdf[fusion_gdf.geometry.notna()]
+
+
+def is_network_join_layer(params: Dict) -> bool:
+    """True when a buffer layer is a network buffer with join_mode: network."""
+    return params.get("buffer_type") == "network" and params.get("join_mode") == "network"
+
+
+def uses_network_join(buffer_layer: Dict[str, Dict]) -> bool:
+    """True when a network buffer layer asks for join_mode: network."""
+    return any(is_network_join_layer(params) for params in buffer_layer.values())
+
+
+def perform_network_joins(buffer_gdfs: Dict[str, gpd.GeoDataFrame], source_gdfs: Dict[str, Dict[str, gpd.GeoDataFrame]],
+                          join_data: Dict[str, Dict[str, gpd.GeoDataFrame]], buffer_layer: Dict[str, Dict],
+                          join_layers: Dict[str, Dict[str, str]]) -> gpd.GeoDataFrame:
+    """
+    Jointure par distance réseau : remplace le sjoin sur les polygones de buffer des
+    couches network avec join_mode: network. Les autres couches de buffer (circular,
+    grid, isochrone, network sans join_mode: network) passent par perform_spatial_joins
+    et leurs jointures sont ajoutées au résultat.
+
+    Les entités jointes sont rattachées au réseau et retenues si elles sont à moins de
+    'distance' mètres sur le réseau (voir network_join.network_join). Le résultat a la même
+    forme que perform_spatial_joins, avec join_type='network' et les colonnes
+    'network_distance' (mètres) et 'proportion' (part de l'entité atteinte).
+
+    Args:
+        buffer_gdfs: Buffers par nom ('<couche>_buffer'), indexés comme leur couche source
+        source_gdfs: Couches source par type de géométrie ('Point', 'LineString', ...)
+    """
+    # Pile réseau (osmnx, networkx) chargée seulement pour les jointures réseau
+    import utils.buffer.network_join as network_join
+
+    buffer_joins = []
+    network_layers = {name: params for name, params in buffer_layer.items() if is_network_join_layer(params)}
+    network_buffers = {f"{name}_buffer" for name in network_layers}
+
+    spatial_buffers = {name: gdf for name, gdf in buffer_gdfs.items() if name not in network_buffers}
+    if spatial_buffers:
+        spatial_joined = perform_spatial_joins(spatial_buffers, join_data, join_layers)
+        if not spatial_joined.empty:
+            buffer_joins.append(spatial_joined)
+
+    for layer_name, params in network_layers.items():
+        buffer_name = f"{layer_name}_buffer"
+        buffer_gdf = buffer_gdfs.get(buffer_name)
+        source_gdf = source_gdfs.get(params.get("geometry_type"), {}).get(layer_name)
+        if buffer_gdf is None or buffer_gdf.empty or source_gdf is None:
+            continue
+
+        # Les buffers réseau gardent l'index de la couche source
+        origins_gdf = source_gdf.loc[buffer_gdf.index]
+        join_gdfs = {(geom_type, name): gdf.reset_index(drop=True)
+                     for geom_type, gdfs in join_data.items() for name, gdf in gdfs.items() if not gdf.empty}
+
+        with profiler.section("join", layer=buffer_name, rows_in=sum(len(gdf) for gdf in join_gdfs.values())) as entry:
+            pairs_by_layer = network_join.network_join(origins_gdf, join_gdfs, layer_name, buffer_layer)
+            entry["rows_out"] = sum(len(pairs) for pairs in pairs_by_layer.values())
+
+        for (geom_type, join_layer_name), pairs in pairs_by_layer.items():
+            if pairs.empty:
+                continue
+            join_gdf = join_gdfs[(geom_type, join_layer_name)].to_crs(buffer_gdf.crs)
+
+            left = buffer_gdf.iloc[pairs['origin'].to_numpy()].reset_index(drop=True)
+            right = pd.DataFrame(join_gdf.drop(columns='geometry').iloc[pairs['feature'].to_numpy()]).reset_index(drop=True)
+            # Mêmes suffixes que gpd.sjoin pour les colonnes en conflit
+            common = left.columns.intersection(right.columns)
+            left = left.rename(columns={col: f"{col}_left" for col in common})
+            right = right.rename(columns={col: f"{col}_right" for col in common})
+
+            joined = gpd.GeoDataFrame(pd.concat([left, right], axis=1), geometry='geometry', crs=buffer_gdf.crs)
+            joined['join_geometry'] = join_gdf.geometry.values.take(pairs['feature'].to_numpy())
+            joined = joined.assign(
+                buffer_layer=buffer_name,
+                join_layer=join_layer_name,
+                join_type="network",
+                network_distance=pairs['network_distance'].to_numpy(),
+                proportion=pairs['proportion'].to_numpy()
+            )
+            buffer_joins.append(joined)
+
+    if not buffer_joins:
+        return gpd.GeoDataFrame()
+
+    return gpd.GeoDataFrame(
+        pd.concat(buffer_joins, ignore_index=True),
+        crs=buffer_gdfs[next(iter(buffer_gdfs))].crs
+    )
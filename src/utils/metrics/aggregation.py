@@ -0,0 +1,147 @@
+import numpy as np
+import pandas as pd
+from typing import List
+
+# Fonctions calculées par les noyaux vectorisés (les autres passent par pandas)
+KERNELS = ("sum", "max", "min", "mean", "std", "count", "prod", "count_distinct")
+# Agrégations pondérées (colonne de valeurs et colonne de poids)
+WEIGHTED = ("weighted_sum", "weighted_mean")
+
+class GroupIndex:
+    """
+    Factorisation des clés de regroupement, calculée une seule fois et partagée par
+    toutes les métriques.
+
+    Chaque colonne de clé est factorisée, puis les codes sont combinés en un code de
+    groupe par ligne (-1 pour les lignes écartées). Avec sort=True et dropna=True, les
+    groupes suivent l'ordre et les règles de DataFrame.groupby (clés triées, clés
+    manquantes écartées) ; avec sort=False, l'ordre de première apparition.
+    """
+
+    def __init__(self, df: pd.DataFrame, keys: List[str], sort: bool = True, dropna: bool = True):
+        self.keys = list(keys)
+        n_rows = len(df)
+        combined = np.zeros(n_rows, dtype=np.int64)
+        valid = np.ones(n_rows, dtype=bool)
+        radix = 1
+
+        for key in self.keys:
+            key_codes, uniques = pd.factorize(df[key], sort=sort, use_na_sentinel=dropna)
+            valid &= key_codes >= 0
+            size = max(len(uniques), 1)
+            if radix * size >= 2 ** 62:
+                # Recompactage des codes combinés pour éviter un dépassement d'entier
+                _, combined = np.unique(combined, return_inverse=True)
+                radix = int(combined.max()) + 1 if n_rows else 1
+            combined = combined * size + key_codes
+            radix *= size
+
+        rows = np.flatnonzero(valid)
+        if sort:
+            _, group_codes = np.unique(combined[rows], return_inverse=True)
+        else:
+            group_codes, _ = pd.factorize(combined[rows])
+        self.codes = np.full(n_rows, -1, dtype=np.int64)
+        self.codes[rows] = group_codes
+        self.ngroups = int(group_codes.max()) + 1 if len(group_codes) else 0
+
+        # Lignes triées par groupe (tri stable) et début de chaque groupe, pour les réductions par segment
+        order = np.argsort(group_codes, kind="stable")
+        self.sorted_rows = rows[order]
+        self.starts = np.searchsorted(group_codes[order], np.arange(self.ngroups))
+        self.first = self.sorted_rows[self.starts]
+
+    def keys_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Valeurs des clés de chaque groupe (une ligne par groupe)."""
+        return df[self.keys].iloc[self.first].reset_index(drop=True)
+
+    def first_values(self, series: pd.Series) -> np.ndarray:
+        """Première valeur de chaque groupe (comme drop_duplicates sur les clés)."""
+        return series.to_numpy()[self.first]
+
+    def aggregate(self, series: pd.Series, func: str) -> np.ndarray:
+        """Agrégation d'une colonne par groupe : sum, max, min, mean, std, count, prod, count_distinct."""
+        if func == "count_distinct":
+            return self._count_distinct(series)
+        if func == "count":
+            return np.bincount(self.codes[series.notna().to_numpy() & (self.codes >= 0)], minlength=self.ngroups)
+
+        values = series.to_numpy()
+        if not isinstance(series.dtype, np.dtype) or values.dtype.kind not in "biuf" or func not in KERNELS:
+            return self._pandas_aggregate(series, func)
+
+        kind = values.dtype.kind
+        sorted_values = values[self.sorted_rows]
+        if kind == "b" and func in ("sum", "prod", "mean", "std"):
+            sorted_values = sorted_values.astype(np.int64)
+
+        missing = np.isnan(sorted_values) if kind == "f" else None
+        counts = (np.add.reduceat(~missing, self.starts) if missing is not None
+                  else np.diff(np.append(self.starts, len(sorted_values))))
+
+        if func in ("sum", "prod"):
+            neutral = 0 if func == "sum" else 1
+            if missing is not None:
+                sorted_values = np.where(missing, neutral, sorted_values)
+            if kind in "iu":
+                sorted_values = sorted_values.astype(np.int64 if kind == "i" else np.uint64)
+            ufunc = np.add if func == "sum" else np.multiply
+            result = ufunc.reduceat(sorted_values, self.starts)
+            return result.astype(values.dtype if kind != "b" else np.int64)
+
+        if func in ("max", "min"):
+            if missing is not None:
+                sorted_values = np.where(missing, -np.inf if func == "max" else np.inf, sorted_values)
+            ufunc = np.maximum if func == "max" else np.minimum
+            result = ufunc.reduceat(sorted_values, self.starts)
+            if missing is not None:
+                result = np.where(counts > 0, result, np.nan)
+            return result.astype(values.dtype)
+
+        # mean, std : calcul en float64, float32 conservé comme pandas
+        out_dtype = values.dtype if kind == "f" else np.float64
+        floats = sorted_values.astype(np.float64)
+        if missing is not None:
+            floats = np.where(missing, 0.0, floats)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = np.add.reduceat(floats, self.starts) / counts
+            if func == "mean":
+                return np.where(counts > 0, means, np.nan).astype(out_dtype)
+            deviations = floats - np.repeat(means, np.diff(np.append(self.starts, len(floats))))
+            if missing is not None:
+                deviations = np.where(missing, 0.0, deviations)
+            variances = np.add.reduceat(deviations * deviations, self.starts) / (counts - 1)
+        return np.where(counts > 1, np.sqrt(variances), np.nan).astype(out_dtype)
+
+    def aggregate_weighted(self, values: pd.Series, weights: pd.Series, func: str) -> np.ndarray:
+        """
+        Agrégation pondérée par groupe : weighted_sum (somme de valeur x poids) ou
+        weighted_mean (somme de valeur x poids / somme des poids). Les lignes dont la
+        valeur ou le poids est manquant sont ignorées ; moyenne NaN si la somme des poids est nulle.
+        """
+        value_array = values.to_numpy(dtype=np.float64, na_value=np.nan)
+        weight_array = weights.to_numpy(dtype=np.float64, na_value=np.nan)
+        rows = (self.codes >= 0) & ~np.isnan(value_array) & ~np.isnan(weight_array)
+        codes = self.codes[rows]
+        totals = np.bincount(codes, weights=value_array[rows] * weight_array[rows], minlength=self.ngroups)
+        if func == "weighted_sum":
+            return totals
+        weight_totals = np.bincount(codes, weights=weight_array[rows], minlength=self.ngroups)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(weight_totals != 0, totals / weight_totals, np.nan)
+
+    def _count_distinct(self, series: pd.Series) -> np.ndarray:
+        """Nombre de valeurs distinctes par groupe, hors valeurs manquantes et chaînes 'nan'."""
+        value_codes, uniques = pd.factorize(series)
+        excluded = np.flatnonzero(pd.Series(uniques).eq("nan").to_numpy())
+        keep = (value_codes >= 0) & (self.codes >= 0)
+        if len(excluded):
+            keep &= ~np.isin(value_codes, excluded)
+        pairs = np.unique(self.codes[keep] * max(len(uniques), 1) + value_codes[keep])
+        return np.bincount(pairs // max(len(uniques), 1), minlength=self.ngroups)
+
+    def _pandas_aggregate(self, series: pd.Series, func: str) -> np.ndarray:
+        """Types non numériques (chaînes, types nullables...) : agrégation pandas sur les codes de groupe."""
+        rows = self.codes >= 0
+        grouped = series[rows].groupby(self.codes[rows]).agg(func)
+        return grouped.reindex(np.arange(self.ngroups)).to_numpy()
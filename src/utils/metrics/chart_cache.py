@@ -0,0 +1,111 @@
+"""
+Cache matérialisé des tables par groupe des histogrammes et bar charts.
+
+Une table (groupe -> count ou sum) est calculée une fois par (empreinte de
+fusion_gdf.parquet, groupby, agrégation) en ne lisant que les colonnes utiles du
+fichier Parquet, puis réutilisée par toutes les requêtes de graphiques et toutes
+les colonnes demandées : changer les classes ou les libellés d'un histogramme ne
+relit plus la table de fusion. Un nouveau fichier de fusion (nouvelle exécution du
+pipeline) change l'empreinte et invalide les tables.
+"""
+import json
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+import utils.metrics.metrics as metrics
+from utils.pipeline.cache import file_fingerprint
+
+logger = logging.getLogger(__name__)
+
+FUSION_GDF_PATH = "./data/output/fusion_gdf.parquet"
+
+class ChartAggregateCache:
+    """Tables par groupe en mémoire (LRU, max_entries tables), partagées entre les threads du serveur."""
+
+    def __init__(self, path: str = FUSION_GDF_PATH, max_entries: int = 64, datasets=None):
+        self.path = path
+        self.max_entries = max_entries
+        # Cache de jeux de données partagé (DatasetCache) : attributs de la table de fusion gardés en mémoire
+        self.datasets = datasets
+        self.hits = 0
+        self.misses = 0
+        self._tables: "OrderedDict[Tuple, pd.DataFrame]" = OrderedDict()
+        self._schema: Tuple[Dict, List[str]] = ({}, [])
+        self._lock = threading.Lock()
+
+    def _fingerprint(self) -> Dict:
+        fingerprint = file_fingerprint(self.path)
+        if fingerprint.get("missing"):
+            raise FileNotFoundError("Fusion GeoDataFrame not found. Run main.py first.")
+        return fingerprint
+
+    def columns(self) -> List[str]:
+        """Colonnes de la table de fusion, lues dans le schéma Parquet (sans charger les données)."""
+        fingerprint = self._fingerprint()
+        with self._lock:
+            if self._schema[0] != fingerprint:
+                self._schema = (fingerprint, list(pq.read_schema(self.path).names))
+            return self._schema[1]
+
+    def histogram_data(self, histogram_config: Dict, config_file: str = "config.yaml") -> Dict:
+        """Équivalent de metrics.calculate_histogram_data, sans relire la table de fusion."""
+        metrics.validate_chart_config(self.columns(), histogram_config, "histogram")
+        grouped = self.group_table(histogram_config["groupby"], _aggregation(histogram_config))
+        return metrics.histogram_from_group_table(grouped, histogram_config, metrics.buffer_distance(config_file))
+
+    def barchart_data(self, barchart_config: Dict) -> Dict:
+        """Équivalent de metrics.calculate_barchart_data, sans relire la table de fusion."""
+        metrics.validate_chart_config(self.columns(), barchart_config, "bar chart")
+        grouped = self.group_table(barchart_config["groupby"], _aggregation(barchart_config))
+        return metrics.barchart_from_group_table(grouped, barchart_config)
+
+    def group_table(self, groupby: str, aggregation: Dict) -> pd.DataFrame:
+        """Table par groupe pour (groupby, agrégation) déjà validés, calculée au premier appel puis servie depuis le cache."""
+        fingerprint = self._fingerprint()
+        column = aggregation.get("column") if aggregation["type"] == "sum" else None
+        key = (fingerprint["path"], fingerprint["size"], fingerprint["mtime_ns"], groupby, aggregation["type"], column)
+
+        with self._lock:
+            if key in self._tables:
+                self.hits += 1
+                self._tables.move_to_end(key)
+                return self._tables[key]
+            self.misses += 1
+
+        needed = [groupby] + ([column] if column and column != groupby else [])
+        if self.datasets is not None:
+            fusion = self.datasets.get(self.path, read_fusion_attributes, kind="fusion")[needed]
+        else:
+            fusion = pd.read_parquet(self.path, columns=needed)
+        table = metrics.chart_group_table(fusion, groupby, aggregation)
+        logger.info(f"Table par groupe matérialisée ({groupby}, {aggregation['type']} {column or ''}) : {len(table)} groupes")
+
+        with self._lock:
+            self._tables[key] = table
+            self._tables.move_to_end(key)
+            # Tables d'un ancien fichier de fusion, puis les moins récemment utilisées
+            for stale in [k for k in self._tables if k[:3] != key[:3]]:
+                del self._tables[stale]
+            while len(self._tables) > self.max_entries:
+                self._tables.popitem(last=False)
+        return table
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {"tables": len(self._tables), "hits": self.hits, "misses": self.misses,
+                    "hit_rate": round(self.hits / total, 4) if total else None}
+
+def read_fusion_attributes(path: str) -> pd.DataFrame:
+    """Colonnes attributaires de la table de fusion (géométries WKB non chargées)."""
+    schema = pq.read_schema(path)
+    geometry_columns = json.loads((schema.metadata or {}).get(b"geo", b"{}")).get("columns", {})
+    return pd.read_parquet(path, columns=[name for name in schema.names if name not in geometry_columns])
+
+def _aggregation(chart_config: Dict) -> Dict:
+    return chart_config.get("aggregation", {"type": "count", "column": ""})
@@ -1,5 +1,8 @@
+import logging
 import operator
 
+logger = logging.getLogger(__name__)
+
 OPERATORS = {
     ">=": operator.ge,
     "<=": operator.le,
@@ -35,7 +38,7 @@ def apply_filters_to_layers(geodataframes, config, filter_function):
         
         if not filter_config:
             # Skipper si aucune configuration n'est définie pour cette couche
-            print(f"Aucune configuration de filtre trouvée pour la couche: {layer_name}. Skipping.")
+            logger.warning(f"Aucune configuration de filtre trouvée pour la couche: {layer_name}. Skipping.")
             continue
 
         # Vérifie si tous les paramètres nécessaires sont présents
@@ -45,7 +48,7 @@ def apply_filters_to_layers(geodataframes, config, filter_function):
 
         if column is None or value is None:
             # Skipper si des paramètres sont manquants
-            print(f"Configuration de filtre incomplète pour la couche: {layer_name}. Skipping.")
+            logger.warning(f"Configuration de filtre incomplète pour la couche: {layer_name}. Skipping.")
             continue
 
         # Applique le filtrage
@@ -53,7 +56,7 @@ def apply_filters_to_layers(geodataframes, config, filter_function):
             gdf_layer = filter_function(gdf_layer, column, value, operator)
             geodataframes[layer_name] = gdf_layer
         except Exception as e:
-            print(f"Erreur lors de l'application du filtre sur la couche {layer_name}: {e}")
+            logger.error(f"Erreur lors de l'application du filtre sur la couche {layer_name}: {e}")
 
     return geodataframes
 
@@ -77,12 +80,12 @@ def apply_global_filters(gdf, config):
         op = filter_config.get('operator', "==")  # Par défaut, utiliser l'égalité
         
         if column is None or value is None:
-            print(f"Filtre incomplet ignoré: {filter_config}")
+            logger.warning(f"Filtre incomplet ignoré: {filter_config}")
             continue
         
         try:
             gdf = filter_gdf(gdf, column, value, op)
         except Exception as e:
-            print(f"Erreur lors de l'application du filtre {filter_config}: {e}")
+            logger.error(f"Erreur lors de l'application du filtre {filter_config}: {e}")
     
     return gdf
\ No newline at end of file
@@ -2,7 +2,11 @@ import pandas as pd
 import warnings
 import numpy as np
 import logging
+import os
 import yaml
+from functools import lru_cache
+import utils.metrics.aggregation as aggregation
+import utils.metrics.sketches as sketches
 
 def calculate_sum(gdf, groupby_columns, sum_columns):
     parsed_columns = [parse_column_name(col) for col in sum_columns]
@@ -236,6 +240,14 @@ def calculate_multiply(gdf, groupby_columns, multiply_columns):
     return multiply_stats.round(2)
 
 def calculate_metrics(gdf, groupby_columns, metrics_config):
+    """
+    Agrège les métriques configurées par groupe, en une seule passe : les clés de
+    regroupement sont factorisées une fois (aggregation.GroupIndex) et chaque métrique
+    (sum, max, min, mean, std, count, count_distinct, weighted_sum, weighted_mean, quantile,
+    ratio, multiply) est calculée par un noyau vectorisé sur les codes de groupe ; les
+    quantiles et les comptages distincts approximatifs passent par des esquisses
+    fusionnables (sketches.QuantileSketch, sketches.HyperLogLogSketch).
+    """
     # 1. Validation des colonnes de groupby
     missing_cols = [col for col in groupby_columns if col not in gdf.columns]
     if missing_cols:
@@ -248,8 +260,6 @@ def calculate_metrics(gdf, groupby_columns, metrics_config):
     # 2. Préparation des données d'aire
     if 'area_km2' not in gdf.columns:
         gdf['area_km2'] = gdf.geometry.area / 1e6 if gdf.geometry is not None else 0
-    
-    area_data = gdf[groupby_columns + ['area_km2']].drop_duplicates(subset=groupby_columns)
 
     # 3. Construction du dictionnaire d'agrégation
     agg_dict = {}
@@ -258,7 +268,17 @@ def calculate_metrics(gdf, groupby_columns, metrics_config):
             continue
             
         for col in cols:
-            original, renamed = parse_column_name(col)
+            options = {}
+            if func == "quantile":
+                original, outputs, options = parse_quantile_column(col)
+            elif func in aggregation.WEIGHTED:
+                original, weight, renamed = parse_weighted_column(col, func)
+            elif func == "count_distinct" and isinstance(col, dict):
+                # Mode approximatif : options de l'esquisse HyperLogLog (vides pour le comptage exact)
+                original, renamed, options = parse_distinct_column(col)
+                weight = None
+            else:
+                (original, renamed), weight = parse_column_name(col), None
             
             if original not in gdf.columns:
                 warnings.warn(
@@ -266,64 +286,190 @@ def calculate_metrics(gdf, groupby_columns, metrics_config):
                     UserWarning
                 )
                 continue
-                
-            if func == "count_distinct":
-                # Utiliser la fonction personnalisée qui exclut les 'nan' strings
-                def nunique_no_nan(series):
-                    filtered_series = series.dropna()
-                    filtered_series = filtered_series[filtered_series != 'nan']
-                    return filtered_series.nunique()
-                agg_dict[renamed] = (original, nunique_no_nan)
-            else:
-                agg_dict[renamed] = (original, func)
 
-    # 4. Calcul des agrégations
+            if func == "quantile":
+                if not pd.api.types.is_numeric_dtype(gdf[original]):
+                    warnings.warn(f"Column '{original}' must be numeric for aggregation 'quantile'. Skipping.", UserWarning)
+                    continue
+                for q, renamed in outputs:
+                    if not 0 <= q <= 1:
+                        warnings.warn(f"Quantile {q} of '{original}' is not between 0 and 1. Skipping.", UserWarning)
+                        continue
+                    agg_dict[renamed] = (original, func, (q, options))
+                continue
+
+            if func == "count_distinct" and options:
+                if not 4 <= options["precision"] <= 18:
+                    warnings.warn(f"HyperLogLog precision {options['precision']} of '{original}' must be between 4 and 18. "
+                                  f"Skipping.", UserWarning)
+                    continue
+                agg_dict[renamed] = (original, func, options)
+                continue
+
+            if weight is not None:
+                if weight not in gdf.columns:
+                    warnings.warn(
+                        f"Weight column '{weight}' not found for aggregation '{func}' of '{original}'. Skipping.",
+                        UserWarning
+                    )
+                    continue
+                if not all(pd.api.types.is_numeric_dtype(gdf[c]) for c in (original, weight)):
+                    warnings.warn(
+                        f"Columns '{original}' and '{weight}' must be numeric for aggregation '{func}'. Skipping.",
+                        UserWarning
+                    )
+                    continue
+
+            agg_dict[renamed] = (original, func, weight)
+
+    # 4. Factorisation des clés (groupes triés, clés manquantes écartées, comme groupby)
+    groups = aggregation.GroupIndex(gdf, groupby_columns)
+
+    # 5. Calcul des agrégations et jointure avec les données d'aire (première valeur du groupe)
     if agg_dict:
-        agg_stats = gdf.groupby(groupby_columns).agg(**agg_dict).reset_index()
+        agg_stats = groups.keys_frame(gdf)
+        quantile_sketches = {}
+        for renamed, (original, func, option) in agg_dict.items():
+            if func == "quantile":
+                # Une esquisse par colonne (et options), partagée par tous ses quantiles
+                q, options = option
+                sketch_key = (original, tuple(sorted(options.items())))
+                if sketch_key not in quantile_sketches:
+                    quantile_sketches[sketch_key] = sketches.QuantileSketch.from_values(groups, gdf, gdf[original], **options)
+                agg_stats[renamed] = quantile_sketches[sketch_key].quantiles([q])[:, 0]
+            elif func in aggregation.WEIGHTED:
+                agg_stats[renamed] = groups.aggregate_weighted(gdf[original], gdf[option], func)
+            elif func == "count_distinct" and option:
+                # Estimation HyperLogLog et son erreur type (1.04 / sqrt(2^p) de l'estimation)
+                sketch = sketches.HyperLogLogSketch.from_values(groups, gdf, gdf[original], **option)
+                estimate = np.rint(sketch.estimate()).astype(np.int64)
+                agg_stats[renamed] = estimate
+                agg_stats[f"{renamed}_error"] = estimate * sketch.relative_error
+            else:
+                agg_stats[renamed] = groups.aggregate(gdf[original], func)
+        area_data = groups.keys_frame(gdf).assign(area_km2=groups.first_values(gdf['area_km2']))
+        aligned = True
     else:
-        agg_stats = gdf[groupby_columns].drop_duplicates().reset_index(drop=True)
-
-    # 5. Jointure avec les données d'aire
-    agg_stats = pd.merge(
-        agg_stats,
-        area_data,
-        on=groupby_columns,
-        how='left',
-        validate='one_to_one'
-    )
-
-    # 6. Calcul des ratios si nécessaire
+        # Sans agrégation : groupes dans l'ordre d'apparition, clés manquantes comprises
+        unsorted_groups = aggregation.GroupIndex(gdf, groupby_columns, sort=False, dropna=False)
+        agg_stats = unsorted_groups.keys_frame(gdf)
+        area_data = agg_stats.assign(area_km2=unsorted_groups.first_values(gdf['area_km2']))
+        aligned = False
+    agg_stats = _merge_group_stats(agg_stats, area_data, groupby_columns, aligned=True)
+
+    # 6. Calcul des ratios si nécessaire (moyenne par groupe du ratio ligne à ligne)
     if "ratio" in metrics_config and metrics_config["ratio"]:
-        ratio_stats = calculate_ratio(gdf, groupby_columns, metrics_config["ratio"])
-        agg_stats = pd.merge(
-            agg_stats,
-            ratio_stats,
-            on=groupby_columns,
-            how='left'
-        )
+        ratio_stats = calculate_group_ratios(gdf, groups, metrics_config["ratio"])
+        agg_stats = _merge_group_stats(agg_stats, ratio_stats, groupby_columns, aligned)
 
-    # 7. Calcul des multiplications si nécessaire
+    # 7. Calcul des multiplications si nécessaire (produit par groupe du produit ligne à ligne)
     if "multiply" in metrics_config and metrics_config["multiply"]:
-        multiply_stats = calculate_multiply(gdf, groupby_columns, metrics_config["multiply"])
-        agg_stats = pd.merge(
-            agg_stats,
-            multiply_stats,
-            on=groupby_columns,
-            how='left'
-        )
+        multiply_stats = calculate_group_products(gdf, groups, metrics_config["multiply"])
+        agg_stats = _merge_group_stats(agg_stats, multiply_stats, groupby_columns, aligned)
 
     return agg_stats.round(2)
 
+def _merge_group_stats(left, right, groupby_columns, aligned):
+    """
+    Ajoute les colonnes de right à left. Tables alignées sur les mêmes groupes et sans
+    colonne en commun : simple concaténation ; sinon jointure à gauche sur les clés
+    (suffixes _x/_y en cas de conflit, comme pd.merge).
+    """
+    overlap = set(left.columns).intersection(right.columns) - set(groupby_columns)
+    if aligned and not overlap and len(left) == len(right):
+        return pd.concat([left, right.drop(columns=groupby_columns)], axis=1)
+    return pd.merge(left, right, on=groupby_columns, how='left')
+
+def calculate_group_ratios(gdf, groups, ratio_columns):
+    """Équivalent de calculate_ratio sur des groupes déjà factorisés."""
+    ratio_stats = groups.keys_frame(gdf)
 
-logging.basicConfig(level=logging.INFO, format='%(levelname)s:%(message)s')
-def calculate_histogram_data(gdf, histogram_config, config_file="config.yaml"):
+    for ratio in ratio_columns:
+        ratio_name = ratio.get("name")
+        numerator = ratio.get("numerator")
+        denominator = ratio.get("denominator")
 
-    with open(config_file, 'r') as file:
-        config = yaml.safe_load(file)
-        buffer_layer = config.get('buffer_layer', {})
-        layer_name = next(iter(buffer_layer), None)
-        distance = buffer_layer[layer_name].get('distance', None)
+        if not numerator or not denominator or not ratio_name:
+            warnings.warn(
+                f"Le ratio '{ratio_name}' est incomplet (numérateur, dénominateur ou nom manquant). Il sera ignoré.",
+                UserWarning
+            )
+            continue
+
+        if numerator not in gdf.columns or denominator not in gdf.columns:
+            warnings.warn(
+                f"Le ratio '{ratio_name}' ne peut pas être calculé car '{numerator}' ou '{denominator}' n'existe pas dans le GeoDataFrame. Il sera ignoré.",
+                UserWarning
+            )
+            continue
+
+        try:
+            gdf[ratio_name] = gdf[numerator] / gdf[denominator]
+        except ZeroDivisionError:
+            warnings.warn(
+                f"Division par zéro détectée lors du calcul du ratio '{ratio_name}'. Les valeurs seront remplacées par NaN.",
+                UserWarning
+            )
+            gdf[ratio_name] = gdf[numerator] / gdf[denominator].replace(0, np.nan)
+
+        # Premier ratio conservé en cas de doublon de nom
+        if ratio_name not in ratio_stats.columns:
+            ratio_stats[ratio_name] = groups.aggregate(gdf[ratio_name], "mean")
 
+    return ratio_stats.round(2)
+
+def calculate_group_products(gdf, groups, multiply_columns):
+    """Équivalent de calculate_multiply sur des groupes déjà factorisés."""
+    multiply_stats = groups.keys_frame(gdf)
+
+    for multiply in multiply_columns:
+        multiply_name = multiply.get("name")
+        columns = multiply.get("columns", [])
+
+        if not multiply_name or not columns:
+            warnings.warn(
+                f"The multiplication config '{multiply_name}' is incomplete (name or columns missing). It will be ignored.",
+                UserWarning
+            )
+            continue
+
+        parsed_columns = [parse_column_name(col) for col in columns]
+        valid_columns = [(original, renamed) for original, renamed in parsed_columns if original in gdf.columns]
+        invalid_columns = [original for original, _ in parsed_columns if original not in gdf.columns]
+
+        if invalid_columns:
+            warnings.warn(
+                f"The following columns are missing from the GeoDataFrame and will be ignored for multiplication '{multiply_name}': {', '.join(invalid_columns)}.",
+                UserWarning
+            )
+
+        if not valid_columns:
+            warnings.warn(
+                f"No valid columns to multiply for '{multiply_name}'. Skipping this multiplication.",
+                UserWarning
+            )
+            continue
+
+        product = gdf[valid_columns[0][0]].copy()
+        for original, _ in valid_columns[1:]:
+            product *= gdf[original]
+
+        if multiply_name not in multiply_stats.columns:
+            multiply_stats[multiply_name] = groups.aggregate(product, "prod")
+
+    return multiply_stats.round(2)
+
+logging.basicConfig(level=logging.INFO, format='%(levelname)s:%(message)s')
+def calculate_histogram_data(gdf, histogram_config, config_file="config.yaml"):
+    validate_chart_config(gdf.columns, histogram_config, "histogram")
+    grouped = chart_group_table(gdf, histogram_config["groupby"], histogram_config.get("aggregation", {"type": "count", "column": ""}))
+    return histogram_from_group_table(grouped, histogram_config, buffer_distance(config_file))
+
+def histogram_from_group_table(grouped, histogram_config, distance):
+    """
+    Histogrammes à partir de la table par groupe (chart_group_table), commune à toutes
+    les colonnes demandées : seul le découpage en classes dépend de customBins / customLabels.
+    """
     columns = histogram_config.get("columns", [])
     groupby = histogram_config.get("groupby", "")
     aggregation = histogram_config.get("aggregation", {"type": "count", "column": ""})
@@ -331,22 +477,9 @@ def calculate_histogram_data(gdf, histogram_config, config_file="config.yaml"):
     custom_labels = histogram_config.get("customLabels", None)
 
     logging.info(f"Histogram config: {histogram_config}")
-    logging.info(f"Columns: {columns}, Groupby: {groupby}, Aggregation: {aggregation}")
-    logging.info(f"Custom Bins: {custom_bins}, Custom Labels: {custom_labels}")
 
     histogram_data = {}
 
-    if not columns:
-        raise ValueError("No columns specified in histogram config")
-    if not groupby:
-        raise ValueError("groupby must be specified in histogram config")
-    if groupby not in gdf.columns:
-        raise ValueError(f"Groupby column '{groupby}' not found in GeoDataFrame. Available columns: {list(gdf.columns)}")
-    if aggregation["type"] not in ["count", "sum"]:
-        raise ValueError(f"Unsupported aggregation type '{aggregation['type']}'. Must be 'count' or 'sum'")
-    if aggregation["type"] == "sum" and (not aggregation["column"] or aggregation["column"] not in gdf.columns):
-        raise ValueError(f"For 'sum' aggregation, a valid 'column' must be specified. Got: {aggregation['column']}")
-
     if custom_bins is None or custom_labels is None:
         custom_bins = [0, 10, 20, 40, float("inf")]
         custom_labels = ["0-9", "10-19", "20-39", "40+"]
@@ -366,47 +499,30 @@ def calculate_histogram_data(gdf, histogram_config, config_file="config.yaml"):
         if not all(isinstance(label, str) for label in custom_labels):
             raise ValueError(f"All customLabels values must be strings, got: {custom_labels}")
 
-    for col in columns:
-        if col not in gdf.columns:
-            raise ValueError(f"Column '{col}' not found in GeoDataFrame. Available columns: {list(gdf.columns)}")
-
-        if aggregation["type"] == "count":
-            grouped = gdf.groupby(groupby).size().reset_index(name="count")
-            agg_col = "count"
-            ylabel = "Number of Records"
-        elif aggregation["type"] == "sum":
-            agg_col = aggregation["column"]
-            if not pd.api.types.is_numeric_dtype(gdf[agg_col]):
-                gdf[agg_col] = pd.to_numeric(gdf[agg_col], errors='coerce')
-                logging.info(f"Converted '{agg_col}' to numeric. NaN count: {gdf[agg_col].isna().sum()}")
-            grouped = gdf.groupby(groupby)[agg_col].sum().reset_index(name="sum")
-            agg_col = "sum"
-            ylabel = f"Sum of {agg_col}"
-
-        logging.info(f"Grouped data for {col}:\n{grouped[[groupby, agg_col]]}")
-
-        grouped["bin"] = pd.cut(
-            grouped[agg_col],
-            bins=custom_bins,
-            labels=custom_labels,
-            include_lowest=True,
-            right=True
-        )
-
-        if grouped["bin"].isna().any():
-            unbinned = grouped[grouped["bin"].isna()][[groupby, agg_col]]
-            raise ValueError(f"Some values in '{agg_col}' were not binned for {col}. Check bin edges: {custom_bins}. Unbinned data:\n{unbinned}")
+    agg_col = "count" if aggregation["type"] == "count" else "sum"
+    ylabel = "Number of Records" if agg_col == "count" else f"Sum of {agg_col}"
 
-        bin_counts = grouped["bin"].value_counts().sort_index()
+    bins = pd.cut(
+        grouped[agg_col],
+        bins=custom_bins,
+        labels=custom_labels,
+        include_lowest=True,
+        right=True
+    )
+    if bins.isna().any():
+        unbinned = grouped[bins.isna()][[groupby, agg_col]]
+        raise ValueError(f"Some values in '{agg_col}' were not binned. Check bin edges: {custom_bins}. Unbinned data:\n{unbinned}")
 
-        bin_counts = bin_counts.reindex(custom_labels, fill_value=0)
+    bin_counts = bins.value_counts().sort_index()
+    bin_counts = bin_counts.reindex(custom_labels, fill_value=0)
+    logging.info(f"Bin counts:\n{bin_counts}")
 
-        logging.info(f"Bin counts for {col}:\n{bin_counts}")
+    bin_counts_df = pd.DataFrame({
+        'Bin': bin_counts.index,
+        'Count': bin_counts.values
+    })
 
-        bin_counts_df = pd.DataFrame({
-            'Bin': bin_counts.index,
-            'Count': bin_counts.values
-        })
+    for col in columns:
         csv_filename = f"./data/output/data/histogram_bin_counts_{col}_{distance}.csv"
         bin_counts_df.to_csv(csv_filename, index=False)
         logging.info(f"Bin counts for {col} saved to {csv_filename}")
@@ -422,47 +538,28 @@ def calculate_histogram_data(gdf, histogram_config, config_file="config.yaml"):
     return histogram_data
 
 def calculate_barchart_data(gdf, barchart_config):
+    validate_chart_config(gdf.columns, barchart_config, "bar chart")
+    grouped = chart_group_table(gdf, barchart_config["groupby"], barchart_config.get("aggregation", {"type": "count", "column": ""}))
+    return barchart_from_group_table(grouped, barchart_config)
+
+def barchart_from_group_table(grouped, barchart_config):
+    """Bar charts à partir de la table par groupe (chart_group_table), commune à toutes les colonnes demandées."""
     columns = barchart_config.get("columns", [])
     groupby = barchart_config.get("groupby", "")
     aggregation = barchart_config.get("aggregation", {"type": "count", "column": ""})
 
     logging.info(f"Bar chart config: {barchart_config}")
-    logging.info(f"Columns: {columns}, Groupby: {groupby}, Aggregation: {aggregation}")
 
-    if not columns:
-        raise ValueError("No columns specified in bar chart config")
-    if not groupby:
-        raise ValueError("groupby must be specified in bar chart config")
-    if groupby not in gdf.columns:
-        raise ValueError(f"Groupby column '{groupby}' not found in GeoDataFrame. Available columns: {list(gdf.columns)}")
-    if aggregation["type"] not in ["count", "sum"]:
-        raise ValueError(f"Unsupported aggregation type '{aggregation['type']}'. Must be 'count' or 'sum'")
-    if aggregation["type"] == "sum" and (not aggregation["column"] or aggregation["column"] not in gdf.columns):
-        raise ValueError(f"For 'sum' aggregation, a valid 'column' must be specified. Got: {aggregation['column']}")
+    agg_col = "count" if aggregation["type"] == "count" else "sum"
+    ylabel = "Number of Records" if agg_col == "count" else f"Sum of {agg_col}"
+    categories = grouped[groupby].tolist()
+    values = grouped[agg_col].tolist()
 
     barchart_data = {}
     for col in columns:
-        if col not in gdf.columns:
-            raise ValueError(f"Column '{col}' not found in GeoDataFrame. Available columns: {list(gdf.columns)}")
-
-        if aggregation["type"] == "count":
-            grouped = gdf.groupby(groupby).size().reset_index(name="count")
-            agg_col = "count"
-            ylabel = "Number of Records"
-        elif aggregation["type"] == "sum":
-            agg_col = aggregation["column"]
-            if not pd.api.types.is_numeric_dtype(gdf[agg_col]):
-                gdf[agg_col] = pd.to_numeric(gdf[agg_col], errors='coerce')
-                logging.info(f"Converted '{agg_col}' to numeric. NaN count: {gdf[agg_col].isna().sum()}")
-            grouped = gdf.groupby(groupby)[agg_col].sum().reset_index(name="sum")
-            agg_col = "sum"
-            ylabel = f"Sum of {agg_col}"
-
-        logging.info(f"Grouped data for {col}:\n{grouped[[groupby, agg_col]]}")
-
         barchart_data[col] = {
-            "categories": grouped[groupby].tolist(),
-            "values": grouped[agg_col].tolist(),
+            "categories": categories,
+            "values": values,
             "title": f"Bar Chart of {col} (grouped by {groupby})",
             "xlabel": groupby,
             "ylabel": ylabel
@@ -470,6 +567,51 @@ def calculate_barchart_data(gdf, barchart_config):
 
     return barchart_data
 
+def validate_chart_config(columns, chart_config, chart_name):
+    """Vérifie les colonnes, la colonne de regroupement et l'agrégation (count ou sum) d'un graphique."""
+    requested_columns = chart_config.get("columns", [])
+    groupby = chart_config.get("groupby", "")
+    aggregation = chart_config.get("aggregation", {"type": "count", "column": ""})
+
+    if not requested_columns:
+        raise ValueError(f"No columns specified in {chart_name} config")
+    if not groupby:
+        raise ValueError(f"groupby must be specified in {chart_name} config")
+    if groupby not in columns:
+        raise ValueError(f"Groupby column '{groupby}' not found in GeoDataFrame. Available columns: {list(columns)}")
+    if aggregation.get("type") not in ["count", "sum"]:
+        raise ValueError(f"Unsupported aggregation type '{aggregation.get('type')}'. Must be 'count' or 'sum'")
+    if aggregation["type"] == "sum" and (not aggregation.get("column") or aggregation["column"] not in columns):
+        raise ValueError(f"For 'sum' aggregation, a valid 'column' must be specified. Got: {aggregation.get('column')}")
+    for col in requested_columns:
+        if col not in columns:
+            raise ValueError(f"Column '{col}' not found in GeoDataFrame. Available columns: {list(columns)}")
+
+def chart_group_table(gdf, groupby, aggregation):
+    """
+    Table par groupe d'un graphique : nombre de lignes (colonne 'count') ou somme de
+    aggregation['column'] (colonne 'sum', convertie en numérique au besoin).
+    """
+    if aggregation["type"] == "count":
+        return gdf.groupby(groupby).size().reset_index(name="count")
+    values = gdf[aggregation["column"]]
+    if not pd.api.types.is_numeric_dtype(values):
+        values = pd.to_numeric(values, errors='coerce')
+        logging.info(f"Converted '{aggregation['column']}' to numeric. NaN count: {values.isna().sum()}")
+    return values.groupby(gdf[groupby]).sum().rename_axis(groupby).reset_index(name="sum")
+
+@lru_cache(maxsize=8)
+def _buffer_distance(config_file, mtime_ns):
+    with open(config_file, 'r') as file:
+        config = yaml.safe_load(file)
+    buffer_layer = config.get('buffer_layer', {})
+    layer_name = next(iter(buffer_layer), None)
+    return buffer_layer[layer_name].get('distance', None)
+
+def buffer_distance(config_file="config.yaml"):
+    """Distance du premier buffer de la configuration (relue seulement si le fichier a changé)."""
+    return _buffer_distance(config_file, os.stat(config_file).st_mtime_ns)
+
 def calculate_post_aggregation_metrics(agg_stats_gdf, post_aggregation_config):
     result_gdf = agg_stats_gdf.copy()
 
@@ -501,4 +643,50 @@ def parse_column_name(column):
     if " as " in column:
         original, renamed = column.split(" as ")
         return original.strip(), renamed.strip()
-    return column.strip(), column.strip()
\ No newline at end of file
+    return column.strip(), column.strip()
+
+def parse_weighted_column(column, func, default_weight="proportion"):
+    """
+    Colonne d'une agrégation pondérée : "col", "col as nom" (pondérée par proportion)
+    ou {"column": ..., "weight": ..., "name": ...}. Nom par défaut : <func>_<col>.
+    """
+    if isinstance(column, dict):
+        original = str(column.get("column", "")).strip()
+        weight = str(column.get("weight") or default_weight).strip()
+        renamed = str(column.get("name") or f"{func}_{original}").strip()
+        return original, weight, renamed
+    original, renamed = parse_column_name(column)
+    if " as " not in column:
+        renamed = f"{func}_{original}"
+    return original, default_weight, renamed
+
+def parse_quantile_column(column):
+    """
+    Colonne de quantile_columns : "col" ou "col as nom" (médiane), ou
+    {"column": ..., "quantiles": [0.5, 0.85, 0.95], "name": ..., "compression": ..., "exact_threshold": ...}
+    (colonnes <nom>_p50, <nom>_p85, <nom>_p95). Retourne la colonne, les couples
+    (quantile, nom) et les options de l'esquisse.
+    """
+    if isinstance(column, dict):
+        original = str(column.get("column", "")).strip()
+        name = str(column.get("name") or original).strip()
+        outputs = [(float(q), f"{name}_p{float(q) * 100:g}") for q in column.get("quantiles") or [0.5]]
+        options = {option: int(column[option]) for option in ("compression", "exact_threshold") if column.get(option)}
+        return original, outputs, options
+    original, renamed = parse_column_name(column)
+    if " as " not in column:
+        renamed = f"{original}_p50"
+    return original, [(0.5, renamed)], {}
+
+def parse_distinct_column(column):
+    """
+    Colonne de count_distinct_columns sous forme de dictionnaire :
+    {"column": ..., "name": ..., "approximate": true, "precision": 12}. Retourne la
+    colonne, le nom et les options de l'esquisse HyperLogLog ({"precision": p}, vides
+    pour le comptage exact).
+    """
+    original = str(column.get("column", "")).strip()
+    renamed = str(column.get("name") or original).strip()
+    approximate = column.get("approximate", "precision" in column)
+    options = {"precision": int(column.get("precision") or sketches.DEFAULT_PRECISION)} if approximate else {}
+    return original, renamed, options
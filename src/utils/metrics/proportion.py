@@ -1,38 +1,70 @@
 import geopandas as gpd
-from shapely.geometry import LineString, Polygon
+import numpy as np
 import pandas as pd
+import shapely
 
-def calculate_geometric_proportions(geometry: gpd.GeoSeries, buffer_geometry: gpd.GeoSeries) -> gpd.GeoSeries:
+# Identifiants de type shapely
+LINEAR_TYPE_IDS = [1, 2, 5]  # LineString, LinearRing, MultiLineString
+AREAL_TYPE_IDS = [3, 6]  # Polygon, MultiPolygon
+
+def calculate_geometric_proportions(geometry: gpd.GeoSeries, buffer_geometry: gpd.GeoSeries) -> pd.Series:
     """
     Calcule la proportion d'inclusion (aire ou longueur) d'une géométrie dans un buffer de manière vectorisée.
 
+    - (Multi)LineString : longueur de l'intersection / longueur de la géométrie
+    - (Multi)Polygon : aire de l'intersection / aire de la géométrie
+    - autres types (points...) : 1.0 si le buffer contient la géométrie, 0.0 sinon
+
+    L'intersection exacte n'est calculée que lorsque nécessaire : une géométrie dont
+    l'emprise est disjointe de celle du buffer vaut 0.0, une géométrie dont l'emprise est
+    contenue dans le buffer (buffers préparés) vaut 1.0.
+
     Parameters
     ----------
     geometry : gpd.GeoSeries
         Géométries à évaluer.
     buffer_geometry : gpd.GeoSeries
-        Buffers correspondants.
+        Buffers correspondants (alignés par position).
 
     Returns
     -------
-    gpd.GeoSeries
-        Proportions (float entre 0 et 1).
+    pd.Series
+        Proportions (float entre 0 et 1, arrondies à 4 décimales).
     """
-    intersections = geometry.intersection(buffer_geometry, align=False)
-
-    proportions = []
-    for geom, buf, inter in zip(geometry, buffer_geometry, intersections):
-        if geom.is_empty or inter.is_empty:
-            proportions.append(0.0)
-        elif isinstance(geom, LineString):
-            length = geom.length
-            inter_length = inter.length
-            proportions.append(round(inter_length / length, 4) if length > 0 else 0.0)
-        elif isinstance(geom, Polygon):
-            area = geom.area
-            inter_area = inter.area
-            proportions.append(round(inter_area / area, 4) if area > 0 else 0.0)
-        else:
-            proportions.append(1.0 if buf.contains(geom) else 0.0)
-
-    return pd.Series(proportions, index=geometry.index)
\ No newline at end of file
+    geoms = np.asarray(geometry, dtype=object)
+    buffers = np.asarray(buffer_geometry, dtype=object)
+    proportions = np.zeros(len(geoms))
+
+    type_ids = shapely.get_type_id(geoms)
+    linear = np.isin(type_ids, LINEAR_TYPE_IDS)
+    areal = np.isin(type_ids, AREAL_TYPE_IDS)
+    measured = linear | areal
+    measures = np.where(linear, shapely.length(geoms), shapely.area(geoms))
+
+    valid = ~(shapely.is_missing(geoms) | shapely.is_empty(geoms) | shapely.is_missing(buffers) | shapely.is_empty(buffers))
+    valid &= ~measured | (measures > 0)
+
+    # 1. Emprises disjointes : proportion nulle sans calcul d'intersection
+    geom_bounds = shapely.bounds(geoms)
+    buffer_bounds = shapely.bounds(buffers)
+    disjoint = ((geom_bounds[:, 0] > buffer_bounds[:, 2]) | (geom_bounds[:, 2] < buffer_bounds[:, 0]) |
+                (geom_bounds[:, 1] > buffer_bounds[:, 3]) | (geom_bounds[:, 3] < buffer_bounds[:, 1]))
+    candidates = np.flatnonzero(valid & ~disjoint)
+
+    # 2. Emprise contenue dans le buffer (test préparé) : géométrie entièrement incluse
+    shapely.prepare(buffers[candidates])
+    inside = shapely.contains(buffers[candidates], shapely.envelope(geoms[candidates]))
+    proportions[candidates[inside]] = 1.0
+    remaining = candidates[~inside]
+
+    # 3. Intersection exacte pour les lignes et polygones restants, en bloc
+    exact = remaining[measured[remaining]]
+    intersections = shapely.intersection(geoms[exact], buffers[exact])
+    inter_measures = np.where(linear[exact], shapely.length(intersections), shapely.area(intersections))
+    proportions[exact] = np.round(inter_measures / measures[exact], 4)
+
+    # 4. Autres types : inclusion stricte
+    others = remaining[~measured[remaining]]
+    proportions[others] = shapely.contains(buffers[others], geoms[others]).astype(float)
+
+    return pd.Series(proportions, index=geometry.index)
@@ -0,0 +1,287 @@
+"""
+Esquisses fusionnables par groupe : quantiles (quantile_columns) et comptages
+distincts approximatifs (count_distinct en mode approximate).
+
+Chaque groupe est résumé par des centroïdes (moyenne, poids) à la manière d'un
+t-digest : les valeurs triées sont regroupées selon la fonction d'échelle
+k(q) = compression / pi * (asin(2q - 1) + pi / 2), qui garde des centroïdes fins
+aux extrémités de la distribution (p95, p99) et plus larges autour de la médiane.
+La compression est vectorisée sur tous les groupes à la fois (tri par groupe puis
+par valeur, une seule passe).
+
+Les groupes d'au plus exact_threshold valeurs ne sont pas compressés : leurs
+quantiles sont exacts (interpolation linéaire, comme pandas). Deux esquisses
+calculées sur des morceaux différents (tuiles, lots de lignes, processus) se
+fusionnent avec merge / merge_all ; le résultat est celui d'une esquisse calculée
+sur l'ensemble des lignes, à l'approximation de la compression près.
+
+Les comptages distincts approximatifs reposent sur HyperLogLog : chaque valeur est
+hachée (64 bits, pandas.util.hash_array, identique d'un processus à l'autre), les p
+premiers bits choisissent un registre et le registre garde le rang maximal du
+premier bit à 1 du reste du hachage. Seuls les registres non nuls sont conservés
+(triplets groupe, registre, rang), la mémoire est donc bornée par
+min(lignes, groupes x 2^p). Les registres se fusionnent par maximum, entre tuiles
+(merge_all) ou vers des groupes plus grossiers, par exemple un niveau supérieur
+d'une pyramide de grilles (regroup).
+"""
+import numpy as np
+import pandas as pd
+from typing import Iterable, Sequence
+
+from utils.metrics.aggregation import GroupIndex
+
+DEFAULT_COMPRESSION = 200
+DEFAULT_EXACT_THRESHOLD = 1000
+DEFAULT_PRECISION = 12
+
+class QuantileSketch:
+    """
+    Esquisses de quantiles de tous les groupes d'une colonne.
+
+    keys : valeurs des clés de chaque groupe (une ligne par groupe) ;
+    groups, means, weights : centroïdes, triés par groupe puis par moyenne.
+    """
+
+    def __init__(self, keys: pd.DataFrame, groups: np.ndarray, means: np.ndarray, weights: np.ndarray,
+                 compression: int = DEFAULT_COMPRESSION, exact_threshold: int = DEFAULT_EXACT_THRESHOLD):
+        self.keys = keys.reset_index(drop=True)
+        self.compression = compression
+        self.exact_threshold = exact_threshold
+        self.groups, self.means, self.weights = _compress(
+            np.asarray(groups, dtype=np.int64), np.asarray(means, dtype=np.float64),
+            np.asarray(weights, dtype=np.float64), len(self.keys), compression, exact_threshold)
+
+    @classmethod
+    def from_values(cls, groups: GroupIndex, df: pd.DataFrame, values: pd.Series, **options) -> "QuantileSketch":
+        """Esquisse d'une colonne de df sur des groupes déjà factorisés (valeurs manquantes ignorées)."""
+        array = values.to_numpy(dtype=np.float64, na_value=np.nan)
+        rows = (groups.codes >= 0) & ~np.isnan(array)
+        return cls(groups.keys_frame(df), groups.codes[rows], array[rows], np.ones(int(rows.sum())), **options)
+
+    @classmethod
+    def merge_all(cls, sketches: Iterable["QuantileSketch"]) -> "QuantileSketch":
+        """Fusion de plusieurs esquisses (mêmes colonnes de clés) : les groupes de même clé sont combinés."""
+        sketches = list(sketches)
+        if not sketches:
+            raise ValueError("Aucune esquisse à fusionner.")
+        key_columns = list(sketches[0].keys.columns)
+        if any(list(sketch.keys.columns) != key_columns for sketch in sketches):
+            raise ValueError("Les esquisses à fusionner doivent avoir les mêmes colonnes de clés.")
+
+        keys = pd.concat([sketch.keys for sketch in sketches], ignore_index=True)
+        index = GroupIndex(keys, key_columns, dropna=False)
+        offsets = np.cumsum([0] + [len(sketch.keys) for sketch in sketches[:-1]])
+        groups = np.concatenate([index.codes[offset + sketch.groups] for offset, sketch in zip(offsets, sketches)])
+        return cls(index.keys_frame(keys), groups,
+                   np.concatenate([sketch.means for sketch in sketches]),
+                   np.concatenate([sketch.weights for sketch in sketches]),
+                   compression=sketches[0].compression, exact_threshold=sketches[0].exact_threshold)
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        return QuantileSketch.merge_all([self, other])
+
+    @property
+    def ngroups(self) -> int:
+        return len(self.keys)
+
+    def counts(self) -> np.ndarray:
+        """Nombre de valeurs résumées par groupe."""
+        return np.bincount(self.groups, weights=self.weights, minlength=self.ngroups)
+
+    def quantiles(self, qs: Sequence[float]) -> np.ndarray:
+        """
+        Quantiles de chaque groupe, tableau (ngroups, len(qs)) ; NaN pour un groupe vide.
+
+        Un centroïde de poids w occupe les rangs [avant, avant + w - 1] et est placé au
+        milieu ; le rang cible q * (n - 1) est interpolé linéairement entre les deux
+        centroïdes qui l'encadrent, ce qui redonne le quantile exact de pandas quand
+        tous les centroïdes sont de poids 1.
+        """
+        qs = np.asarray(qs, dtype=np.float64)
+        totals = self.counts()
+        starts, within_before = _group_offsets(self.groups, self.weights, self.ngroups)
+        positions = within_before + (self.weights - 1) / 2
+
+        target_groups = np.repeat(np.arange(self.ngroups), len(qs))
+        targets = (np.tile(qs, self.ngroups) * np.maximum(totals[target_groups] - 1, 0))
+
+        # Dernier centroïde de rang <= cible, par un tri commun centroïdes + cibles
+        n_centroids = len(self.means)
+        all_groups = np.concatenate([self.groups, target_groups])
+        all_positions = np.concatenate([positions, targets])
+        is_target = np.concatenate([np.zeros(n_centroids, dtype=bool), np.ones(len(targets), dtype=bool)])
+        order = np.lexsort((is_target, all_positions, all_groups))
+        carried = np.maximum.accumulate(np.where(is_target[order], -1, order))
+        below = np.empty(len(targets), dtype=np.int64)
+        below[order[is_target[order]] - n_centroids] = carried[is_target[order]]
+
+        result = np.full(len(targets), np.nan)
+        present = totals[target_groups] > 0
+        first = starts[target_groups]
+        last = np.append(starts[1:], n_centroids)[target_groups] - 1
+        below = np.where((below < 0) | (below < first), first, below)
+        above = np.minimum(below + 1, last)
+
+        idx = np.flatnonzero(present)
+        lo, hi = below[idx], above[idx]
+        span = positions[hi] - positions[lo]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            fraction = np.where(span > 0, np.clip((targets[idx] - positions[lo]) / span, 0, 1), 0.0)
+        result[idx] = self.means[lo] + fraction * (self.means[hi] - self.means[lo])
+        return result.reshape(self.ngroups, len(qs))
+
+class HyperLogLogSketch:
+    """
+    Registres HyperLogLog de tous les groupes d'une colonne.
+
+    keys : valeurs des clés de chaque groupe (une ligne par groupe) ;
+    groups, registers, ranks : registres non nuls, triés par groupe puis par registre.
+    """
+
+    def __init__(self, keys: pd.DataFrame, groups: np.ndarray, registers: np.ndarray, ranks: np.ndarray,
+                 precision: int = DEFAULT_PRECISION):
+        if not 4 <= precision <= 18:
+            raise ValueError(f"La précision HyperLogLog doit être comprise entre 4 et 18 (reçu : {precision}).")
+        self.keys = keys.reset_index(drop=True)
+        self.precision = precision
+        self.groups, self.registers, self.ranks = _max_registers(
+            np.asarray(groups, dtype=np.int64), np.asarray(registers, dtype=np.int64),
+            np.asarray(ranks, dtype=np.uint8), precision)
+
+    @classmethod
+    def from_values(cls, groups: GroupIndex, df: pd.DataFrame, values: pd.Series,
+                    precision: int = DEFAULT_PRECISION) -> "HyperLogLogSketch":
+        """Registres d'une colonne de df sur des groupes déjà factorisés (valeurs manquantes et 'nan' ignorées)."""
+        rows = (groups.codes >= 0) & values.notna().to_numpy() & ~values.eq("nan").to_numpy(dtype=bool, na_value=False)
+        registers, ranks = _hash_registers(_hash_values(values[rows]), precision)
+        return cls(groups.keys_frame(df), groups.codes[rows], registers, ranks, precision=precision)
+
+    @classmethod
+    def merge_all(cls, sketches: Iterable["HyperLogLogSketch"]) -> "HyperLogLogSketch":
+        """Fusion de plusieurs esquisses (mêmes colonnes de clés et même précision) : maximum des registres."""
+        sketches = list(sketches)
+        if not sketches:
+            raise ValueError("Aucune esquisse à fusionner.")
+        if len({sketch.precision for sketch in sketches}) > 1:
+            raise ValueError("Les esquisses à fusionner doivent avoir la même précision.")
+        key_columns = list(sketches[0].keys.columns)
+        if any(list(sketch.keys.columns) != key_columns for sketch in sketches):
+            raise ValueError("Les esquisses à fusionner doivent avoir les mêmes colonnes de clés.")
+
+        keys = pd.concat([sketch.keys for sketch in sketches], ignore_index=True)
+        index = GroupIndex(keys, key_columns, dropna=False)
+        offsets = np.cumsum([0] + [len(sketch.keys) for sketch in sketches[:-1]])
+        groups = np.concatenate([index.codes[offset + sketch.groups] for offset, sketch in zip(offsets, sketches)])
+        return cls(index.keys_frame(keys), groups,
+                   np.concatenate([sketch.registers for sketch in sketches]),
+                   np.concatenate([sketch.ranks for sketch in sketches]), precision=sketches[0].precision)
+
+    def merge(self, other: "HyperLogLogSketch") -> "HyperLogLogSketch":
+        return HyperLogLogSketch.merge_all([self, other])
+
+    def regroup(self, keys: pd.DataFrame) -> "HyperLogLogSketch":
+        """
+        Regroupement vers des clés plus grossières : keys donne, pour chaque groupe actuel
+        (même ordre que self.keys), la clé du groupe parent (ex. maille du niveau supérieur).
+        """
+        if len(keys) != self.ngroups:
+            raise ValueError("keys doit contenir une ligne par groupe de l'esquisse.")
+        keys = keys.reset_index(drop=True)
+        index = GroupIndex(keys, list(keys.columns), dropna=False)
+        return HyperLogLogSketch(index.keys_frame(keys), index.codes[self.groups], self.registers, self.ranks,
+                                 precision=self.precision)
+
+    @property
+    def ngroups(self) -> int:
+        return len(self.keys)
+
+    @property
+    def relative_error(self) -> float:
+        """Erreur relative type de l'estimation : 1.04 / sqrt(2^p)."""
+        return 1.04 / np.sqrt(2 ** self.precision)
+
+    def estimate(self) -> np.ndarray:
+        """Nombre estimé de valeurs distinctes par groupe (comptage linéaire pour les petites cardinalités)."""
+        m = 2 ** self.precision
+        alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(m, 0.7213 / (1 + 1.079 / m))
+        filled = np.bincount(self.groups, minlength=self.ngroups)
+        inverse_sum = (np.bincount(self.groups, weights=np.ldexp(1.0, -self.ranks.astype(np.int64)),
+                                   minlength=self.ngroups) + (m - filled))
+        raw = alpha * m * m / inverse_sum
+        with np.errstate(divide="ignore"):
+            linear = m * np.log(m / np.maximum(m - filled, 1))
+        return np.where((raw <= 2.5 * m) & (filled < m), linear, raw)
+
+def _hash_values(values: pd.Series) -> np.ndarray:
+    """
+    Hachage 64 bits des valeurs. Chaque valeur entière (y compris stockée en float à
+    cause de valeurs manquantes ou d'autres valeurs décimales) est hachée en int64 et
+    les autres en float64 : une même valeur a le même hachage quel que soit le type du
+    morceau de colonne qui la contient.
+    """
+    array = values.to_numpy()
+    if array.dtype.kind in "biu":
+        return pd.util.hash_array(array.astype(np.int64), categorize=False)
+    if array.dtype.kind != "f":
+        return pd.util.hash_array(array, categorize=False)
+    integral = (array == np.floor(array)) & (np.abs(array) < 2.0 ** 63)
+    hashes = pd.util.hash_array(array.astype(np.float64), categorize=False)
+    hashes[integral] = pd.util.hash_array(array[integral].astype(np.int64), categorize=False)
+    return hashes
+
+def _hash_registers(hashes: np.ndarray, precision: int):
+    """Registre (p premiers bits) et rang du premier bit à 1 des 64 - p bits restants."""
+    registers = (hashes >> np.uint64(64 - precision)).astype(np.int64)
+    remainder = hashes << np.uint64(precision)
+    # Longueur en bits calculée sur les deux moitiés de 32 bits (exactes en float64)
+    high = (remainder >> np.uint64(32)).astype(np.float64)
+    low = (remainder & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    bit_length = np.where(high > 0, 32 + np.frexp(high)[1], np.frexp(low)[1])
+    ranks = np.minimum(64 - bit_length + 1, 64 - precision + 1)
+    return registers, ranks.astype(np.uint8)
+
+def _max_registers(groups: np.ndarray, registers: np.ndarray, ranks: np.ndarray, precision: int):
+    """Rang maximal par (groupe, registre), triés par groupe puis par registre."""
+    if not len(groups):
+        return groups, registers, ranks
+    cells = groups * (2 ** precision) + registers
+    order = np.argsort(cells)
+    cells, ranks = cells[order], ranks[order]
+    first = np.ones(len(cells), dtype=bool)
+    first[1:] = cells[1:] != cells[:-1]
+    starts = np.flatnonzero(first)
+    cells = cells[starts]
+    return cells >> precision, cells & (2 ** precision - 1), np.maximum.reduceat(ranks, starts)
+
+def _group_offsets(groups: np.ndarray, weights: np.ndarray, ngroups: int):
+    """Début de chaque groupe et poids cumulé des centroïdes précédents du même groupe."""
+    starts = np.searchsorted(groups, np.arange(ngroups))
+    cumulative = np.concatenate([[0.0], np.cumsum(weights)])
+    return starts, cumulative[:-1] - cumulative[starts][groups]
+
+def _compress(groups: np.ndarray, means: np.ndarray, weights: np.ndarray, ngroups: int,
+              compression: int, exact_threshold: int):
+    """Regroupe les centroïdes de chaque groupe selon la fonction d'échelle (groupes exacts laissés intacts)."""
+    # Tri par valeur puis tri stable par groupe (plus rapide qu'un lexsort sur les deux clés)
+    order = np.argsort(means)
+    order = order[np.argsort(groups[order], kind="stable")]
+    groups, means, weights = groups[order], means[order], weights[order]
+    if not len(groups):
+        return groups, means, weights
+
+    totals = np.bincount(groups, weights=weights, minlength=ngroups)[groups]
+    starts, within_before = _group_offsets(groups, weights, ngroups)
+    exact = totals <= exact_threshold
+    if exact.all():
+        return groups, means, weights
+
+    q = (within_before + weights / 2) / totals
+    bins = np.floor(compression / np.pi * (np.arcsin(np.clip(2 * q - 1, -1, 1)) + np.pi / 2))
+    bins = np.where(exact, np.arange(len(groups)) - starts[groups], np.minimum(bins, compression - 1))
+
+    boundaries = np.ones(len(groups), dtype=bool)
+    boundaries[1:] = (groups[1:] != groups[:-1]) | (bins[1:] != bins[:-1])
+    centroid_ids = np.cumsum(boundaries) - 1
+    new_weights = np.bincount(centroid_ids, weights=weights)
+    new_means = np.bincount(centroid_ids, weights=weights * means) / new_weights
+    return groups[boundaries], new_means, new_weights
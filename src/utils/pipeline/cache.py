@@ -0,0 +1,132 @@
+import glob
+import hashlib
+import json
+import logging
+import os
+import pickle
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+STAGE_CACHE_DIR = "./data/cache/stages"
+
+# À incrémenter lorsqu'une modification du code change la sortie d'une étape
+CACHE_VERSION = 1
+
+def fingerprint(*parts) -> str:
+    """Empreinte sha1 d'objets sérialisables en JSON (clés triées)."""
+    payload = json.dumps([CACHE_VERSION, *parts], sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+def file_fingerprint(path: Optional[str]) -> dict:
+    """Empreinte d'un fichier d'entrée : chemin, taille et date de modification."""
+    if not path or not os.path.exists(path):
+        return {"path": path, "missing": True}
+    stat = os.stat(path)
+    return {"path": path, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+class StageCache:
+    """
+    Cache disque des sorties des étapes du pipeline : un fichier pickle par
+    (étape, clé), écrit de manière atomique dans <root>/<étape>/<clé>.pkl.
+
+    Seules les max_entries entrées les plus récentes de chaque étape sont conservées.
+    """
+
+    def __init__(self, root: str = STAGE_CACHE_DIR, max_entries: int = 4):
+        self.root = root
+        self.max_entries = max_entries
+
+    def _path(self, stage: str, key: str) -> str:
+        return os.path.join(self.root, stage, f"{key}.pkl")
+
+    def contains(self, stage: str, key: str) -> bool:
+        return os.path.exists(self._path(stage, key))
+
+    def load(self, stage: str, key: str) -> Tuple[bool, Any]:
+        path = self._path(stage, key)
+        if not os.path.exists(path):
+            return False, None
+        try:
+            with open(path, "rb") as file:
+                value = pickle.load(file)
+        except Exception as e:
+            logger.warning(f"Entrée de cache illisible pour l'étape {stage} ({e}), recalcul.")
+            return False, None
+        os.utime(path)
+        return True, value
+
+    def save(self, stage: str, key: str, value: Any) -> None:
+        path = self._path(stage, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as file:
+            pickle.dump(value, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        self._prune(stage)
+
+    def _prune(self, stage: str) -> None:
+        entries = sorted(glob.glob(os.path.join(self.root, stage, "*.pkl")), key=os.path.getmtime, reverse=True)
+        for path in entries[self.max_entries:]:
+            os.remove(path)
+
+class MemoryStageCache:
+    """
+    Sorties d'étapes gardées en mémoire devant un cache disque, pour un processus
+    résident (voir utils.pipeline.engine) : les max_entries dernières sorties de chaque
+    étape sont servies sans relire ni désérialiser le pickle.
+
+    Les étapes avales modifient parfois leurs entrées (ex. colonne de ratio ajoutée à
+    la table de fusion) : une copie est conservée et chaque lecture en renvoie une copie.
+    """
+
+    def __init__(self, disk: Optional[StageCache] = None, max_entries: int = 2):
+        self.disk = disk
+        self.max_entries = max_entries
+        self._entries: Dict[str, "OrderedDict[str, Any]"] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def contains(self, stage: str, key: str) -> bool:
+        return key in self._entries.get(stage, {}) or (self.disk is not None and self.disk.contains(stage, key))
+
+    def load(self, stage: str, key: str) -> Tuple[bool, Any]:
+        entries = self._entries.get(stage, {})
+        if key in entries:
+            self.hits += 1
+            entries.move_to_end(key)
+            return True, copy_output(entries[key])
+        self.misses += 1
+        hit, value = self.disk.load(stage, key) if self.disk is not None else (False, None)
+        if hit:
+            self._remember(stage, key, value)
+        return hit, value
+
+    def save(self, stage: str, key: str, value: Any) -> None:
+        if self.disk is not None:
+            self.disk.save(stage, key, value)
+        self._remember(stage, key, value)
+
+    def _remember(self, stage: str, key: str, value: Any) -> None:
+        entries = self._entries.setdefault(stage, OrderedDict())
+        entries[key] = copy_output(value)
+        entries.move_to_end(key)
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+    def stats(self) -> Dict:
+        return {"entries": {stage: len(entries) for stage, entries in self._entries.items()},
+                "hits": self.hits, "misses": self.misses}
+
+def copy_output(value: Any) -> Any:
+    """Copie des tables (pandas) d'une sortie d'étape ; les géométries shapely, immuables, sont partagées."""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy()
+    if isinstance(value, dict):
+        return {key: copy_output(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(copy_output(item) for item in value)
+    return value
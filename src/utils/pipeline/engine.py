@@ -0,0 +1,181 @@
+"""
+Moteur de pipeline résident pour l'application Flask.
+
+Un processus de travail (PipelineEngine) est lancé une fois puis réutilisé par les
+tâches successives : les bibliothèques (geopandas, osmnx, networkx, ...) ne sont
+importées qu'au démarrage, les sorties des étapes restent en mémoire (voir
+cache.MemoryStageCache) et les graphes OSM déjà lus, avec leur index d'accrochage,
+sont conservés (voir network.GRAPH_CACHE_SIZE). Une tâche qui ne modifie que les
+métriques ou un paramètre de buffer ne recalcule que les étapes concernées, sans
+relire les couches ni le réseau.
+
+Chaque exécution se fait dans le répertoire de travail de la tâche ; les messages
+(print, journaux) et l'avancement sont renvoyés au processus Flask par un tube.
+Arrêter le processus (annulation) perd l'état en mémoire : il est relancé à froid
+à l'exécution suivante.
+"""
+import atexit
+import io
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+import traceback
+from typing import Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+# Sorties conservées par étape et graphes OSM conservés par le processus résident
+MEMORY_STAGE_ENTRIES = 2
+GRAPH_CACHE_SIZE = 2
+
+class PipelineEngine:
+    """
+    Processus de travail résident exécutant stages.run_pipeline. Une seule exécution
+    à la fois : run() bloque jusqu'à la fin de l'exécution.
+    """
+
+    def __init__(self, name: str = "pipeline-engine"):
+        self.name = name
+        self.runs = 0
+        self._context = multiprocessing.get_context("spawn")
+        self._process = None
+        self._conn = None
+        self._lock = threading.Lock()
+        # Processus non démoniaque : arrêté explicitement à la sortie pour ne pas bloquer l'interpréteur
+        atexit.register(self.stop)
+
+    @property
+    def alive(self) -> bool:
+        return self._process is not None and self._process.is_alive()
+
+    def start(self) -> None:
+        """Lance le processus (imports et initialisation) s'il ne tourne pas déjà."""
+        with self._lock:
+            if self.alive:
+                return
+            parent_conn, child_conn = self._context.Pipe()
+            # Non démoniaque : les buffers réseau et isochrones lancent leur propre pool de processus
+            self._process = self._context.Process(target=_serve, args=(child_conn,), name=self.name, daemon=False)
+            self._process.start()
+            child_conn.close()
+            self._conn = parent_conn
+            self.runs = 0
+            logger.info(f"Moteur {self.name} démarré (pid {self._process.pid})")
+
+    def run(self, config: Dict, workspace: str, on_message: Callable[[str, object], None]) -> Dict:
+        """
+        Exécute le pipeline pour config dans workspace. on_message reçoit ("log", ligne)
+        et ("progress", événement) au fil de l'eau. Retourne {"status": "succeeded" | "failed",
+        "error", "runs", "cache"} ; lève EOFError si le processus est arrêté en cours de route.
+        """
+        self.start()
+        conn = self._conn
+        conn.send(("run", config, workspace))
+        while True:
+            kind, payload = conn.recv()
+            if kind == "done":
+                self.runs = payload["runs"]
+                return payload
+            on_message(kind, payload)
+
+    def terminate(self) -> None:
+        """Arrête le processus (et l'exécution en cours) ; il sera relancé à froid au prochain run()."""
+        process, conn = self._process, self._conn
+        if process is not None and process.is_alive():
+            process.terminate()
+            process.join(timeout=10)
+            if process.is_alive():
+                process.kill()
+        if conn is not None:
+            conn.close()
+        self._process = self._conn = None
+
+    def stop(self) -> None:
+        """Arrêt normal du processus (fin de l'application)."""
+        if self.alive:
+            try:
+                self._conn.send(("stop",))
+                self._process.join(timeout=10)
+            except (OSError, EOFError):
+                pass
+        self.terminate()
+
+class _PipeWriter(io.TextIOBase):
+    """Flux texte (stdout, stderr) du processus de travail, renvoyé ligne par ligne au processus Flask."""
+
+    def __init__(self, send: Callable):
+        self._send = send
+        self._buffer = ""
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        self._buffer += text
+        *lines, self._buffer = self._buffer.replace("\r", "\n").split("\n")
+        for line in lines:
+            if line:
+                self._send("log", line)
+        return len(text)
+
+    def flush(self) -> None:
+        if self._buffer:
+            self._send("log", self._buffer)
+            self._buffer = ""
+
+def _serve(conn) -> None:
+    """Boucle du processus de travail : une exécution du pipeline par message ("run", config, workspace)."""
+    send_lock = threading.Lock()
+
+    def send(kind: str, payload) -> None:
+        with send_lock:
+            conn.send((kind, payload))
+
+    sys.stdout = sys.stderr = _PipeWriter(send)
+
+    # Imports lourds une seule fois, au démarrage du processus
+    import pandas as pd
+    import utils.buffer.network as network
+    import utils.pipeline.stages as stages
+    from utils.buffer.checkpoint import ShardComplete
+    from utils.pipeline.cache import MemoryStageCache, StageCache
+
+    # Journaux configurés avant la redirection (ex. par le module principal réimporté) : renvoyés eux aussi
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, logging.StreamHandler) and not isinstance(handler, logging.FileHandler):
+            handler.setStream(sys.stderr)
+    pd.set_option("future.no_silent_downcasting", True)
+    network.GRAPH_CACHE_SIZE = GRAPH_CACHE_SIZE
+    caches: Dict[str, MemoryStageCache] = {}
+    runs = 0
+
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            return
+        if message[0] == "stop":
+            return
+
+        _, config, workspace = message
+        runs += 1
+        result = {"status": "succeeded", "error": None}
+        try:
+            os.chdir(workspace)
+            cache = None
+            if config.get("stage_cache", True):
+                # Un cache mémoire par répertoire de cache disque (partagé entre les espaces de travail)
+                root = os.path.realpath(StageCache().root)
+                cache = caches.setdefault(root, MemoryStageCache(StageCache(root), max_entries=MEMORY_STAGE_ENTRIES))
+            stages.run_pipeline(config, cache=cache, progress=lambda event: send("progress", event))
+        except ShardComplete as e:
+            # Exécution partielle (un shard) : ses chunks sont enregistrés, rien n'est exporté
+            print(e)
+        except Exception as e:
+            traceback.print_exc()
+            result = {"status": "failed", "error": f"{type(e).__name__}: {e}"}
+        sys.stdout.flush()
+        result.update(runs=runs, cache={root: cache.stats() for root, cache in caches.items()})
+        send("done", result)
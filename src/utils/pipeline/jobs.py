@@ -0,0 +1,263 @@
+"""
+Tâches asynchrones du pipeline pour l'application Flask.
+
+Chaque soumission devient une tâche identifiée par un id, exécutée par un pool
+borné de max_workers threads. Chaque tâche tourne dans son propre répertoire de
+travail (JOBS_DIR/<id>) avec sa configuration et ses sorties ; les entrées
+(data/input), les caches (data/cache) et les réseaux OSM sont partagés par liens
+symboliques. Avec engine=True, la tâche est exécutée par un moteur résident (voir
+utils.pipeline.engine, un processus par worker) qui garde couches et réseaux en
+mémoire d'une tâche à l'autre ; sinon main.py y est lancé avec --progress. Dans les
+deux cas l'avancement est lu au fil de l'eau et exposé dans le statut de la tâche.
+Une tâche en attente ou en cours peut être annulée. Les sorties d'une tâche terminée sont publiées
+dans le répertoire de sortie partagé (data/output), lu par les autres routes.
+"""
+import json
+import logging
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import yaml
+
+from utils.pipeline.engine import PipelineEngine
+
+logger = logging.getLogger(__name__)
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+JOBS_DIR = "./data/jobs"
+PROGRESS_PREFIX = "@progress "
+
+# Répertoires partagés entre les tâches (liens symboliques dans chaque espace de travail)
+SHARED_DIRS = ("data/input", "data/cache", "utils/buffer/networks")
+OUTPUT_DIRS = ("data/output/data/agg", "data/output/data/fusion", "data/output/data/buffers",
+               "data/output/visualisation")
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+class Job:
+    """État d'une tâche : statut, avancement par étape, journal (dernières lignes) et espace de travail."""
+
+    def __init__(self, job_id: str, config: Dict, workspace: str):
+        self.id = job_id
+        self.config = config
+        self.workspace = workspace
+        self.status = QUEUED
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.stages: Dict[str, Optional[str]] = {}
+        self.current_stage: Optional[str] = None
+        self.error: Optional[str] = None
+        self.returncode: Optional[int] = None
+        self.log = deque(maxlen=200)
+        self.cancel_requested = False
+        self.process: Optional[subprocess.Popen] = None
+        self.engine: Optional[PipelineEngine] = None
+        self.engine_runs: Optional[int] = None
+        self.future: Optional[Future] = None
+
+    def handle_progress(self, event: Dict) -> None:
+        if event.get("event") == "planned":
+            self.stages = {stage: None for stage in event.get("stages", [])}
+        elif event.get("event") == "started":
+            self.current_stage = event["stage"]
+            self.stages[event["stage"]] = RUNNING
+        elif event.get("event") == "finished":
+            self.stages[event["stage"]] = event.get("status")
+
+    def to_dict(self, log_lines: int = 20) -> Dict:
+        completed = sum(status not in (None, RUNNING) for status in self.stages.values())
+        end = self.finished_at or time.time()
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "elapsed_s": round(end - self.started_at, 2) if self.started_at else None,
+            "progress": {"completed": completed, "total": len(self.stages), "current_stage": self.current_stage,
+                         "stages": dict(self.stages)},
+            "error": self.error,
+            "returncode": self.returncode,
+            # Rang de l'exécution dans le moteur résident (1 : démarrage à froid)
+            "engine_run": self.engine_runs,
+            "log": list(self.log)[-log_lines:] if log_lines else [],
+        }
+
+class JobManager:
+    """
+    File de tâches du pipeline : au plus max_workers exécutions simultanées, les
+    max_jobs tâches terminées les plus récentes (et leur espace de travail) conservées.
+    engine=True exécute les tâches dans max_workers moteurs résidents plutôt qu'un
+    processus main.py par tâche.
+    """
+
+    def __init__(self, max_workers: int = 2, jobs_dir: str = JOBS_DIR, src_dir: str = SRC_DIR,
+                 shared_output_dir: str = "./data/output", shared_config_path: str = "config.yaml",
+                 max_jobs: int = 20, engine: bool = False):
+        self.jobs_dir = os.path.abspath(jobs_dir)
+        self.src_dir = src_dir
+        self.shared_output_dir = os.path.abspath(shared_output_dir)
+        self.shared_config_path = os.path.abspath(shared_config_path)
+        self.max_jobs = max_jobs
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pipeline-job")
+        self._engines: Optional["queue.Queue[PipelineEngine]"] = None
+        if engine:
+            self._engines = queue.Queue()
+            for i in range(max_workers):
+                self._engines.put(PipelineEngine(name=f"pipeline-engine-{i}"))
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._publish_lock = threading.Lock()
+
+    def submit(self, config: Dict) -> Job:
+        job_id = uuid.uuid4().hex[:12]
+        job = Job(job_id, config, os.path.join(self.jobs_dir, job_id))
+        self._prepare_workspace(job)
+        with self._lock:
+            self._jobs[job_id] = job
+            self._prune()
+        job.future = self._executor.submit(self._run, job)
+        logger.info(f"Tâche {job_id} soumise")
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self) -> List[Job]:
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda job: job.created_at, reverse=True)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """Annule une tâche en attente (retirée de la file) ou en cours (processus arrêté)."""
+        job = self.get(job_id)
+        if job is None or job.status in FINISHED:
+            return job
+        job.cancel_requested = True
+        if job.future is not None and job.future.cancel():
+            self._finish(job, CANCELLED)
+        elif job.engine is not None:
+            job.engine.terminate()
+        elif job.process is not None and job.process.poll() is None:
+            job.process.terminate()
+        return job
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[Job]:
+        job = self.get(job_id)
+        if job is not None and job.future is not None and not job.future.cancelled():
+            job.future.result(timeout=timeout)
+        return job
+
+    def shutdown(self, cancel_running: bool = True) -> None:
+        if cancel_running:
+            for job in self.list():
+                self.cancel(job.id)
+        self._executor.shutdown(wait=True)
+        if self._engines is not None:
+            while not self._engines.empty():
+                self._engines.get().stop()
+
+    def _prepare_workspace(self, job: Job) -> None:
+        for directory in OUTPUT_DIRS:
+            os.makedirs(os.path.join(job.workspace, directory), exist_ok=True)
+        for shared in SHARED_DIRS:
+            source = os.path.join(self.src_dir, shared)
+            os.makedirs(source, exist_ok=True)
+            os.makedirs(os.path.dirname(os.path.join(job.workspace, shared)), exist_ok=True)
+            os.symlink(source, os.path.join(job.workspace, shared), target_is_directory=True)
+        with open(os.path.join(job.workspace, "config.yaml"), "w") as file:
+            yaml.dump(job.config, file)
+
+    def _run(self, job: Job) -> None:
+        if job.cancel_requested:
+            self._finish(job, CANCELLED)
+            return
+        job.status = RUNNING
+        job.started_at = time.time()
+        try:
+            if self._engines is not None:
+                self._run_engine(job)
+            else:
+                self._run_process(job)
+        except Exception as e:
+            if job.cancel_requested:
+                self._finish(job, CANCELLED)
+                return
+            logger.error(f"Tâche {job.id} : {e}")
+            job.error = str(e)
+            self._finish(job, FAILED)
+            return
+
+        if job.cancel_requested:
+            self._finish(job, CANCELLED)
+        elif job.returncode != 0:
+            job.error = job.error or "\n".join(list(job.log)[-20:]) or f"main.py exited with code {job.returncode}"
+            self._finish(job, FAILED)
+        else:
+            self._publish(job)
+            self._finish(job, SUCCEEDED)
+
+    def _run_process(self, job: Job) -> None:
+        job.process = subprocess.Popen(
+            [sys.executable, os.path.join(self.src_dir, "main.py"), "--progress"], cwd=job.workspace,
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1)
+        if job.cancel_requested:
+            # Annulation demandée pendant le lancement du processus
+            job.process.terminate()
+        for line in job.process.stdout:
+            line = line.rstrip("\n")
+            if line.startswith(PROGRESS_PREFIX):
+                job.handle_progress(json.loads(line[len(PROGRESS_PREFIX):]))
+            else:
+                job.log.append(line)
+        job.returncode = job.process.wait()
+
+    def _run_engine(self, job: Job) -> None:
+        engine = self._engines.get()
+        try:
+            job.engine = engine
+            if job.cancel_requested:
+                return
+
+            def on_message(kind, payload):
+                if kind == "progress":
+                    job.handle_progress(payload)
+                else:
+                    job.log.append(payload)
+
+            result = engine.run(job.config, job.workspace, on_message)
+            job.engine_runs = result["runs"]
+            job.error = result["error"]
+            job.returncode = 0 if result["status"] == SUCCEEDED else 1
+        finally:
+            job.engine = None
+            self._engines.put(engine)
+
+    def _publish(self, job: Job) -> None:
+        """Copie les sorties (et la configuration) de la tâche dans le répertoire de sortie partagé."""
+        with self._publish_lock:
+            shutil.copytree(os.path.join(job.workspace, "data", "output"), self.shared_output_dir, dirs_exist_ok=True)
+            shutil.copy(os.path.join(job.workspace, "config.yaml"), self.shared_config_path)
+
+    def _finish(self, job: Job, status: str) -> None:
+        job.status = status
+        job.finished_at = time.time()
+        job.current_stage = None
+        logger.info(f"Tâche {job.id} : {status}")
+
+    def _prune(self) -> None:
+        finished = sorted((job for job in self._jobs.values() if job.status in FINISHED), key=lambda job: job.created_at)
+        for job in finished[:max(0, len(finished) - self.max_jobs)]:
+            del self._jobs[job.id]
+            shutil.rmtree(job.workspace, ignore_errors=True)
@@ -0,0 +1,143 @@
+import json
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+REPORT_FILENAME = "run_report.json"
+
+_active: ContextVar[Optional["Profiler"]] = ContextVar("active_profiler", default=None)
+
+def row_count(value: Any) -> Optional[int]:
+    """Nombre de lignes d'une sortie d'étape (DataFrame, ou dict/list/tuple de DataFrames)."""
+    if isinstance(value, pd.DataFrame):
+        return len(value)
+    if isinstance(value, dict):
+        value = list(value.values())
+    if isinstance(value, (list, tuple)):
+        counts = [count for count in map(row_count, value) if count is not None]
+        return sum(counts) if counts else None
+    return None
+
+def max_rss_mb() -> Optional[float]:
+    """Pic de mémoire résidente du processus depuis son démarrage (Mo)."""
+    if resource is None:
+        return None
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+class Profiler:
+    """
+    Mesures d'une exécution du pipeline : pour chaque étape, et pour chaque couche de
+    buffer ou de jointure, temps réel, temps CPU, pic d'allocation (tracemalloc),
+    nombre de lignes en entrée et en sortie, et succès/échec du cache.
+
+    Les étapes étant résolues de manière paresseuse, une étape peut s'exécuter à
+    l'intérieur d'une autre : le temps d'une étape exclut celui des étapes imbriquées,
+    mais inclut celui de ses couches.
+    """
+
+    def __init__(self, trace_memory: bool = True):
+        self.trace_memory = trace_memory
+        self.records: List[Dict[str, Any]] = []
+        self.started_at = datetime.now().isoformat(timespec="seconds")
+        self._stack: List[Dict[str, float]] = []
+        self._start_wall = time.perf_counter()
+        self._start_cpu = time.process_time()
+        self._started_tracing = False
+
+    @contextmanager
+    def activate(self):
+        """Rend le profiler actif pour section() ; démarre tracemalloc si nécessaire."""
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        token = _active.set(self)
+        try:
+            yield self
+        finally:
+            _active.reset(token)
+            if self._started_tracing:
+                tracemalloc.stop()
+                self._started_tracing = False
+
+    @contextmanager
+    def record(self, stage: str, layer: Optional[str] = None, rows_in: Optional[int] = None):
+        """Mesure un bloc ; le dictionnaire retourné peut être complété (rows_out, cache)."""
+        entry = {"stage": stage, "layer": layer, "rows_in": rows_in, "rows_out": None, "cache": None}
+        frame = {"nested_wall": 0.0, "nested_cpu": 0.0, "nested_memory": 0, "peak": 0, "start_memory": 0}
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+        if tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                self._stack[-1]["peak"] = max(self._stack[-1]["peak"], peak)
+            tracemalloc.reset_peak()
+            frame["start_memory"] = current
+        self._stack.append(frame)
+        start_wall, start_cpu = time.perf_counter(), time.process_time()
+        try:
+            yield entry
+        finally:
+            wall = time.perf_counter() - start_wall
+            cpu = time.process_time() - start_cpu
+            self._stack.pop()
+            entry["wall_s"] = round(wall - frame["nested_wall"], 4)
+            entry["cpu_s"] = round(cpu - frame["nested_cpu"], 4)
+            nested_stage = layer is None and bool(self._stack)
+            if tracing:
+                # Pic d'allocation propre : la mémoire conservée par les étapes imbriquées est exclue
+                current, traced_peak = tracemalloc.get_traced_memory()
+                peak_alloc = max(frame["peak"] - frame["start_memory"],
+                                 traced_peak - frame["start_memory"] - frame["nested_memory"], 0)
+                entry["peak_alloc_mb"] = round(peak_alloc / 1e6, 2)
+                if nested_stage:
+                    self._stack[-1]["nested_memory"] += current - frame["start_memory"]
+                    tracemalloc.reset_peak()
+                elif self._stack:
+                    self._stack[-1]["peak"] = max(self._stack[-1]["peak"], traced_peak, frame["peak"])
+            entry["max_rss_mb"] = max_rss_mb()
+            # Une étape imbriquée n'est pas comptée dans l'étape englobante
+            if nested_stage:
+                self._stack[-1]["nested_wall"] += wall
+                self._stack[-1]["nested_cpu"] += cpu
+            self.records.append(entry)
+
+    def report(self, **extra) -> Dict[str, Any]:
+        report = {
+            "started_at": self.started_at,
+            "wall_s": round(time.perf_counter() - self._start_wall, 4),
+            "cpu_s": round(time.process_time() - self._start_cpu, 4),
+            "max_rss_mb": max_rss_mb(),
+            "stages": [entry for entry in self.records if entry["layer"] is None],
+            "layers": [entry for entry in self.records if entry["layer"] is not None],
+        }
+        report.update(extra)
+        return report
+
+    def write(self, output_dir: str, **extra) -> str:
+        os.makedirs(output_dir, exist_ok=True)
+        path = os.path.join(output_dir, REPORT_FILENAME)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(self.report(**extra), file, indent=2, default=str)
+        os.replace(tmp_path, path)
+        return path
+
+@contextmanager
+def section(stage: str, layer: Optional[str] = None, rows_in: Optional[int] = None):
+    """Mesure un bloc avec le profiler actif ; sans profiler actif, ne mesure rien."""
+    profiler = _active.get()
+    if profiler is None:
+        yield {}
+        return
+    with profiler.record(stage, layer, rows_in) as entry:
+        yield entry
@@ -0,0 +1,430 @@
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import geopandas as gpd
+import pandas as pd
+
+import utils.utils as utils
+import utils.gdf.gdfExtraction as gdfExtraction
+import utils.gdf.extractGeo as extractGeo
+import utils.gdf.joins as joins
+import utils.buffer.calculation as calculate_buffer
+import utils.metrics.metrics as metrics
+import utils.metrics.filtering as filtering
+import utils.metrics.proportion as proportion
+from utils.pipeline.cache import MemoryStageCache, StageCache, copy_output, file_fingerprint, fingerprint
+from utils.pipeline.profiler import Profiler, row_count
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_DIR = "./data/output/"
+NETWORKS_DIR = "./utils/buffer/networks"
+
+METRIC_COLUMNS = {
+    "sum": "sum_columns",
+    "max": "max_columns",
+    "min": "min_columns",
+    "mean": "mean_columns",
+    "std": "std_columns",
+    "ratio": "ratio_columns",
+    "multiply": "multiply_columns",
+    "count": "count_columns",
+    "count_distinct": "count_distinct_columns",
+    "weighted_sum": "weighted_sum_columns",
+    "weighted_mean": "weighted_mean_columns",
+    "quantile": "quantile_columns",
+}
+
+@dataclass(frozen=True)
+class Stage:
+    """
+    Étape du pipeline.
+
+    name : nom de l'étape (et de son répertoire de cache)
+    inputs : étapes dont la sortie est utilisée
+    config_keys : clés de configuration dont dépend la sortie
+    run : fonction (config, inputs) -> sortie ; inputs[nom] résout la sortie d'une étape amont
+    external : empreinte des fichiers lus par l'étape (en plus de la configuration)
+    cached : False pour les étapes à effets de bord (export)
+    rows : nombre de lignes de la sortie, pour le rapport d'exécution
+    """
+    name: str
+    inputs: Tuple[str, ...]
+    config_keys: Tuple[str, ...]
+    run: Callable
+    external: Optional[Callable] = None
+    cached: bool = True
+    rows: Callable = row_count
+
+# Options de couche sans effet sur les sorties (caches disque), exclues de l'empreinte des étapes
+RUNTIME_LAYER_OPTIONS = ("snap_cache", "checkpoint")
+
+def stage_config(config: Dict, key: str):
+    """Valeur de la clé de configuration key prise en compte dans l'empreinte d'une étape."""
+    value = config.get(key)
+    if key == "buffer_layer" and isinstance(value, dict):
+        value = {name: {option: v for option, v in params.items() if option not in RUNTIME_LAYER_OPTIONS}
+                 if isinstance(params, dict) else params for name, params in value.items()}
+    return value
+
+def in_memory_config(config: Dict) -> Dict:
+    """Configuration sans cache d'accrochage ni checkpoints sur disque (l'index d'accrochage reste en mémoire)."""
+    buffer_layer = {name: dict(params, snap_cache=False, checkpoint=False) if isinstance(params, dict) else params
+                    for name, params in (config.get("buffer_layer") or {}).items()}
+    return dict(config, buffer_layer=buffer_layer)
+
+def metrics_config(config: Dict) -> Dict:
+    return {metric: config.get(key) or [] for metric, key in METRIC_COLUMNS.items()}
+
+def _data_files_fingerprint(config: Dict):
+    return [file_fingerprint(data_file.get("path")) for data_file in config.get("data_files") or []]
+
+def _osm_files_fingerprint(config: Dict):
+    return [file_fingerprint(os.path.join(NETWORKS_DIR, params["osm_file"]))
+            for params in (config.get("buffer_layer") or {}).values() if params.get("osm_file")]
+
+def _load(config: Dict, inputs) -> Dict[str, gpd.GeoDataFrame]:
+    return utils.load_files_to_gdf(config.get("data_files"))
+
+def _filter(config: Dict, inputs) -> Dict[str, Any]:
+    geodataframes = filtering.apply_filters_to_layers(inputs["load"], config, filtering.filter_gdf)
+    gdf = gdfExtraction.process_geodataframes(geodataframes, utils)
+    points_gdf, polygons_gdf, multipolygons_gdf, linestrings_gdf = extractGeo.extract_geometries(gdf)
+    return {
+        "geodataframes": geodataframes,
+        "points": points_gdf,
+        "polygons": polygons_gdf,
+        "multipolygons": multipolygons_gdf,
+        "linestrings": linestrings_gdf,
+    }
+
+def _buffer(config: Dict, inputs):
+    layers = inputs["filter"]
+    return calculate_buffer.calculate_buffer(config.get("buffer_layer"), layers["points"], layers["polygons"],
+                                             layers["multipolygons"], layers["linestrings"], save=False)
+
+def _join(config: Dict, inputs) -> gpd.GeoDataFrame:
+    layers = inputs["filter"]
+    buffers_gdf = inputs["buffer"]
+    buffer_layer = config.get("buffer_layer")
+    join_data = joins.get_join_layers(layers["points"], layers["polygons"], layers["multipolygons"],
+                                      layers["linestrings"], config.get("join_layers"))
+    if joins.uses_network_join(buffer_layer):
+        source_gdfs = {"Point": layers["points"], "Polygon": layers["polygons"],
+                       "MultiPolygon": layers["multipolygons"], "LineString": layers["linestrings"]}
+        fusion_gdf = joins.perform_network_joins(buffers_gdf, source_gdfs, join_data, buffer_layer,
+                                                 config.get("join_layers"))
+    else:
+        fusion_gdf = joins.perform_spatial_joins(buffers_gdf, join_data, config.get("join_layers"))
+
+    # Géométrie du buffer dans 'buffer_geometry', géométrie de l'objet joint dans 'geometry'
+    return joins.assemble_joined_geometries(fusion_gdf)
+
+def _proportion(config: Dict, inputs) -> gpd.GeoDataFrame:
+    fusion_gdf = inputs["join"].copy()
+
+    # Calcul vectorisé des proportions (déjà calculées sur le réseau pour les jointures réseau)
+    network_joined = fusion_gdf.get('join_type', pd.Series(index=fusion_gdf.index, dtype=object)).eq('network')
+    fusion_gdf['proportion'] = fusion_gdf.get('proportion', 1.0)
+    fusion_gdf['proportion'] = fusion_gdf['proportion'].where(network_joined, 1.0)
+    mask = fusion_gdf.geometry.geom_type.isin(['LineString', 'MultiLineString', 'Polygon', 'MultiPolygon']) & ~network_joined
+    if mask.any():
+        fusion_gdf.loc[mask, 'proportion'] = proportion.calculate_geometric_proportions(
+            geometry=fusion_gdf.loc[mask, 'geometry'],
+            buffer_geometry=fusion_gdf.loc[mask, 'buffer_geometry']
+        )
+
+    # Nettoyage des colonnes géométriques inutiles
+    geometry_columns = [col for col in fusion_gdf.columns if isinstance(fusion_gdf[col].dtype, gpd.array.GeometryDtype) and col != 'geometry']
+    wkt_columns = [col for col in fusion_gdf.columns if col.endswith('_wkt')]
+    buffer_columns = [col for col in fusion_gdf.columns if col.endswith('_left') and col != 'area_km2']
+    redundant_columns = [col for col in fusion_gdf.columns if col.endswith('_right')]
+    return fusion_gdf.drop(columns=geometry_columns + wkt_columns + buffer_columns + redundant_columns, errors='ignore')
+
+def _metrics(config: Dict, inputs) -> Dict[str, Any]:
+    fusion_gdf = inputs["proportion"]
+
+    if config.get("groupby_columns"):
+        valid_groupby_cols = [col for col in config["groupby_columns"] if col in fusion_gdf.columns]
+        if valid_groupby_cols:
+            initial_count = len(fusion_gdf)
+            fusion_gdf = fusion_gdf.dropna(subset=valid_groupby_cols)
+            logger.info(f"Dropped {initial_count - len(fusion_gdf)} rows with NaN in {valid_groupby_cols}")
+
+    fusion_gdf = fusion_gdf.copy()
+    for col in fusion_gdf.columns:
+        if fusion_gdf[col].dtype == 'object' and col != 'geometry':
+            fusion_gdf[col] = fusion_gdf[col].astype(str)
+
+    # Calcul des statistiques
+    agg_stats_gdf = metrics.calculate_metrics(fusion_gdf, config["groupby_columns"], metrics_config(config))
+    agg_stats_gdf = filtering.apply_global_filters(agg_stats_gdf, config)
+    if config.get("post_aggregation_metrics"):
+        agg_stats_gdf = metrics.calculate_post_aggregation_metrics(agg_stats_gdf, config["post_aggregation_metrics"])
+
+    return {"fusion": fusion_gdf, "agg_stats": agg_stats_gdf}
+
+def agg_filename(buffer_type: str, params: Dict) -> str:
+    filename = f"./data/output/data/agg/{buffer_type}_buffer"
+    if buffer_type == 'circular':
+        filename += f"_{params['distance']}m.csv"
+    elif buffer_type == 'grid':
+        filename += f"_{params['wide']}m_{params['length']}m.csv"
+    elif buffer_type == 'isochrone':
+        filename += f"_{params.get('network_type', 'walk')}m_{params.get('distance', 500)}m.csv"
+    elif buffer_type == 'network':
+        filename += f"_{params.get('network_type', 'walk')}_{params.get('distance', 500)}m.csv"
+    elif buffer_type == 'zones':
+        filename = f"./data/output/data/agg/{buffer_type}.csv"
+    elif buffer_type == 'zones_grid':
+        filename += f"_{params['wide']}m_{params['length']}m.csv"
+    return filename
+
+def _export(config: Dict, inputs) -> Dict[str, Any]:
+    # pydeck et plotly ne sont chargés que pour l'export
+    import utils.visualisation.visualisation as visualisation
+
+    activate_visualisation = config.get("activate_visualisation")
+    buffer_layer = config.get("buffer_layer")
+    fusion_gdf = inputs["metrics"]["fusion"]
+    agg_stats_gdf = inputs["metrics"]["agg_stats"]
+    buffers_gdf = inputs["buffer"]
+
+    for directory in ("data/agg", "data/fusion"):
+        os.makedirs(os.path.join(OUTPUT_DIR, directory), exist_ok=True)
+    fusion_gdf.to_parquet(os.path.join(OUTPUT_DIR, "fusion_gdf.parquet"))
+
+    # Export CSV et visualisation
+    for layer_name, layer_config in buffer_layer.items():
+        calculate_buffer.save_layer_buffers(layer_config, buffers_gdf)
+
+        buffer_type = layer_config.get('buffer_type')
+        params = layer_config.copy(); params.pop('buffer_type', None)
+
+        distance = params.get('distance', None)
+        # Exclure la colonne geometry lors de l'export CSV
+        fusion_gdf_csv = fusion_gdf.drop(columns=['geometry'], errors='ignore')
+        fusion_gdf_csv.to_csv(path_or_buf=f"./data/output/data/fusion/joined_data_{layer_name}_{buffer_type}_{distance}m.csv", index=False)
+
+        agg_stats_gdf.to_csv(agg_filename(buffer_type, params), mode='w', index=False)
+        visualisation.create_table_visualisation(agg_stats_gdf, buffer_type, **params)
+
+        if activate_visualisation:
+            layers = inputs["filter"]
+            visualisation.create_layers_and_map(
+                layers["geodataframes"], layers["points"], layers["polygons"], layers["multipolygons"],
+                layers["linestrings"], buffers_gdf, config.get("colors"), buffer_type,
+                vector_tiles=config.get("map_vector_tiles", False), **params
+            )
+
+    if not activate_visualisation:
+        logger.info("Visualisation désactivée.")
+
+    return {"fusion": fusion_gdf, "agg_stats": agg_stats_gdf}
+
+STAGES = (
+    Stage("load", (), ("data_files",), _load, external=_data_files_fingerprint),
+    Stage("filter", ("load",), ("filter_data_files",), _filter, rows=lambda layers: row_count(layers["geodataframes"])),
+    Stage("buffer", ("filter",), ("buffer_layer",), _buffer, external=_osm_files_fingerprint),
+    Stage("join", ("filter", "buffer"), ("join_layers",), _join),
+    Stage("proportion", ("join",), (), _proportion),
+    Stage("metrics", ("proportion",), ("groupby_columns", *METRIC_COLUMNS.values(), "filter_global",
+                                        "post_aggregation_metrics"), _metrics, rows=lambda out: len(out["agg_stats"])),
+    Stage("export", ("metrics", "buffer", "filter"), ("activate_visualisation", "colors", "map_vector_tiles"), _export,
+          cached=False, rows=lambda out: len(out["agg_stats"])),
+)
+
+class _Inputs:
+    """Accès paresseux aux sorties des étapes amont : une étape n'est chargée ou recalculée qu'à la demande."""
+
+    def __init__(self, run: "PipelineRun", stage: Stage):
+        self._run = run
+        self._stage = stage
+
+    def __getitem__(self, name: str):
+        if name not in self._stage.inputs:
+            raise KeyError(f"'{name}' is not an input of stage '{self._stage.name}'")
+        return self._run.output(name)
+
+class PipelineRun:
+    """
+    Exécution du DAG load → filter → buffer → join → proportion → metrics → export.
+
+    La clé d'une étape est l'empreinte des clés de configuration dont elle dépend,
+    des fichiers qu'elle lit et des clés de ses étapes amont : modifier sum_columns
+    ne change que la clé de metrics (et de export), modifier la distance d'un buffer
+    conserve les étapes load et filter (et les caches d'accrochage au réseau).
+    """
+
+    def __init__(self, config: Dict, cache: Optional[StageCache] = None, stages: Tuple[Stage, ...] = STAGES,
+                 profiler: Optional[Profiler] = None, progress: Optional[Callable[[Dict], None]] = None,
+                 verbose: bool = True):
+        self.config = config
+        self.cache = cache
+        self.stages = {stage.name: stage for stage in stages}
+        self.profiler = profiler or Profiler(trace_memory=False)
+        # Appelée au début et à la fin de chaque étape (suivi de l'avancement d'une tâche)
+        self.progress = progress
+        self.verbose = verbose
+        self.keys: Dict[str, str] = {}
+        self.outputs: Dict[str, Any] = {}
+        self.status: Dict[str, str] = {}
+
+    def key(self, name: str) -> str:
+        if name not in self.keys:
+            stage = self.stages[name]
+            self.keys[name] = fingerprint(
+                name,
+                {key: stage_config(self.config, key) for key in stage.config_keys},
+                stage.external(self.config) if stage.external else None,
+                [self.key(input_name) for input_name in stage.inputs],
+            )
+        return self.keys[name]
+
+    def upstream(self, name: str) -> Tuple[str, ...]:
+        """Étapes nécessaires pour produire name (elle comprise), dans l'ordre du DAG."""
+        needed = {name}
+        for stage in reversed(list(self.stages.values())):
+            if stage.name in needed:
+                needed.update(stage.inputs)
+        return tuple(stage_name for stage_name in self.stages if stage_name in needed)
+
+    def _notify(self, **event) -> None:
+        if self.progress is not None:
+            self.progress(event)
+
+    def output(self, name: str):
+        if name in self.outputs:
+            return self.outputs[name]
+
+        stage = self.stages[name]
+        key = self.key(name)
+        cached = stage.cached and self.cache is not None
+        self._notify(stage=name, event="started")
+        with self.profiler.record(name) as entry:
+            hit, value = self.cache.load(name, key) if cached else (False, None)
+            if not hit:
+                value = stage.run(self.config, _Inputs(self, stage))
+                if cached:
+                    self.cache.save(name, key, value)
+            entry["cache"] = ("hit" if hit else "miss") if cached else None
+            entry["rows_in"] = None if hit or not stage.inputs else sum(self.stages[input_name].rows(self.outputs[input_name]) or 0
+                                                    for input_name in stage.inputs if input_name in self.outputs)
+            entry["rows_out"] = stage.rows(value)
+
+        if self.verbose and hit:
+            print(f"Étape {name} : chargée depuis le cache ({key[:10]}).")
+        elif self.verbose:
+            print(f"Étape {name} : calculée en {entry['wall_s']:.2f} secondes.")
+        self.status[name] = "hit" if hit else "computed"
+        self.outputs[name] = value
+        self._notify(stage=name, event="finished", status=self.status[name], wall_s=round(entry["wall_s"], 4))
+        return value
+
+def run_pipeline(config: Dict, cache: Optional[StageCache] = None, target: str = "export",
+                 progress: Optional[Callable[[Dict], None]] = None):
+    """
+    Exécute le pipeline jusqu'à l'étape target et retourne l'exécution (sorties, clés, statut des étapes).
+
+    Sans cache explicite, le cache disque par défaut est utilisé sauf si 'stage_cache' vaut false.
+    Le rapport d'exécution (temps, mémoire, lignes et cache par étape et par couche) est écrit
+    dans OUTPUT_DIR/run_report.json ; 'profile_memory': true ajoute le pic d'allocation tracemalloc
+    de chaque étape (au prix d'un ralentissement notable).
+
+    progress reçoit un événement {"stage", "event": "started" | "finished", ...} par
+    étape ; le premier événement ({"event": "planned", "stages": [...]}) liste les étapes à exécuter.
+    """
+    if cache is None and config.get("stage_cache", True):
+        cache = StageCache()
+    run = PipelineRun(config, cache, profiler=Profiler(trace_memory=config.get("profile_memory", False)),
+                      progress=progress)
+    run._notify(event="planned", stages=list(run.upstream(target)))
+    with run.profiler.activate():
+        run.output(target)
+    run.profiler.write(OUTPUT_DIR, target=target, stage_keys=run.keys)
+    return run
+
+def layers_fingerprint(layers: Dict[str, gpd.GeoDataFrame]) -> str:
+    """Empreinte du contenu de couches en mémoire (attributs, géométries WKB, CRS), clé de l'étape load."""
+    parts = []
+    for name, gdf in sorted(layers.items()):
+        attributes = pd.DataFrame(gdf.drop(columns=gdf.geometry.name))
+        try:
+            hashed = pd.util.hash_pandas_object(attributes, index=False)
+        except TypeError:
+            # Valeurs non hachables (listes, dictionnaires)
+            hashed = pd.util.hash_pandas_object(attributes.astype(str), index=False)
+        geometries = pd.util.hash_array(gdf.geometry.to_wkb().to_numpy())
+        parts.append([name, str(gdf.crs), list(map(str, gdf.columns)), len(gdf),
+                      fingerprint(hashed.to_numpy().tobytes().hex(), geometries.tobytes().hex())])
+    return fingerprint(parts)
+
+def _memory_load_stage(layers: Dict[str, gpd.GeoDataFrame]) -> Stage:
+    """Étape load servant des couches déjà en mémoire (copiées : les étapes suivantes les modifient)."""
+    key = layers_fingerprint(layers)
+
+    def run(config: Dict, inputs) -> Dict[str, gpd.GeoDataFrame]:
+        geodataframes = {}
+        for name, gdf in layers.items():
+            # Mêmes règles que utils.load_files_to_gdf : géométries invalides ou manquantes supprimées
+            valid = gdf.is_valid
+            if not valid.all():
+                logger.warning(f"{(~valid).sum()} géométrie(s) invalide(s) supprimée(s) de la couche {name}.")
+            geodataframes[name] = copy_output(gdf[valid])
+        return geodataframes
+
+    return Stage("load", (), (), run, external=lambda config: key, cached=False)
+
+@dataclass
+class PipelineResult:
+    """Sorties d'une exécution en mémoire : buffers ({couche}_buffer), table de fusion et table agrégée."""
+    buffers: Dict[str, gpd.GeoDataFrame]
+    fusion: gpd.GeoDataFrame
+    agg: pd.DataFrame
+    run: "PipelineRun" = field(repr=False)
+
+    @property
+    def status(self) -> Dict[str, str]:
+        return self.run.status
+
+class Pipeline:
+    """
+    Pipeline piloté depuis Python (notebooks, tâches planifiées), sans config.yaml ni
+    fichiers intermédiaires.
+
+    layers : couches d'entrée {nom: GeoDataFrame} remplaçant 'data_files' (sinon les
+    fichiers de la configuration sont lus). run(config) retourne un PipelineResult ;
+    les sorties des étapes restent en mémoire (cache.MemoryStageCache, sans disque par
+    défaut) et les exécutions suivantes sur les mêmes couches ne recalculent que les
+    étapes dont la configuration change. Sans export, rien n'est écrit sur disque
+    (ni cache d'accrochage ni checkpoints pour les buffers réseau et isochrones) ;
+    export=True écrit en plus les sorties habituelles (./data/output, comme main.py),
+    les caches de la configuration et le rapport d'exécution.
+
+        pipeline = Pipeline({"stops": stops_gdf, "lines": lines_gdf})
+        result = pipeline.run(config)
+        result.agg, result.fusion, result.buffers
+    """
+
+    def __init__(self, layers: Optional[Dict[str, gpd.GeoDataFrame]] = None, cache=None, verbose: bool = False):
+        self.stages = STAGES if layers is None else (_memory_load_stage(layers),) + STAGES[1:]
+        self.cache = cache if cache is not None else MemoryStageCache()
+        self.verbose = verbose
+
+    def run(self, config: Dict, export: bool = False,
+            progress: Optional[Callable[[Dict], None]] = None) -> PipelineResult:
+        target = "export" if export else "metrics"
+        if not export:
+            config = in_memory_config(config)
+        run = PipelineRun(config, self.cache, self.stages,
+                          profiler=Profiler(trace_memory=config.get("profile_memory", False)),
+                          progress=progress, verbose=self.verbose)
+        run._notify(event="planned", stages=list(run.upstream(target)))
+        with run.profiler.activate():
+            outputs = run.output(target)
+            buffers = run.output("buffer")
+        if export:
+            run.profiler.write(OUTPUT_DIR, target=target, stage_keys=run.keys)
+        return PipelineResult(buffers=buffers, fusion=outputs["fusion"], agg=outputs["agg_stats"], run=run)
@@ -36,11 +36,12 @@ def load_files_to_gdf(data_files: List[Dict[str, str]]) -> Dict[str, gpd.GeoData
 
         parquet_path = file_path.replace("/geojson/", "/parquet/").replace(".geojson", ".parquet")
         parquet_dir = os.path.dirname(parquet_path)
-        if not os.path.exists(parquet_dir):
-            os.makedirs(parquet_dir)
+        os.makedirs(parquet_dir, exist_ok=True)
 
         try:
-            if os.path.exists(parquet_path):
+            # Cache Parquet réutilisé seulement s'il est plus récent que le fichier source
+            if os.path.exists(parquet_path) and (not os.path.exists(file_path)
+                                                 or os.stat(parquet_path).st_mtime_ns >= os.stat(file_path).st_mtime_ns):
                 logger.info(f"Chargement de {parquet_path}...")
                 gdf = gpd.read_parquet(parquet_path)
             else:
@@ -61,8 +62,11 @@ def load_files_to_gdf(data_files: List[Dict[str, str]]) -> Dict[str, gpd.GeoData
 
                 gdf = gpd.GeoDataFrame(properties, geometry=geometries, crs=src.crs)
 
-                # Écrire en Parquet pour les utilisations futures
-                gdf.to_parquet(parquet_path)
+                # Écrire en Parquet pour les utilisations futures, de façon atomique : le cache
+                # est partagé par les tâches exécutées en parallèle (voir utils.pipeline.jobs)
+                tmp_path = f"{parquet_path}.{os.getpid()}.tmp"
+                gdf.to_parquet(tmp_path)
+                os.replace(tmp_path, parquet_path)
 
             # Identifier et filtrer les géométries invalides
             invalid_count = (~gdf.is_valid).sum()
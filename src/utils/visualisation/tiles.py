@@ -0,0 +1,374 @@
+"""
+Tuiles vectorielles Mapbox (MVT) des couches servies par l'application Flask.
+
+Une tuile z/x/y n'est calculée qu'à la demande : les entités de la couche sont
+reprojetées une fois en Web Mercator et indexées (STRtree) ; seules celles qui
+touchent la tuile sont découpées (avec une marge), simplifiées selon le zoom
+(SIMPLIFY_TOLERANCE, en unités de tuile), puis quantifiées sur la grille
+EXTENT x EXTENT. Les entités devenues plus petites qu'une unité de la grille
+disparaissent : une tuile de faible zoom reste légère même pour des centaines de
+milliers de buffers.
+
+Les tuiles encodées sont écrites dans TILE_CACHE_DIR/<couche>/<empreinte>/z/x/y.mvt.
+L'empreinte (chemin, taille et date de modification du fichier, version de
+l'encodage) change lorsque le pipeline réécrit la couche : les tuiles de l'ancienne
+version sont alors supprimées.
+
+L'encodage protobuf (spécification Mapbox Vector Tile 2.1) est fait ici, sans
+dépendance supplémentaire.
+"""
+import json
+import logging
+import math
+import os
+import shutil
+import struct
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+from utils.pipeline.cache import file_fingerprint, fingerprint
+
+logger = logging.getLogger(__name__)
+
+TILE_CACHE_DIR = "./data/cache/tiles"
+MIME_TYPE = "application/vnd.mapbox-vector-tile"
+
+# À incrémenter lorsqu'une modification de l'encodage change le contenu des tuiles
+TILE_VERSION = 1
+EXTENT = 4096
+# Marge autour de la tuile (unités de tuile) : évite les bords visibles des polygones découpés
+BUFFER = 64
+# Tolérance de simplification (unités de tuile) : un quart de pixel pour une tuile affichée en 256 px
+SIMPLIFY_TOLERANCE = 4
+MAX_ZOOM = 24
+
+# Demi-circonférence de la Terre en Web Mercator (EPSG:3857)
+ORIGIN_SHIFT = 20037508.342789244
+
+def tile_bounds(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """Emprise (minx, miny, maxx, maxy) de la tuile z/x/y en EPSG:3857 ; lève ValueError hors de la grille."""
+    if not 0 <= z <= MAX_ZOOM or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise ValueError(f"Tuile {z}/{x}/{y} hors de la grille")
+    span = 2 * ORIGIN_SHIFT / 2 ** z
+    minx = -ORIGIN_SHIFT + x * span
+    maxy = ORIGIN_SHIFT - y * span
+    return minx, maxy - span, minx + span, maxy
+
+def read_layer(path: str) -> gpd.GeoDataFrame:
+    """Couche GeoJSON ou GeoParquet (table de fusion)."""
+    if path.endswith(".parquet"):
+        return gpd.read_parquet(path)
+    return gpd.read_file(path)
+
+class _LayerIndex:
+    """Géométries d'une couche en EPSG:3857, index spatial et attributs encodables."""
+
+    def __init__(self, gdf: gpd.GeoDataFrame):
+        gdf = gdf[gdf.geometry.notna() & ~gdf.geometry.is_empty]
+        if gdf.crs is None:
+            gdf = gdf.set_crs("EPSG:4326")
+        self.geometries = np.asarray(gdf.geometry.to_crs("EPSG:3857").values, dtype=object)
+        self.tree = shapely.STRtree(self.geometries)
+        # Étendue de chaque entité, pour écarter sans les découper celles qui tiennent dans une unité de tuile
+        bounds = shapely.bounds(self.geometries)
+        self.sizes = np.maximum(bounds[:, 2] - bounds[:, 0], bounds[:, 3] - bounds[:, 1])
+        self.is_point = np.isin(shapely.get_type_id(self.geometries), (0, 4))
+        self.properties = _encodable_columns(gdf.drop(columns=gdf.geometry.name).reset_index(drop=True))
+
+def _encodable_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Colonnes attributaires scalaires (nombres, booléens, texte) ; géométries et listes écartées."""
+    keep = []
+    for column in df.columns:
+        if isinstance(df[column].dtype, gpd.array.GeometryDtype):
+            continue
+        sample = df[column].dropna()
+        if len(sample) and not isinstance(sample.iloc[0], (str, bool, int, float, np.generic)):
+            continue
+        keep.append(column)
+    return df[keep]
+
+class VectorTileCache:
+    """
+    Tuiles MVT des couches, calculées à la demande et conservées sur disque (root).
+    Les index spatiaux des max_layers dernières couches sont gardés en mémoire ;
+    datasets (DatasetCache) partage le chargement des couches avec les autres routes.
+    """
+
+    def __init__(self, root: str = TILE_CACHE_DIR, max_layers: int = 4, datasets=None):
+        self.root = root
+        self.max_layers = max_layers
+        self.datasets = datasets
+        self.hits = 0
+        self.misses = 0
+        self._indexes: "OrderedDict[str, _LayerIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._index_locks: Dict[str, threading.Lock] = {}
+
+    def layer_key(self, path: str) -> str:
+        """Empreinte de la version courante de la couche ; lève FileNotFoundError si elle n'existe pas."""
+        file = file_fingerprint(path)
+        if file.get("missing"):
+            raise FileNotFoundError(f"Couche {path} introuvable")
+        return fingerprint("tiles", TILE_VERSION, EXTENT, BUFFER, SIMPLIFY_TOLERANCE, file)[:16]
+
+    def tile(self, layer: str, path: str, z: int, x: int, y: int) -> bytes:
+        """Tuile MVT z/x/y de la couche (fichier path), sous le nom de couche layer ; b"" si elle est vide."""
+        bounds = tile_bounds(z, x, y)
+        key = self.layer_key(path)
+        tile_path = os.path.join(self.root, layer, key, str(z), str(x), f"{y}.mvt")
+        if os.path.exists(tile_path):
+            with self._lock:
+                self.hits += 1
+            with open(tile_path, "rb") as file:
+                return file.read()
+
+        with self._lock:
+            self.misses += 1
+        data = encode_tile(layer, self._index(layer, path, key), bounds)
+        os.makedirs(os.path.dirname(tile_path), exist_ok=True)
+        tmp_path = f"{tile_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(data)
+        os.replace(tmp_path, tile_path)
+        return data
+
+    def _index(self, layer: str, path: str, key: str) -> _LayerIndex:
+        with self._lock:
+            if key in self._indexes:
+                self._indexes.move_to_end(key)
+                return self._indexes[key]
+            index_lock = self._index_locks.setdefault(key, threading.Lock())
+
+        # Un seul chargement par version de couche ; les autres requêtes attendent l'index
+        with index_lock:
+            with self._lock:
+                if key in self._indexes:
+                    return self._indexes[key]
+            gdf = self.datasets.get(path, read_layer, kind="layer") if self.datasets is not None else read_layer(path)
+            index = _LayerIndex(gdf)
+            logger.info(f"Index des tuiles de {layer} : {len(index.geometries)} entités")
+            self._drop_stale_tiles(layer, key)
+            with self._lock:
+                self._indexes[key] = index
+                self._index_locks.pop(key, None)
+                while len(self._indexes) > self.max_layers:
+                    self._indexes.popitem(last=False)
+        return index
+
+    def _drop_stale_tiles(self, layer: str, key: str) -> None:
+        """Supprime les tuiles des versions précédentes de la couche."""
+        layer_dir = os.path.join(self.root, layer)
+        if not os.path.isdir(layer_dir):
+            return
+        for name in os.listdir(layer_dir):
+            if name != key:
+                shutil.rmtree(os.path.join(layer_dir, name), ignore_errors=True)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {"layers": len(self._indexes), "hits": self.hits, "misses": self.misses,
+                    "hit_rate": round(self.hits / total, 4) if total else None}
+
+def encode_tile(layer: str, index: _LayerIndex, bounds: Tuple[float, float, float, float]) -> bytes:
+    """Tuile MVT (une couche nommée layer) des entités de index dans bounds (EPSG:3857)."""
+    minx, miny, maxx, maxy = bounds
+    unit = (maxx - minx) / EXTENT
+    margin = BUFFER * unit
+    candidates = index.tree.query(shapely.box(minx - margin, miny - margin, maxx + margin, maxy + margin))
+    # Lignes et polygones plus petits qu'une unité de tuile : effacés par la quantification
+    candidates = np.sort(candidates[index.is_point[candidates] | (index.sizes[candidates] >= unit)])
+    if not len(candidates):
+        return b""
+
+    geometries = shapely.clip_by_rect(index.geometries[candidates], minx - margin, miny - margin,
+                                      maxx + margin, maxy + margin)
+    # Coordonnées de tuile : origine en haut à gauche, y vers le bas
+    geometries = shapely.transform(geometries, lambda xy: np.column_stack(((xy[:, 0] - minx) / unit,
+                                                                           (maxy - xy[:, 1]) / unit)))
+    geometries = shapely.simplify(geometries, SIMPLIFY_TOLERANCE, preserve_topology=False)
+    geometries = shapely.set_precision(geometries, 1.0)
+
+    encoder = _LayerEncoder(layer)
+    properties = index.properties
+    columns = list(properties.columns)
+    values = properties.iloc[candidates].to_numpy(dtype=object) if columns else None
+    for i, (row, geometry) in enumerate(zip(candidates, geometries)):
+        encoded = _encode_geometry(geometry)
+        if encoded is None:
+            continue
+        tags = values[i] if values is not None else ()
+        encoder.add_feature(int(row) + 1, encoded[0], encoded[1], zip(columns, tags))
+    return encoder.tile()
+
+# --- Géométries -------------------------------------------------------------
+
+MOVE_TO, LINE_TO, CLOSE_PATH = 1, 2, 7
+POINT, LINESTRING, POLYGON = 1, 2, 3
+
+def _zigzag(values: np.ndarray) -> np.ndarray:
+    return (values << 1) ^ (values >> 63)
+
+def _command(command: int, count: int) -> int:
+    return (command & 0x7) | (count << 3)
+
+class _Cursor:
+    """Position courante du crayon : les coordonnées MVT sont relatives au point précédent."""
+
+    def __init__(self):
+        self.position = np.zeros(2, dtype=np.int64)
+
+    def deltas(self, coords: np.ndarray) -> List[int]:
+        coords = coords.astype(np.int64)
+        deltas = np.diff(np.vstack([self.position, coords]), axis=0)
+        self.position = coords[-1]
+        return _zigzag(deltas).ravel().tolist()
+
+def _encode_geometry(geometry) -> Optional[Tuple[int, List[int]]]:
+    """(type MVT, commandes) d'une géométrie en coordonnées de tuile entières ; None si elle est vide."""
+    if geometry is None or geometry.is_empty:
+        return None
+    parts = shapely.get_parts(geometry)
+    dimension = max(shapely.get_dimensions(parts))
+    # Collection issue du découpage : seules les parties de plus grande dimension sont gardées
+    parts = [part for part in parts if shapely.get_dimensions(part) == dimension and not part.is_empty]
+    cursor = _Cursor()
+    commands: List[int] = []
+
+    if dimension == 0:
+        coords = np.vstack([shapely.get_coordinates(part) for part in parts])
+        commands.append(_command(MOVE_TO, len(coords)))
+        commands.extend(cursor.deltas(coords))
+        return POINT, commands
+
+    if dimension == 1:
+        for part in parts:
+            coords = _dedupe(shapely.get_coordinates(part))
+            if len(coords) < 2:
+                continue
+            _append_path(commands, cursor, coords)
+        return (LINESTRING, commands) if commands else None
+
+    for part in parts:
+        for i, ring in enumerate([part.exterior, *part.interiors]):
+            # Anneau fermé : le dernier point (identique au premier) est remplacé par ClosePath
+            coords = _dedupe(shapely.get_coordinates(ring)[:-1])
+            if len(coords) < 3:
+                if i == 0:
+                    break
+                continue
+            # Extérieur d'aire positive (sens horaire à l'écran, y vers le bas), trous d'aire négative
+            if (_signed_area(coords) > 0) != (i == 0):
+                coords = coords[::-1]
+            _append_path(commands, cursor, coords)
+            commands.append(_command(CLOSE_PATH, 1))
+    return (POLYGON, commands) if commands else None
+
+def _append_path(commands: List[int], cursor: _Cursor, coords: np.ndarray) -> None:
+    commands.append(_command(MOVE_TO, 1))
+    commands.extend(cursor.deltas(coords[:1]))
+    commands.append(_command(LINE_TO, len(coords) - 1))
+    commands.extend(cursor.deltas(coords[1:]))
+
+def _dedupe(coords: np.ndarray) -> np.ndarray:
+    """Supprime les points consécutifs identiques (déplacements nuls)."""
+    if len(coords) < 2:
+        return coords
+    keep = np.ones(len(coords), dtype=bool)
+    keep[1:] = np.any(coords[1:] != coords[:-1], axis=1)
+    return coords[keep]
+
+def _signed_area(coords: np.ndarray) -> float:
+    x, y = coords[:, 0], coords[:, 1]
+    return float(np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y)) / 2
+
+# --- Protobuf ---------------------------------------------------------------
+
+def _varint(value: int) -> bytes:
+    if value < 0x80:
+        return _SMALL_VARINTS[value]
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+# La plupart des entiers d'une tuile (commandes, déplacements, indices de tags) tiennent sur un octet
+_SMALL_VARINTS = [bytes((value,)) for value in range(0x80)]
+
+def _field(number: int, wire_type: int) -> bytes:
+    return _varint((number << 3) | wire_type)
+
+def _bytes_field(number: int, payload: bytes) -> bytes:
+    return _field(number, 2) + _varint(len(payload)) + payload
+
+def _packed(number: int, values) -> bytes:
+    return _bytes_field(number, b"".join(_varint(value) for value in values))
+
+class _LayerEncoder:
+    """Couche MVT : entités, dictionnaires de clés et de valeurs partagés par les entités."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.features: List[bytes] = []
+        self.keys: Dict[str, int] = {}
+        self.values: Dict[Tuple[type, object], int] = {}
+
+    def add_feature(self, feature_id: int, geometry_type: int, geometry: List[int], properties) -> None:
+        tags = []
+        for key, value in properties:
+            encoded = _value_key(value)
+            if encoded is None:
+                continue
+            tags.append(self.keys.setdefault(str(key), len(self.keys)))
+            tags.append(self.values.setdefault(encoded, len(self.values)))
+        feature = _field(1, 0) + _varint(feature_id)
+        if tags:
+            feature += _packed(2, tags)
+        feature += _field(3, 0) + _varint(geometry_type) + _packed(4, geometry)
+        self.features.append(_bytes_field(2, feature))
+
+    def tile(self) -> bytes:
+        if not self.features:
+            return b""
+        layer = _field(15, 0) + _varint(2) + _bytes_field(1, self.name.encode())
+        layer += b"".join(self.features)
+        layer += b"".join(_bytes_field(3, key.encode()) for key in self.keys)
+        layer += b"".join(_bytes_field(4, _encode_value(value)) for value in self.values)
+        layer += _field(5, 0) + _varint(EXTENT)
+        return _bytes_field(3, layer)
+
+def _value_key(value) -> Optional[Tuple[type, object]]:
+    """Valeur d'attribut normalisée (type, valeur) ; None pour les valeurs manquantes."""
+    if value is None or (isinstance(value, float) and math.isnan(value)) or value is pd.NA or value is pd.NaT:
+        return None
+    if isinstance(value, (bool, np.bool_)):
+        return bool, bool(value)
+    if isinstance(value, (int, np.integer)):
+        return int, int(value)
+    if isinstance(value, (float, np.floating)):
+        if math.isnan(value):
+            return None
+        return float, float(value)
+    if isinstance(value, str):
+        return str, value
+    return str, json.dumps(value, default=str)
+
+def _encode_value(value: Tuple[type, object]) -> bytes:
+    kind, value = value
+    if kind is str:
+        return _bytes_field(1, value.encode())
+    if kind is float:
+        return _field(3, 1) + struct.pack("<d", value)
+    if kind is bool:
+        return _field(7, 0) + _varint(int(value))
+    if value >= 0:
+        return _field(5, 0) + _varint(value)
+    return _field(6, 0) + _varint((value << 1) ^ (value >> 63))
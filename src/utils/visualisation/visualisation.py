@@ -3,6 +3,7 @@ import geopandas as gpd
 from typing import List, Dict
 import utils.gdf.gdfExtraction as gdfExtraction
 import plotly.graph_objects as go
+import json
 import os
 
 def create_initial_view() -> pdk.ViewState:
@@ -190,8 +191,12 @@ def create_layers_and_map(
     # Utiliser la nouvelle fonction simple au lieu de pydeck
     create_simple_leaflet_map(filename, buffer_type, **kwargs)
 
-def create_simple_leaflet_map(filename: str, buffer_type: str, **kwargs):
-    """Crée une carte Leaflet simple avec les GeoJSON générés"""
+def create_simple_leaflet_map(filename: str, buffer_type: str, vector_tiles: bool = False, **kwargs):
+    """
+    Crée une carte Leaflet simple avec les GeoJSON générés. vector_tiles=True affiche
+    les couches par tuiles vectorielles (route /tiles/<couche>/<z>/<x>/<y>.mvt du backend)
+    plutôt qu'en chargeant chaque GeoJSON en entier.
+    """
     
     # Déterminer les fichiers GeoJSON à charger
     input_geojson_files = [
@@ -212,6 +217,12 @@ def create_simple_leaflet_map(filename: str, buffer_type: str, **kwargs):
         buffer_file = f'./data/output/data/buffers/points_geojson_buffer_network_{distance}m.geojson'
         buffer_files.append(('buffer', buffer_file, '#ffa500'))
     
+    # Nom de couche servi par /tiles : nom du fichier sans extension
+    input_geojson_files = [[name, url, color, os.path.splitext(os.path.basename(url))[0]]
+                           for name, url, color in input_geojson_files]
+    buffer_files = [[name, url, color, os.path.splitext(os.path.basename(url))[0]]
+                    for name, url, color in buffer_files]
+
     # Créer le HTML
     html_content = f"""
 <!DOCTYPE html>
@@ -221,6 +232,7 @@ def create_simple_leaflet_map(filename: str, buffer_type: str, **kwargs):
     <title>Carte de visualisation - {buffer_type}</title>
     <link rel="stylesheet" href="https://unpkg.com/leaflet@1.9.4/dist/leaflet.css" />
     <script src="https://unpkg.com/leaflet@1.9.4/dist/leaflet.js"></script>
+    <script src="https://unpkg.com/leaflet.vectorgrid@1.3.0/dist/Leaflet.VectorGrid.bundled.js"></script>
     <style>
         body {{ margin: 0; padding: 0; }}
         #map {{ height: 100vh; width: 100vw; }}
@@ -278,6 +290,23 @@ def create_simple_leaflet_map(filename: str, buffer_type: str, **kwargs):
             attribution: '© OpenStreetMap contributors'
         }}).addTo(map);
         
+        // Attributs d'une entité pour la popup
+        function formatProperties(properties) {{
+            return Object.entries(properties)
+                .map(([key, value]) => {{
+                    let displayValue = value;
+                    if (value === null || value === undefined) {{
+                        displayValue = 'N/A';
+                    }} else if (typeof value === 'number' && isNaN(value)) {{
+                        displayValue = 'N/A';
+                    }} else if (typeof value === 'string' && value.toLowerCase() === 'nan') {{
+                        displayValue = 'N/A';
+                    }}
+                    return `<b>${{key}}:</b> ${{displayValue}}`;
+                }})
+                .join('<br>');
+        }}
+
         // Fonction pour charger et afficher un GeoJSON
         function loadGeoJSON(url, color, name) {{
             fetch(url)
@@ -295,20 +324,7 @@ def create_simple_leaflet_map(filename: str, buffer_type: str, **kwargs):
                         }},
                         onEachFeature: function(feature, layer) {{
                             if (feature.properties) {{
-                                const props = Object.entries(feature.properties)
-                                    .map(([key, value]) => {{
-                                        let displayValue = value;
-                                        if (value === null || value === undefined) {{
-                                            displayValue = 'N/A';
-                                        }} else if (typeof value === 'number' && isNaN(value)) {{
-                                            displayValue = 'N/A';
-                                        }} else if (typeof value === 'string' && value.toLowerCase() === 'nan') {{
-                                            displayValue = 'N/A';
-                                        }}
-                                        return `<b>${{key}}:</b> ${{displayValue}}`;
-                                    }})
-                                    .join('<br>');
-                                layer.bindPopup(`<b>${{name}}</b><br>${{props}}`);
+                                layer.bindPopup(`<b>${{name}}</b><br>${{formatProperties(feature.properties)}}`);
                             }}
                         }}
                     }}).addTo(map);
@@ -318,19 +334,44 @@ def create_simple_leaflet_map(filename: str, buffer_type: str, **kwargs):
                     console.error(`Erreur lors du chargement de ${{name}}:`, error);
                 }});
         }}
-        
+
+        // Fonction pour afficher une couche par tuiles vectorielles (seules les tuiles visibles sont chargées)
+        function loadVectorTiles(layer, color, name) {{
+            L.vectorGrid.protobuf(`/tiles/${{layer}}/{{z}}/{{x}}/{{y}}.mvt`, {{
+                rendererFactory: L.canvas.tile,
+                vectorTileLayerStyles: {{
+                    [layer]: {{
+                        color: color,
+                        weight: 2,
+                        opacity: 0.8,
+                        fill: true,
+                        fillColor: color,
+                        fillOpacity: 0.3,
+                        radius: 4
+                    }}
+                }},
+                interactive: true,
+                getFeatureId: feature => feature.id
+            }}).on('click', event => {{
+                L.popup()
+                    .setLatLng(event.latlng)
+                    .setContent(`<b>${{name}}</b><br>${{formatProperties(event.layer.properties || {{}})}}`)
+                    .openOn(map);
+            }}).addTo(map);
+        }}
+
         // Charger les données
-        const inputFiles = {input_geojson_files};
-        const bufferFiles = {buffer_files};
-        
-        // Charger les fichiers d'entrée
-        inputFiles.forEach(([name, url, color]) => {{
-            loadGeoJSON(url, color, name);
-        }});
-        
-        // Charger les fichiers buffer
-        bufferFiles.forEach(([name, url, color]) => {{
-            loadGeoJSON(url, color, name);
+        const useVectorTiles = {json.dumps(vector_tiles)};
+        const inputFiles = {json.dumps(input_geojson_files)};
+        const bufferFiles = {json.dumps(buffer_files)};
+
+        // Charger les fichiers d'entrée puis les fichiers buffer
+        inputFiles.concat(bufferFiles).forEach(([name, url, color, layer]) => {{
+            if (useVectorTiles) {{
+                loadVectorTiles(layer, color, name);
+            }} else {{
+                loadGeoJSON(url, color, name);
+            }}
         }});
     </script>
 </body>
@@ -0,0 +1,34 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# Les modules de src/ s'importent entre eux via "utils.*" (exécution depuis src/)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+
+def write_grid_osm(path, size=15, spacing=100.0, lat0=45.50, lon0=-73.57):
+    """Écrit un réseau en grille régulière (size x size intersections) au format OSM XML."""
+    dlat = spacing / 111320.0
+    dlon = spacing / (111320.0 * np.cos(np.radians(lat0)))
+    node_id = lambda i, j: i * size + j + 1
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>', '<osm version="0.6">']
+    for i in range(size):
+        for j in range(size):
+            lines.append(f'<node id="{node_id(i, j)}" lat="{lat0 + i * dlat:.7f}" lon="{lon0 + j * dlon:.7f}" version="1"/>')
+    way_id = 1
+    for k in range(size):
+        for refs in ([node_id(k, j) for j in range(size)], [node_id(i, k) for i in range(size)]):
+            nds = "".join(f'<nd ref="{ref}"/>' for ref in refs)
+            lines.append(f'<way id="{way_id}" version="1">{nds}<tag k="highway" v="residential"/></way>')
+            way_id += 1
+    lines.append('</osm>')
+    path.write_text("\n".join(lines))
+    return str(path)
+
+
+
+@pytest.fixture
+def grid_osm_file(tmp_path):
+    return write_grid_osm(tmp_path / "grid.osm")
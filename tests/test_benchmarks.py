@@ -0,0 +1,54 @@
+import os
+import sys
+
+import osmnx as ox
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+import run as benchmarks  # noqa: E402
+import synthetic  # noqa: E402
+
+
+def test_synthetic_layers_are_seeded_and_on_the_street_grid(tmp_path):
+    scale = synthetic.SCALES["tiny"]
+    first, second = synthetic.generate_layers(scale, seed=7), synthetic.generate_layers(scale, seed=7)
+    for name in first:
+        assert first[name].equals(second[name])
+    assert not first["points_geojson"].equals(synthetic.generate_layers(scale, seed=8)["points_geojson"])
+
+    synthetic.write_dataset(str(tmp_path), scale)
+    G = ox.graph_from_xml(str(tmp_path / "utils" / "buffer" / "networks" / "synthetic_grid.osm"), simplify=False)
+    assert G.number_of_nodes() == scale.grid_size ** 2
+    west, south, east, north = first["lines_geojson"].total_bounds
+    nodes = ox.graph_to_gdfs(G, edges=False)
+    tolerance = 1e-6  # coordonnées OSM arrondies à 7 décimales
+    assert nodes.x.min() - tolerance <= west and east <= nodes.x.max() + tolerance
+    assert nodes.y.min() - tolerance <= south and north <= nodes.y.max() + tolerance
+
+
+def test_compare_reports_only_significant_slowdowns():
+    baseline = {"scenarios": {"circular/counts": {"wall_s": 1.0, "stages": {"join": 0.5, "metrics": 0.01}}}}
+    results = {"scenarios": {"circular/counts": {"wall_s": 1.1, "stages": {"join": 0.9, "metrics": 0.05}},
+                             "grid/counts": {"wall_s": 9.0, "stages": {}}}}
+
+    regressions = benchmarks.compare(results, baseline, tolerance=0.25, min_delta=0.1)
+
+    assert len(regressions) == 1 and regressions[0].startswith("circular/counts [join]")
+
+
+def test_import_budget_flags_slow_or_heavy_entry_points():
+    output = "\n".join([
+        "import time: self [us] | cumulative | imported package",
+        "import time:       120 |        120 |     _io",
+        "import time:      3000 |     400000 |   geopandas",
+        "import time:       900 |       5000 |     osmnx",
+        "import time:       800 |     650000 | main",
+    ])
+    modules = benchmarks.parse_importtime(output)
+    assert modules == {"_io": 0.00012, "geopandas": 0.4, "osmnx": 0.005, "main": 0.65}
+
+    imports = {"main": {"import_s": 0.65, "excluded_loaded": ["osmnx"]},
+               "app": {"import_s": benchmarks.IMPORT_BUDGETS["app"]["budget_s"] + 0.5, "excluded_loaded": []}}
+    violations = benchmarks.check_imports(imports)
+    assert violations == ["import main : charge osmnx",
+                          f"import app : {imports['app']['import_s']:.3f} s > budget {benchmarks.IMPORT_BUDGETS['app']['budget_s']:.3f} s"]
@@ -0,0 +1,47 @@
+import os
+import time
+
+import geopandas as gpd
+import numpy as np
+import yaml
+
+import utils.metrics.metrics as metrics
+from utils.metrics.chart_cache import ChartAggregateCache
+
+HISTOGRAM_CONFIG = {"columns": ["population", "lanes"], "groupby": "buffer_id",
+                    "aggregation": {"type": "sum", "column": "population"},
+                    "customBins": [0, 500, 1000, "Infinity"], "customLabels": ["0-499", "500-999", "1000+"]}
+
+
+def _write_fusion(path, seed):
+    rng = np.random.default_rng(seed)
+    n = 500
+    gdf = gpd.GeoDataFrame({"buffer_id": rng.integers(0, 20, n), "population": rng.integers(0, 100, n).astype(str),
+                            "lanes": rng.integers(1, 4, n)},
+                           geometry=gpd.points_from_xy(rng.random(n), rng.random(n)), crs="EPSG:32618")
+    gdf.to_parquet(path)
+    return gdf
+
+
+def test_group_tables_are_materialized_once_and_invalidated_by_a_new_fusion(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("data/output/data")
+    with open("config.yaml", "w") as file:
+        yaml.dump({"buffer_layer": {"stops": {"distance": 200}}}, file)
+    path = str(tmp_path / "fusion_gdf.parquet")
+    fusion = _write_fusion(path, seed=1)
+    cache = ChartAggregateCache(path)
+
+    expected = metrics.calculate_histogram_data(fusion.copy(), HISTOGRAM_CONFIG)
+    assert cache.histogram_data(HISTOGRAM_CONFIG) == expected
+    # Nouvelles classes et bar chart sur la même agrégation : servis depuis la table matérialisée
+    rebinned = dict(HISTOGRAM_CONFIG, customBins=[0, 200, "Infinity"], customLabels=["0-199", "200+"])
+    assert cache.histogram_data(rebinned) == metrics.calculate_histogram_data(fusion.copy(), rebinned)
+    barchart_config = {key: HISTOGRAM_CONFIG[key] for key in ("columns", "groupby", "aggregation")}
+    assert cache.barchart_data(barchart_config) == metrics.calculate_barchart_data(fusion.copy(), barchart_config)
+    assert cache.stats() == {"tables": 1, "hits": 2, "misses": 1, "hit_rate": 0.6667}
+
+    time.sleep(0.01)
+    fusion = _write_fusion(path, seed=2)
+    assert cache.histogram_data(HISTOGRAM_CONFIG) == metrics.calculate_histogram_data(fusion.copy(), HISTOGRAM_CONFIG)
+    assert cache.stats()["misses"] == 2 and cache.stats()["tables"] == 1
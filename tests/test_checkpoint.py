@@ -0,0 +1,101 @@
+import os
+
+import geopandas as gpd
+import numpy as np
+import pytest
+
+import utils.buffer.checkpoint as checkpoint
+import utils.buffer.network as network
+
+
+@pytest.fixture
+def routing_setup(grid_osm_file, monkeypatch):
+    # Calculs dans le processus courant pour compter les origines routées
+    monkeypatch.setattr(network, "cpu_count", lambda: 1)
+    routed = []
+    create_network_buffer = network.create_network_buffer
+    monkeypatch.setattr(network, "create_network_buffer", lambda args: routed.append(args[0]) or create_network_buffer(args))
+
+    G = network.load_network_graph(grid_osm_file)
+    xs = np.array([data["x"] for _, data in G.nodes(data=True)])
+    ys = np.array([data["y"] for _, data in G.nodes(data=True)])
+    origins = gpd.GeoSeries(gpd.points_from_xy(xs[::9] + 3, ys[::9] + 3), crs=G.graph["crs"])
+    return G, origins, routed
+
+
+def _buffers(G, origins, **kwargs):
+    return network.compute_network_buffers(G, origins, 200, chunk_size=5, polygonization="concave", **kwargs)
+
+
+def test_restarted_run_only_computes_missing_chunks(routing_setup, tmp_path, monkeypatch):
+    G, origins, routed = routing_setup
+    expected = _buffers(G, origins)
+    routed.clear()
+
+    # Arrêt au milieu : les trois premiers blocs sont enregistrés
+    create_network_buffer = network.create_network_buffer
+
+    def interrupted(args):
+        if len(routed) == 15:
+            raise KeyboardInterrupt
+        return create_network_buffer(args)
+
+    monkeypatch.setattr(network, "create_network_buffer", interrupted)
+    store_root = tmp_path / "checkpoints"
+    with pytest.raises(KeyboardInterrupt):
+        _buffers(G, origins, checkpoint_dir=str(store_root))
+    (store_path,) = [path for path in store_root.iterdir()]
+    assert len(list(store_path.glob("chunk_*.parquet"))) == 3
+
+    monkeypatch.setattr(network, "create_network_buffer", create_network_buffer)
+    routed.clear()
+    resumed = _buffers(G, origins, checkpoint_dir=str(store_root))
+
+    assert len(routed) == len(origins) - 15
+    assert all(a.equals(b) for a, b in zip(expected, resumed))
+    # Tous les blocs assemblés : le store est supprimé
+    assert list(store_root.iterdir()) == []
+
+
+def test_only_the_most_recent_stores_are_kept(tmp_path):
+    root = tmp_path / "checkpoints"
+    for i in range(4):
+        store = checkpoint.ChunkStore(str(root), f"run_{i}", "EPSG:32618")
+        os.utime(store.path, (i, i))
+    checkpoint.prune_stores(str(root), max_stores=2)
+    assert sorted(path.name for path in root.iterdir()) == ["run_2", "run_3"]
+
+    # Le store en cours d'utilisation est toujours conservé
+    checkpoint.prune_stores(str(root), max_stores=1, keep=str(root / "run_2"))
+    assert [path.name for path in root.iterdir()] == ["run_2"]
+
+    assert checkpoint.checkpoint_dir({}) is None
+    assert checkpoint.checkpoint_dir({"shard": [0, 2]}) == checkpoint.checkpoint_dir({"checkpoint": True})
+
+
+def test_sharded_runs_merge_into_a_complete_store(routing_setup, tmp_path):
+    G, origins, routed = routing_setup
+    expected = _buffers(G, origins)
+
+    # Chaque shard enregistre ses chunks puis s'arrête sans renvoyer de buffers incomplets
+    with pytest.raises(checkpoint.ShardComplete, match="Shard 0/2 done: 3/5 chunks"):
+        _buffers(G, origins, checkpoint_dir=str(tmp_path / "machine_0"), shard=(0, 2))
+    with pytest.raises(checkpoint.ShardComplete, match="Shard 1/2 done: 2/5 chunks"):
+        _buffers(G, origins, checkpoint_dir=str(tmp_path / "machine_1"), shard=(1, 2))
+
+    key = next((tmp_path / "machine_0").iterdir()).name
+    copied = checkpoint.merge_stores([tmp_path / "machine_0" / key, tmp_path / "machine_1" / key],
+                                     str(tmp_path / "merged" / key))
+    assert copied == 5
+
+    # Un shard dont le store contient déjà tous les chunks assemble les buffers, sans supprimer le store
+    assert all(a.equals(b) for a, b in zip(expected, _buffers(G, origins, checkpoint_dir=str(tmp_path / "merged"),
+                                                                shard=(0, 2))))
+    with pytest.raises(ValueError):
+        _buffers(G, origins, shard=(0, 2))
+
+    routed.clear()
+    merged = _buffers(G, origins, checkpoint_dir=str(tmp_path / "merged"))
+    assert routed == []
+    assert all(a.equals(b) for a, b in zip(expected, merged))
+    assert list((tmp_path / "merged").iterdir()) == []
@@ -0,0 +1,59 @@
+import threading
+import time
+
+import geopandas as gpd
+import pandas as pd
+from shapely.geometry import Point
+
+from utils.gdf.dataset_cache import DatasetCache, estimate_size
+
+
+def _write(path, n):
+    gpd.GeoDataFrame({"name": [f"stop {i}" for i in range(n)]}, geometry=[Point(i, i) for i in range(n)],
+                     crs="EPSG:4326").to_file(path, driver="GeoJSON")
+    return str(path)
+
+
+def test_entries_are_reloaded_when_the_file_changes_and_evicted_by_budget(tmp_path):
+    paths = [_write(tmp_path / f"layer_{i}.geojson", 200) for i in range(3)]
+    size = estimate_size(gpd.read_file(paths[0]))
+    cache = DatasetCache(memory_budget_mb=2.5 * size / 1024 / 1024)
+
+    first = cache.get(paths[0], gpd.read_file, kind="layer")
+    assert cache.get(paths[0], gpd.read_file, kind="layer") is first
+    cache.get(paths[1], gpd.read_file, kind="layer")
+    cache.get(paths[0], gpd.read_file, kind="layer")
+    # Le budget ne tient que deux couches : la moins récemment utilisée (layer_1) est évincée
+    cache.get(paths[2], gpd.read_file, kind="layer")
+    assert cache.stats()["evictions"] == 1
+    assert cache.get(paths[0], gpd.read_file, kind="layer") is first
+
+    time.sleep(0.01)
+    _write(tmp_path / "layer_0.geojson", 10)
+    assert len(cache.get(paths[0], gpd.read_file, kind="layer")) == 10
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["stale"]) == (3, 3, 1)
+    assert stats["entries"] == 2 and stats["hit_rate"] == round(3 / 7, 4)
+
+
+def test_concurrent_requests_load_a_file_once(tmp_path):
+    path = _write(tmp_path / "layer.geojson", 50)
+    cache = DatasetCache()
+    loads = []
+
+    def slow_loader(file_path):
+        loads.append(file_path)
+        time.sleep(0.1)
+        return pd.DataFrame(gpd.read_file(file_path).drop(columns="geometry"))
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get(path, slow_loader))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(loads) == 1
+    assert all(result is results[0] for result in results)
+    assert cache.stats()["entries"] == 1
@@ -0,0 +1,69 @@
+import gzip
+import json
+import time
+
+import geopandas as gpd
+import numpy as np
+import pytest
+
+from utils.gdf.dataset_cache import DatasetCache
+from utils.gdf.geojson_cache import GeoJSONQuery, GeoJSONResponseCache, encode_bodies
+
+
+def _write_layer(path, n=50):
+    lon = -73.6 + np.arange(n) * 0.001
+    gdf = gpd.GeoDataFrame({"stop_id": np.arange(n), "name": [f"arret {i}" for i in range(n)]},
+                           geometry=gpd.points_from_xy(lon + 0.123456789, np.full(n, 45.5)), crs="EPSG:4326")
+    gdf.to_file(path, driver="GeoJSON")
+
+
+def test_queries_filter_paginate_and_round_coordinates(tmp_path):
+    path = str(tmp_path / "stops.geojson")
+    _write_layer(path)
+    responses = GeoJSONResponseCache()
+
+    full = json.loads(responses.bodies(path, responses.query({}))["identity"])
+    assert len(full["features"]) == 50 and "numberMatched" not in full
+    assert full["features"][0]["geometry"]["coordinates"] == [round(-73.6 + 0.123456789, 6), 45.5]
+
+    # Entités 10 à 19 dans l'emprise, deuxième page de 4
+    query = responses.query({"bbox": f"{-73.6 + 0.1234 + 0.0095},45,{-73.6 + 0.1234 + 0.0195},46",
+                             "limit": "4", "offset": "4", "precision": "2"})
+    window = json.loads(responses.bodies(path, query)["identity"])
+    assert (window["numberMatched"], window["numberReturned"]) == (10, 4)
+    assert [feature["properties"]["stop_id"] for feature in window["features"]] == [14, 15, 16, 17]
+    assert window["features"][0]["geometry"]["coordinates"] == [-73.46, 45.5]
+
+    for args in ({"bbox": "1,2,3"}, {"bbox": "3,0,1,1"}, {"limit": "-1"}, {"offset": "x"}, {"precision": "20"}):
+        with pytest.raises(ValueError):
+            GeoJSONQuery.from_args(args)
+
+
+def test_bodies_are_compressed_cached_and_revalidated_by_file_fingerprint(tmp_path):
+    path = str(tmp_path / "lines.geojson")
+    # Attributs de type liste, lus comme tableaux numpy
+    features = [{"type": "Feature", "properties": {"lanes": lanes},
+                 "geometry": {"type": "LineString", "coordinates": [[-73.6, 45.5], [-73.5, 45.6]]}}
+                for lanes in ([1, 2], [3])]
+    with open(path, "w") as file:
+        json.dump({"type": "FeatureCollection", "features": features}, file)
+    datasets = DatasetCache()
+    responses = GeoJSONResponseCache(datasets=datasets)
+    query = responses.query({})
+
+    bodies = responses.bodies(path, query)
+    assert responses.bodies(path, query) is bodies
+    assert [feature["properties"]["lanes"] for feature in json.loads(bodies["identity"])["features"]] == [[1, 2], [3]]
+    etag, last_modified = responses.validators(path, query)
+    assert responses.validators(path, responses.query({"precision": "3"}))[0] != etag
+
+    # Nouvelle version du fichier : nouvel ETag, corps recalculés
+    time.sleep(0.01)
+    _write_layer(path, n=2000)
+    new_etag, _ = responses.validators(path, query)
+    new_bodies = responses.bodies(path, query)
+    assert new_etag != etag and len(json.loads(new_bodies["identity"])["features"]) == 2000
+    assert gzip.decompress(new_bodies["gzip"]) == new_bodies["identity"]
+    assert len(new_bodies["gzip"]) < len(new_bodies["identity"]) / 4
+    assert datasets.stats()["stale"] >= 1
+    assert set(encode_bodies(b"[]")) == {"identity"}
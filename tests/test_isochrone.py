@@ -0,0 +1,55 @@
+import geopandas as gpd
+import numpy as np
+
+import utils.buffer.isochrone as isochrone
+import utils.buffer.network as network
+
+
+def _grid_graph_with_times(osm_file, meters_per_minute=75.0):
+    G = network.load_network_graph(osm_file)
+    for _, _, data in G.edges(data=True):
+        data["time"] = data["length"] / meters_per_minute
+    return G
+
+
+def test_get_travel_bands_sorted_and_unique():
+    assert isochrone.get_travel_bands({"travel_time": [15, 5, 10, 5]}) == [5, 10, 15]
+    assert isochrone.get_travel_bands({"travel_time": 7}) == [7]
+    assert isochrone.get_travel_bands({}) == [5]
+
+
+def test_multi_band_isochrones_are_nested(grid_osm_file):
+    G = _grid_graph_with_times(grid_osm_file)
+    xs = np.array([data["x"] for _, data in G.nodes(data=True)])
+    ys = np.array([data["y"] for _, data in G.nodes(data=True)])
+    points = gpd.GeoDataFrame({"name": ["a", "b"]},
+                              geometry=gpd.points_from_xy([xs.mean(), xs.mean() + 250], [ys.mean(), ys.mean()]),
+                              crs=G.graph["crs"]).to_crs(epsg=4326)
+
+    origin_positions, band_values, polygons = isochrone.compute_isochrones(
+        G, points.geometry.to_crs(isochrone.UTM_CRS), [2, 4, 6])
+    isochrone_gdf = isochrone.build_isochrone_gdf(points, origin_positions, band_values, polygons, "points")
+
+    assert list(isochrone_gdf["band"]) == [2, 4, 6, 2, 4, 6]
+    assert list(isochrone_gdf["name"]) == ["a", "a", "a", "b", "b", "b"]
+    for name, group in isochrone_gdf.groupby("name"):
+        areas = group["area_km2"].to_numpy()
+        assert (np.diff(areas) > 0).all()
+        inner, outer = group.geometry.iloc[0], group.geometry.iloc[-1]
+        assert outer.buffer(1e-9).contains(inner)
+
+
+def test_hulls_from_distances_thresholds_each_band():
+    coords = np.array([[0, 0], [10, 0], [0, 10], [10, 10], [20, 20]], dtype=float)
+    distances = np.array([
+        [0.0, 1.0, 1.0, 2.0, 3.0],
+        [0.0, 1.0, np.inf, np.inf, np.inf],
+    ])
+
+    hulls = isochrone.hulls_from_distances(distances, coords, [1, 2, 3])
+
+    assert hulls.shape == (2, 3)
+    assert hulls[0, 0].area == 50
+    assert hulls[0, 1].area == 100
+    assert hulls[0, 2].area == 200
+    assert all(hull is None for hull in hulls[1])
@@ -0,0 +1,95 @@
+import textwrap
+import time
+
+import yaml
+
+from utils.pipeline.jobs import CANCELLED, FAILED, SUCCEEDED, JobManager
+
+# main.py factice : avancement JSON, sortie écrite dans l'espace de travail, attente optionnelle
+FAKE_MAIN = textwrap.dedent("""
+    import json, sys, time, yaml
+    config = yaml.safe_load(open("config.yaml"))
+    print("@progress " + json.dumps({"event": "planned", "stages": ["load", "export"]}), flush=True)
+    for stage in ["load", "export"]:
+        print("@progress " + json.dumps({"event": "started", "stage": stage}), flush=True)
+        time.sleep(config.get("sleep", 0))
+        print("@progress " + json.dumps({"event": "finished", "stage": stage, "status": "computed"}), flush=True)
+    if config.get("fail"):
+        print("boom")
+        sys.exit(1)
+    open("data/output/data/agg/result.csv", "w").write(config["name"])
+    print("done")
+""")
+
+
+def _manager(tmp_path, **kwargs):
+    src = tmp_path / "src"
+    src.mkdir()
+    (src / "main.py").write_text(FAKE_MAIN)
+    return JobManager(jobs_dir=str(tmp_path / "jobs"), src_dir=str(src), shared_output_dir=str(tmp_path / "output"),
+                      shared_config_path=str(tmp_path / "config.yaml"), **kwargs)
+
+
+def test_jobs_report_progress_and_publish_their_outputs(tmp_path):
+    manager = _manager(tmp_path)
+    ok = manager.submit({"name": "run_a"})
+    failing = manager.submit({"name": "run_b", "fail": True})
+    manager.wait(ok.id, timeout=30)
+    manager.wait(failing.id, timeout=30)
+
+    status = ok.to_dict()
+    assert status["status"] == SUCCEEDED and status["returncode"] == 0
+    assert status["progress"] == {"completed": 2, "total": 2, "current_stage": None,
+                                  "stages": {"load": "computed", "export": "computed"}}
+    assert status["log"] == ["done"]
+    assert (tmp_path / "output" / "data" / "agg" / "result.csv").read_text() == "run_a"
+    assert yaml.safe_load((tmp_path / "config.yaml").read_text()) == {"name": "run_a"}
+
+    assert failing.status == FAILED and "boom" in failing.error
+    assert [job.id for job in manager.list()] == [failing.id, ok.id]
+    manager.shutdown()
+
+
+def test_queued_and_running_jobs_can_be_cancelled(tmp_path):
+    manager = _manager(tmp_path, max_workers=1)
+    running = manager.submit({"name": "slow", "sleep": 30})
+    queued = manager.submit({"name": "queued"})
+
+    deadline = time.time() + 30
+    while running.current_stage is None and time.time() < deadline:
+        time.sleep(0.05)
+    assert manager.cancel(queued.id).status == CANCELLED
+    manager.cancel(running.id)
+    manager.wait(running.id, timeout=30)
+
+    assert running.status == CANCELLED and running.stages["load"] == "running"
+    assert not (tmp_path / "output").exists()
+    manager.shutdown()
+
+
+def test_resident_engine_keeps_stage_outputs_between_jobs(tmp_path):
+    import geopandas as gpd
+
+    src = tmp_path / "src"
+    (src / "data" / "input" / "geojson").mkdir(parents=True)
+    gpd.GeoDataFrame({"point_name": ["a", "b", "c"]}, geometry=gpd.points_from_xy([-73.57, -73.571, -73.60], [45.5, 45.5, 45.52]),
+                     crs="EPSG:4326").to_file(src / "data" / "input" / "geojson" / "points.geojson", driver="GeoJSON")
+    config = {"data_files": [{"name": "points", "path": "./data/input/geojson/points.geojson"}], "filter_data_files": {},
+              "buffer_layer": {"points": {"buffer_type": "circular", "distance": 200, "geometry_type": "Point"}},
+              "join_layers": {"points": {"type": "contains"}}, "groupby_columns": ["buffer_id"],
+              "sum_columns": ["proportion as total"], "activate_visualisation": False}
+    manager = JobManager(max_workers=1, jobs_dir=str(tmp_path / "jobs"), src_dir=str(src),
+                         shared_output_dir=str(tmp_path / "output"), shared_config_path=str(tmp_path / "config.yaml"),
+                         engine=True)
+    try:
+        first = manager.wait(manager.submit(config).id, timeout=120)
+        second = manager.wait(manager.submit(dict(config, sum_columns=["proportion as n"])).id, timeout=120)
+    finally:
+        manager.shutdown()
+
+    assert (first.status, first.engine_runs) == (SUCCEEDED, 1), first.error
+    assert (second.status, second.engine_runs) == (SUCCEEDED, 2), second.error
+    assert {stage: second.stages[stage] for stage in ("load", "join", "proportion", "metrics")} == \
+        {"load": None, "join": None, "proportion": "hit", "metrics": "computed"}
+    agg = (tmp_path / "output" / "data" / "agg" / "circular_buffer_200m.csv").read_text().splitlines()
+    assert agg[0].split(",")[:2] == ["buffer_id", "n"] and len(agg) == 4
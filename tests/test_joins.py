@@ -0,0 +1,51 @@
+import geopandas as gpd
+import pytest
+from shapely.geometry import LineString, Point, box
+
+import utils.gdf.joins as joins
+
+
+def test_joined_geometries_replace_buffer_geometries():
+    buffers = {"stops_buffer": gpd.GeoDataFrame({"buffer_id": [1, 2]}, geometry=[box(0, 0, 10, 10), box(20, 0, 30, 10)],
+                                                crs="EPSG:32618")}
+    join_data = {
+        "points": {"shops": gpd.GeoDataFrame({"shop": ["a", "b"]}, geometry=[Point(5, 5), Point(25, 5)], crs="EPSG:32618")},
+        "linestrings": {"streets": gpd.GeoDataFrame({"street": ["x"]}, geometry=[LineString([(5, 5), (25, 5)])],
+                                                    crs="EPSG:32618")},
+    }
+    join_layers = {"points": {"type": "contains"}, "linestrings": {"type": "intersects"}}
+
+    fusion_gdf = joins.assemble_joined_geometries(joins.perform_spatial_joins(buffers, join_data, join_layers))
+
+    assert not [col for col in fusion_gdf.columns if col.endswith("_geometry") and col != "buffer_geometry"]
+    by_row = {(row.buffer_id, row.join_layer): row for row in fusion_gdf.itertuples()}
+    assert by_row[(1, "shops")].geometry.equals(Point(5, 5))
+    assert by_row[(2, "shops")].geometry.equals(Point(25, 5))
+    assert by_row[(2, "streets")].geometry.equals(LineString([(5, 5), (25, 5)]))
+    assert by_row[(2, "streets")].buffer_geometry.equals(box(20, 0, 30, 10))
+    assert fusion_gdf.crs == "EPSG:32618"
+
+
+def test_network_joins_only_route_layers_with_join_mode_network(grid_osm_file):
+    stops = gpd.GeoDataFrame({"stop": ["s"]}, geometry=gpd.points_from_xy([-73.565], [45.504]), crs="EPSG:4326")
+    zones = gpd.GeoDataFrame({"zone": ["z"]}, geometry=[box(-73.57, 45.50, -73.56, 45.51)], crs="EPSG:4326")
+    buffers = {"stops_buffer": gpd.GeoDataFrame(stops[["stop"]], geometry=[box(-73.568, 45.502, -73.562, 45.506)],
+                                               crs="EPSG:4326"),
+               "zones_buffer": gpd.GeoDataFrame({"buffer_id": [1]}, geometry=zones.geometry, crs="EPSG:4326")}
+    shops = gpd.GeoDataFrame({"shop": ["a"]}, geometry=gpd.points_from_xy([-73.566], [45.505]), crs="EPSG:4326")
+    buffer_layer = {"stops": {"buffer_type": "network", "join_mode": "network", "distance": 500,
+                              "osm_file": grid_osm_file, "geometry_type": "Point", "snap_cache": False},
+                    "zones": {"buffer_type": "circular", "distance": 100, "geometry_type": "Polygon"}}
+    source_gdfs = {"Point": {"stops": stops}, "Polygon": {"zones": zones}}
+
+    fusion_gdf = joins.perform_network_joins(buffers, source_gdfs, {"points": {"shops": shops}}, buffer_layer,
+                                             {"points": {"type": "contains"}})
+
+    assert sorted(zip(fusion_gdf["buffer_layer"], fusion_gdf["join_type"])) == \
+        [("stops_buffer", "network"), ("zones_buffer", "contains")]
+
+    # Une couche de jointure réseau invalide lève l'erreur au lieu de perdre ses jointures
+    buffer_layer["stops"]["osm_file"] = "missing.osm"
+    with pytest.raises(FileNotFoundError):
+        joins.perform_network_joins(buffers, source_gdfs, {"points": {"shops": shops}}, buffer_layer,
+                                    {"points": {"type": "contains"}})
@@ -0,0 +1,106 @@
+import warnings
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+
+import utils.metrics.metrics as metrics
+
+METRICS_CONFIG = {
+    "sum": ["population as total_pop", "lanes"], "max": ["lanes as max_lanes"], "min": ["speed as min_speed"],
+    "mean": ["speed as mean_speed"], "std": ["speed as std_speed"], "count": ["line_name as nbr"],
+    "count_distinct": ["line_name as nbr_lines", "missing_column"],
+    "ratio": [{"name": "pop_per_lane", "numerator": "population", "denominator": "lanes"}],
+    "multiply": [{"name": "weight", "columns": ["proportion", "lanes"]}],
+}
+
+
+def _fusion_gdf(n=400, seed=3):
+    rng = np.random.default_rng(seed)
+    gdf = gpd.GeoDataFrame({
+        "buffer_id": rng.integers(0, 30, n),
+        "stop": rng.choice(["b", "a", "c"], n),
+        "population": rng.integers(0, 100, n),
+        "lanes": rng.integers(1, 4, n),
+        "speed": np.where(rng.random(n) < 0.2, np.nan, rng.normal(30, 8, n)),
+        "line_name": rng.choice(["L1", "L2", "L3", "nan"], n),
+        "proportion": rng.random(n),
+        "area_km2": rng.random(n),
+    }, geometry=gpd.points_from_xy(rng.random(n), rng.random(n)))
+    return gdf
+
+
+def test_single_pass_metrics_match_pandas_groupby():
+    gdf = _fusion_gdf()
+    keys = ["buffer_id", "stop"]
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        result = metrics.calculate_metrics(gdf, keys, METRICS_CONFIG)
+
+    grouped = gdf.groupby(keys)
+    expected = grouped.agg(total_pop=("population", "sum"), lanes=("lanes", "sum"), max_lanes=("lanes", "max"),
+                           min_speed=("speed", "min"), mean_speed=("speed", "mean"), std_speed=("speed", "std"),
+                           nbr=("line_name", "count")).reset_index()
+    expected["nbr_lines"] = grouped["line_name"].agg(lambda s: s[s != "nan"].nunique()).to_numpy()
+    expected["area_km2"] = gdf.drop_duplicates(subset=keys).set_index(keys)["area_km2"].loc[
+        pd.MultiIndex.from_frame(expected[keys])].to_numpy()
+    expected["pop_per_lane"] = (gdf["population"] / gdf["lanes"]).groupby([gdf[k] for k in keys]).mean().to_numpy()
+    expected["weight"] = (gdf["proportion"] * gdf["lanes"]).groupby([gdf[k] for k in keys]).prod().to_numpy()
+
+    pd.testing.assert_frame_equal(result, expected.round(2))
+    # Le ratio ligne à ligne reste disponible dans la table de fusion
+    assert "pop_per_lane" in gdf.columns
+
+
+def test_groups_without_aggregation_keep_their_order_of_appearance():
+    gdf = _fusion_gdf(n=50)
+    result = metrics.calculate_metrics(gdf, ["stop"], {"sum": [], "count_distinct": []})
+
+    assert result["stop"].tolist() == gdf["stop"].drop_duplicates().tolist()
+    assert result["area_km2"].tolist() == gdf.drop_duplicates(subset=["stop"])["area_km2"].round(2).tolist()
+
+
+def test_weighted_metrics_use_proportion_or_an_explicit_weight():
+    gdf = _fusion_gdf()
+    gdf.loc[gdf.index[:5], "proportion"] = np.nan
+    config = {"sum": ["population"],
+              "weighted_sum": ["population as pop_apportioned", {"column": "speed", "weight": "lanes", "name": "speed_x_lanes"}],
+              "weighted_mean": ["speed", {"column": "speed", "weight": "missing_weight"}]}
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        result = metrics.calculate_metrics(gdf, ["stop"], config)
+
+    assert any("missing_weight" in str(warning.message) for warning in caught)
+    assert list(result.columns) == ["stop", "population", "pop_apportioned", "speed_x_lanes",
+                                    "weighted_mean_speed", "area_km2"]
+    grouped = gdf.assign(pw=gdf["population"] * gdf["proportion"], sl=gdf["speed"] * gdf["lanes"]).groupby("stop")
+    valid = gdf[gdf["speed"].notna() & gdf["proportion"].notna()]
+    weighted_mean = (valid["speed"] * valid["proportion"]).groupby(valid["stop"]).sum() / valid.groupby("stop")["proportion"].sum()
+    np.testing.assert_allclose(result["pop_apportioned"], grouped["pw"].sum().round(2).to_numpy())
+    np.testing.assert_allclose(result["speed_x_lanes"], grouped["sl"].sum().round(2).to_numpy())
+    np.testing.assert_allclose(result["weighted_mean_speed"], weighted_mean.round(2).to_numpy())
+
+
+def test_quantile_columns_match_pandas_on_small_groups():
+    gdf = _fusion_gdf()
+    config = {"quantile": ["speed as median_speed", {"column": "population", "quantiles": [0.85, 0.95], "name": "pop"}]}
+    result = metrics.calculate_metrics(gdf, ["stop"], config)
+
+    expected = gdf.groupby("stop").agg(median_speed=("speed", "median"),
+                                       pop_p85=("population", lambda s: s.quantile(0.85)),
+                                       pop_p95=("population", lambda s: s.quantile(0.95)))
+    pd.testing.assert_frame_equal(result.drop(columns="area_km2").set_index("stop"), expected.round(2))
+
+
+def test_approximate_count_distinct_reports_its_error_bound():
+    rng = np.random.default_rng(11)
+    n = 20000
+    gdf = gpd.GeoDataFrame({"buffer_id": rng.integers(0, 4, n), "trip_id": rng.integers(0, 10 ** 6, n).astype(str)},
+                           geometry=gpd.points_from_xy(rng.random(n), rng.random(n)))
+    config = {"count_distinct": ["trip_id as exact_trips",
+                                 {"column": "trip_id", "name": "trips", "approximate": True, "precision": 14}]}
+    result = metrics.calculate_metrics(gdf, ["buffer_id"], config)
+
+    assert list(result.columns) == ["buffer_id", "exact_trips", "trips", "trips_error", "area_km2"]
+    np.testing.assert_allclose(result["trips_error"], result["trips"] * 1.04 / 2 ** 7, atol=0.01)
+    assert (np.abs(result["trips"] - result["exact_trips"]) <= 3 * result["trips_error"]).all()
@@ -0,0 +1,106 @@
+import geopandas as gpd
+import networkx as nx
+import numpy as np
+from shapely.geometry import LineString, box
+
+import utils.buffer.graph as graph
+import utils.buffer.network as network
+
+
+def test_sample_line_points_all_mode():
+    lines = gpd.GeoSeries([LineString([(0, 0), (100, 0)]), LineString([(0, 0), (0, 50)])], crs="EPSG:32618")
+
+    parents, points = network.sample_line_points(lines, mode="all")
+
+    assert list(parents) == [0, 1, 0, 1, 0, 1]
+    assert [(p.x, p.y) for p in points[:2]] == [(50, 0), (0, 25)]
+    assert [(p.x, p.y) for p in points[2:4]] == [(0, 0), (0, 0)]
+    assert [(p.x, p.y) for p in points[4:]] == [(100, 0), (0, 50)]
+
+
+def test_sample_line_points_every_n_metres():
+    lines = gpd.GeoSeries([LineString([(0, 0), (100, 0)]), LineString([(0, 0), (0, 50)])], crs="EPSG:32618")
+
+    parents, points = network.sample_line_points(lines, mode="centroid", sample_distance=40)
+
+    dense = points[2:]
+    assert list(parents[2:]) == [0, 0, 0, 1, 1, 0, 1]
+    assert [p.x for p in dense[:3]] == [0, 40, 80]
+    assert [p.y for p in dense[3:5]] == [0, 40]
+    assert (dense.iloc[-2].x, dense.iloc[-1].y) == (100, 50)
+
+
+def test_sample_polygon_points_keeps_parent_ids():
+    polygons = gpd.GeoSeries([box(0, 0, 10, 10), box(100, 100, 120, 120)], crs="EPSG:32618")
+
+    parents, points = network.sample_polygon_points(polygons, mode="all", sample_distance=20)
+
+    assert len(parents) == len(points)
+    assert np.bincount(parents).tolist() == [5 + 3, 5 + 5]
+    for parent, point in zip(parents, points):
+        assert polygons.iloc[parent].buffer(1e-6).contains(point)
+
+
+def test_concave_polygonization_agrees_with_exact_area(grid_osm_file):
+    G = network.load_network_graph(grid_osm_file)
+    xs = np.array([data["x"] for _, data in G.nodes(data=True)])
+    ys = np.array([data["y"] for _, data in G.nodes(data=True)])
+    origins = gpd.GeoSeries(gpd.points_from_xy(xs.mean() + np.array([-220.0, 0.0, 130.0]),
+                                               ys.mean() + np.array([40.0, 0.0, -170.0])), crs=G.graph["crs"])
+
+    exact = network.compute_network_buffers(G, origins, 400, polygonization="exact")
+    concave = network.compute_network_buffers(G, origins, 400, polygonization="concave")
+
+    relative_diff = ((concave.area - exact.area) / exact.area).abs()
+    assert (relative_diff < 0.1).all()
+
+
+def test_clipping_keeps_network_buffers_identical(grid_osm_file):
+    G = network.load_network_graph(grid_osm_file)
+    xs = np.array([data["x"] for _, data in G.nodes(data=True)])
+    ys = np.array([data["y"] for _, data in G.nodes(data=True)])
+    origins = gpd.GeoSeries(gpd.points_from_xy([xs.min() + 120, xs.min() + 260], [ys.min() + 90, ys.min() + 310]),
+                            crs=G.graph["crs"])
+
+    clipped = graph.prepare_routing_graph(G, origins, 300, {"snap_cache": False})
+
+    assert clipped.number_of_nodes() < G.number_of_nodes()
+    assert [step["step"] for step in clipped.graph["preprocessing"]] == ["loaded", "clipped"]
+    full_buffers = network.compute_network_buffers(G, origins, 300)
+    clipped_buffers = network.compute_network_buffers(clipped, origins, 300)
+    assert all(a.equals(b) for a, b in zip(full_buffers, clipped_buffers))
+
+
+def test_contract_degree_two_merges_chains():
+    G = nx.MultiDiGraph(crs="EPSG:32618")
+    for node, x in enumerate([0, 10, 20, 30]):
+        G.add_node(node, x=x, y=0)
+    G.add_node(4, x=10, y=10)
+    for u, v in [(0, 1), (1, 2), (2, 3), (1, 4)]:
+        G.add_edge(u, v, length=10.0)
+        G.add_edge(v, u, length=10.0)
+
+    contracted = graph.contract_degree_two(G)
+
+    assert sorted(contracted.nodes) == [0, 1, 3, 4]
+    data = contracted.get_edge_data(1, 3)[0]
+    assert data["length"] == 20.0
+    assert list(data["geometry"].coords) == [(10, 0), (20, 0), (30, 0)]
+    assert list(contracted.get_edge_data(3, 1)[0]["geometry"].coords) == [(30, 0), (20, 0), (10, 0)]
+
+
+def test_resident_graph_cache_shares_the_loaded_graph(grid_osm_file, monkeypatch):
+    monkeypatch.setattr(network, "GRAPH_CACHE_SIZE", 1)
+    monkeypatch.setattr(network, "_GRAPH_CACHE", network.OrderedDict())
+    G = network.load_network_graph(grid_osm_file)
+    assert network.load_network_graph(grid_osm_file) is G
+
+    origins = gpd.GeoSeries(gpd.points_from_xy([G.nodes[n]['x'] for n in list(G.nodes)[:2]],
+                                               [G.nodes[n]['y'] for n in list(G.nodes)[:2]]), crs=G.graph['crs'])
+    edges = G.number_of_edges()
+    for params in ({"snap_cache": False}, {"snap_cache": False, "clip_graph": False}):
+        prepared = graph.prepare_routing_graph(G, origins, 150, params)
+        assert prepared is not G
+    # Le graphe partagé n'est pas modifié ; son index d'accrochage est conservé pour les exécutions suivantes
+    assert G.number_of_edges() == edges and 'preprocessing' not in G.graph
+    assert 'snap_index' in G.graph
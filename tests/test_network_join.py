@@ -0,0 +1,74 @@
+import geopandas as gpd
+import networkx as nx
+import numpy as np
+from shapely.geometry import LineString
+
+import utils.buffer.network as network
+import utils.buffer.network_join as network_join
+
+
+def _node_xy(G):
+    xs = np.array([data["x"] for _, data in G.nodes(data=True)])
+    ys = np.array([data["y"] for _, data in G.nodes(data=True)])
+    return xs, ys
+
+
+def test_network_join_pairs_match_dijkstra(grid_osm_file):
+    G = network.load_network_graph(grid_osm_file)
+    xs, ys = _node_xy(G)
+    origins = gpd.GeoSeries(gpd.points_from_xy([xs.mean(), xs.min() + 5], [ys.mean(), ys.min() + 5]), crs=G.graph["crs"])
+    targets = gpd.GeoSeries(gpd.points_from_xy(xs[::7], ys[::7]), crs=G.graph["crs"])
+
+    pairs = network_join.network_join_pairs(G, np.arange(2), origins, np.arange(len(targets)), targets, 350)
+
+    nodes = np.array(list(G.nodes))
+    for origin in range(2):
+        source = network.ox.distance.nearest_nodes(G, origins.x[origin], origins.y[origin])
+        lengths = nx.single_source_dijkstra_path_length(G, source, weight="length", cutoff=350)
+        expected = {i: lengths[node] for i, node in enumerate(nodes[::7]) if node in lengths}
+        found = pairs[pairs["origin"] == origin]
+        assert dict(zip(found["feature"], found["network_distance"])) == expected
+    assert (pairs["proportion"] == 1.0).all()
+
+
+def test_network_join_ignores_features_across_a_barrier(grid_osm_file):
+    G = network.load_network_graph(grid_osm_file)
+    xs, ys = _node_xy(G)
+    river = xs.mean() + 50
+    # Une rivière coupe toutes les rues est-ouest au milieu de la grille
+    G.remove_edges_from([(u, v, k) for u, v, k in G.edges(keys=True)
+                         if (G.nodes[u]["x"] < river) != (G.nodes[v]["x"] < river)])
+
+    origin = gpd.GeoSeries(gpd.points_from_xy([river - 50], [ys.mean()]), crs=G.graph["crs"])
+    features = gpd.GeoSeries([LineString([(river + 50, ys.mean() - 40), (river + 50, ys.mean() + 40)]),
+                              LineString([(river - 150, ys.mean() - 100), (river - 150, ys.mean() + 100)])],
+                             crs=G.graph["crs"])
+    parents, points = network_join.sample_join_points(features)
+
+    pairs = network_join.network_join_pairs(G, np.array([0]), origin, parents, points, 300)
+
+    # La ligne de l'autre rive est à 100 m à vol d'oiseau mais inaccessible
+    assert pairs["feature"].tolist() == [1]
+    assert np.isclose(pairs["network_distance"].iloc[0], 100, atol=1)
+    assert pairs["proportion"].iloc[0] == 1.0
+
+
+def test_edge_snapping_reaches_join_points_along_their_edge(grid_osm_file):
+    G = network.load_network_graph(grid_osm_file)
+    xs, ys = _node_xy(G)
+    nodes = np.array(list(G.nodes))
+    source = nodes[np.argmin(np.hypot(xs - xs.mean(), ys - ys.mean()))]
+    u, v = next((u, v) for u, v in G.edges(source) if np.isclose(G.nodes[u]["y"], G.nodes[v]["y"], atol=1))
+    origin = gpd.GeoSeries(gpd.points_from_xy([G.nodes[source]["x"]], [G.nodes[source]["y"]]), crs=G.graph["crs"])
+    # Point au quart de la rue (u, v), à 5 m de la chaussée : à ~25 m du nœud le plus proche
+    x, y = 0.75 * G.nodes[u]["x"] + 0.25 * G.nodes[v]["x"], G.nodes[u]["y"] + 5
+    point = gpd.GeoSeries(gpd.points_from_xy([x], [y]), crs=G.graph["crs"])
+
+    by_node = network_join.network_join_pairs(G, np.array([0]), origin, np.array([0]), point, 300, snap_tolerance=10)
+    by_edge = network_join.network_join_pairs(G, np.array([0]), origin, np.array([0]), point, 300, snap_tolerance=10,
+                                              snap_to="edge")
+
+    assert by_node.empty
+    assert np.isclose(by_edge["network_distance"].iloc[0], 0.25 * G.edges[u, v, 0]["length"], atol=1)
+    # Distance maximale vérifiée jusqu'au point, pas seulement jusqu'au nœud d'entrée
+    assert network_join.network_join_pairs(G, np.array([0]), origin, np.array([0]), point, 10, snap_to="edge").empty
@@ -0,0 +1,173 @@
+import copy
+
+import utils.pipeline.stages as stages
+from utils.pipeline.cache import StageCache
+
+CONFIG = {
+    "data_files": [{"name": "points_geojson", "path": "./data/input/geojson/points_geojson.geojson"}],
+    "filter_data_files": {},
+    "buffer_layer": {"points_geojson": {"buffer_type": "circular", "distance": 200, "geometry_type": "Point"}},
+    "join_layers": {"points": {"type": "contains"}},
+    "groupby_columns": ["buffer_id"],
+    "sum_columns": [],
+}
+
+
+def _changed_keys(**changes):
+    config = copy.deepcopy(CONFIG)
+    config.update(changes)
+    before, after = stages.PipelineRun(CONFIG), stages.PipelineRun(config)
+    return {stage.name for stage in stages.STAGES if before.key(stage.name) != after.key(stage.name)}
+
+
+def test_stage_keys_only_follow_their_dependencies():
+    assert _changed_keys(sum_columns=["proportion"]) == {"metrics", "export"}
+
+    buffer_layer = copy.deepcopy(CONFIG["buffer_layer"])
+    buffer_layer["points_geojson"]["distance"] = 300
+    assert _changed_keys(buffer_layer=buffer_layer) == {"buffer", "join", "proportion", "metrics", "export"}
+
+    # Les caches disque d'une couche ne changent pas ses sorties
+    buffer_layer = copy.deepcopy(CONFIG["buffer_layer"])
+    buffer_layer["points_geojson"].update(snap_cache=False, checkpoint=False)
+    assert _changed_keys(buffer_layer=buffer_layer) == set()
+
+
+def test_cached_stages_are_not_recomputed(tmp_path):
+    computed = []
+
+    def stage(name, inputs, config_keys):
+        def run(config, upstream):
+            computed.append(name)
+            return [config.get(key) for key in config_keys] + [upstream[input_name] for input_name in inputs]
+        return stages.Stage(name, inputs, config_keys, run)
+
+    dag = (stage("load", (), ("data_files",)), stage("buffer", ("load",), ("buffer_layer",)),
+           stage("metrics", ("buffer",), ("sum_columns",)))
+    cache = StageCache(str(tmp_path))
+
+    first = stages.PipelineRun(CONFIG, cache, dag)
+    expected = first.output("metrics")
+    assert computed == ["metrics", "buffer", "load"]
+
+    computed.clear()
+    config = dict(CONFIG, sum_columns=["proportion"])
+    rerun = stages.PipelineRun(config, cache, dag)
+    rerun.output("metrics")
+    assert computed == ["metrics"]
+    assert rerun.status == {"buffer": "hit", "metrics": "computed"}
+
+    computed.clear()
+    assert stages.PipelineRun(CONFIG, cache, dag).output("metrics") == expected
+    assert computed == []
+
+
+def test_memory_cache_serves_isolated_copies(tmp_path):
+    import pandas as pd
+    from utils.pipeline.cache import MemoryStageCache
+
+    cache = MemoryStageCache(StageCache(str(tmp_path)), max_entries=1)
+    table = pd.DataFrame({"a": [1, 2]})
+    cache.save("join", "k1", {"fusion": table})
+    table["ratio"] = 0.5
+
+    hit, value = cache.load("join", "k1")
+    assert hit and list(value["fusion"].columns) == ["a"]
+    value["fusion"]["other"] = 1
+    assert list(cache.load("join", "k1")[1]["fusion"].columns) == ["a"]
+
+    cache.save("join", "k2", {"fusion": table})
+    # k1 n'est plus en mémoire mais reste lu depuis le cache disque
+    assert cache.load("join", "k1")[0] and cache.stats() == {"entries": {"join": 1}, "hits": 2, "misses": 1}
+
+
+def test_in_memory_pipeline_returns_frames_without_writing_files(tmp_path, monkeypatch):
+    import geopandas as gpd
+    from shapely.geometry import box
+
+    monkeypatch.chdir(tmp_path)
+    stops = gpd.GeoDataFrame({"stop_name": ["a", "b"]}, geometry=gpd.points_from_xy([-73.57, -73.56], [45.5, 45.5]),
+                             crs="EPSG:4326")
+    zones = gpd.GeoDataFrame({"population": [100, 50]}, crs="EPSG:4326",
+                             geometry=[box(-73.572, 45.499, -73.568, 45.501), box(-73.5605, 45.4995, -73.5595, 45.5005)])
+    config = {"filter_data_files": {}, "groupby_columns": ["buffer_id"], "sum_columns": ["population"],
+              "buffer_layer": {"stops": {"buffer_type": "circular", "distance": 200, "geometry_type": "Point"}},
+              "join_layers": {"polygons": {"type": "intersects"}}, "activate_visualisation": False}
+
+    pipeline = stages.Pipeline({"stops": stops, "zones": zones})
+    result = pipeline.run(config)
+    assert list(result.buffers) == ["stops_buffer"] and len(result.buffers["stops_buffer"]) == 2
+    assert result.agg["population"].tolist() == [100, 50]
+    assert set(result.fusion.columns) >= {"buffer_id", "population", "proportion"}
+    assert list(tmp_path.iterdir()) == []
+
+    rerun = pipeline.run(dict(config, sum_columns=["population as pop"]))
+    assert rerun.status == {"proportion": "hit", "metrics": "computed", "buffer": "hit"}
+    assert rerun.agg["pop"].tolist() == [100, 50]
+
+    pipeline.run(config, export=True)
+    assert (tmp_path / "data" / "output" / "data" / "agg" / "circular_buffer_200m.csv").exists()
+    assert (tmp_path / "data" / "output" / "fusion_gdf.parquet").exists()
+
+
+def test_in_memory_network_pipeline_writes_no_cache_and_prints_nothing(grid_osm_file, tmp_path, monkeypatch, capsys):
+    import geopandas as gpd
+
+    workdir = tmp_path / "work"
+    workdir.mkdir()
+    monkeypatch.chdir(workdir)
+    stops = gpd.GeoDataFrame({"stop_name": ["a", "b"]}, geometry=gpd.points_from_xy([-73.565, -73.55], [45.504, 45.504]),
+                             crs="EPSG:4326")
+    config = {"filter_data_files": {}, "groupby_columns": ["buffer_id"], "join_layers": {"points": {"type": "contains"}},
+              "buffer_layer": {"stops": {"buffer_type": "network", "distance": 300, "osm_file": grid_osm_file,
+                                         "geometry_type": "Point"}}}
+
+    result = stages.Pipeline({"stops": stops}).run(config)
+    assert len(result.buffers["stops_buffer"]) == 2 and not result.agg.empty
+    assert list(workdir.iterdir()) == []
+    assert capsys.readouterr().out == ""
+
+
+def test_circular_run_does_not_import_the_network_stack(tmp_path):
+    import os
+    import subprocess
+    import sys
+
+    src = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+    script = (
+        "import sys, geopandas as gpd\n"
+        "from utils.pipeline.stages import Pipeline\n"
+        "stops = gpd.GeoDataFrame({'stop_name': ['a', 'b']}, geometry=gpd.points_from_xy([-73.57, -73.56], [45.5, 45.5]), crs='EPSG:4326')\n"
+        "config = {'filter_data_files': {}, 'groupby_columns': ['buffer_id'], 'join_layers': {'points': {'type': 'contains'}},\n"
+        "          'buffer_layer': {'stops': {'buffer_type': 'circular', 'distance': 200, 'geometry_type': 'Point'}}}\n"
+        "assert len(Pipeline({'stops': stops}).run(config).agg) == 2\n"
+        "print(sorted(name for name in ('osmnx', 'networkx', 'scipy', 'pydeck', 'plotly') if name in sys.modules))\n"
+    )
+    completed = subprocess.run([sys.executable, "-c", script], cwd=tmp_path, env=dict(os.environ, PYTHONPATH=src),
+                               capture_output=True, text=True, check=True)
+    assert completed.stdout.strip().splitlines()[-1] == "[]"
+
+
+def test_load_stage_rebuilds_the_parquet_cache_of_an_edited_input(tmp_path, monkeypatch):
+    import time
+
+    import geopandas as gpd
+
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data" / "input" / "geojson").mkdir(parents=True)
+    path = "./data/input/geojson/stops.geojson"
+    config = {"data_files": [{"name": "stops", "path": path}]}
+
+    def write(names):
+        gpd.GeoDataFrame({"stop_name": names}, geometry=gpd.points_from_xy(range(len(names)), [45.5] * len(names)),
+                         crs="EPSG:4326").to_file(path, driver="GeoJSON")
+
+    write(["a", "b"])
+    cache = StageCache(str(tmp_path / "cache"))
+    assert stages.PipelineRun(config, cache).output("load")["stops"]["stop_name"].tolist() == ["a", "b"]
+    assert (tmp_path / "data" / "input" / "parquet" / "stops.parquet").exists()
+
+    # Entrée modifiée : nouvelle clé, et le cache Parquet périmé n'est pas relu
+    time.sleep(0.01)
+    write(["c", "d", "e"])
+    assert stages.PipelineRun(config, cache).output("load")["stops"]["stop_name"].tolist() == ["c", "d", "e"]
@@ -0,0 +1,46 @@
+import json
+import time
+
+import pandas as pd
+
+import utils.pipeline.profiler as profiler
+import utils.pipeline.stages as stages
+from utils.pipeline.cache import StageCache
+
+
+def test_nested_stages_report_their_own_time_and_rows(tmp_path):
+    def stage(name, inputs, seconds, rows):
+        def run(config, upstream):
+            for input_name in inputs:
+                upstream[input_name]
+            with profiler.section(name, layer=f"{name}_layer", rows_in=rows) as entry:
+                time.sleep(seconds)
+                entry["rows_out"] = rows
+            return pd.DataFrame({"value": range(rows)})
+        return stages.Stage(name, inputs, (), run)
+
+    dag = (stage("load", (), 0.2, 10), stage("metrics", ("load",), 0.05, 3))
+    cache = StageCache(str(tmp_path / "cache"))
+    run = stages.PipelineRun({}, cache, dag, profiler=profiler.Profiler(trace_memory=True))
+    with run.profiler.activate():
+        run.output("metrics")
+    path = run.profiler.write(str(tmp_path))
+
+    with open(path) as file:
+        report = json.load(file)
+    by_stage = {entry["stage"]: entry for entry in report["stages"]}
+    assert by_stage["load"]["wall_s"] >= 0.2 and by_stage["metrics"]["wall_s"] < 0.2
+    assert (by_stage["load"]["rows_in"], by_stage["load"]["rows_out"]) == (None, 10)
+    assert (by_stage["metrics"]["rows_in"], by_stage["metrics"]["rows_out"]) == (10, 3)
+    assert by_stage["metrics"]["cache"] == "miss" and "peak_alloc_mb" in by_stage["metrics"]
+    assert [entry["layer"] for entry in report["layers"]] == ["load_layer", "metrics_layer"]
+
+    rerun = stages.PipelineRun({}, cache, dag)
+    rerun.output("metrics")
+    assert [(entry["stage"], entry["cache"]) for entry in rerun.profiler.report()["stages"]] == [("metrics", "hit")]
+
+
+def test_sections_are_ignored_without_an_active_profiler():
+    with profiler.section("join", layer="stops") as entry:
+        entry["rows_out"] = 1
+    assert profiler._active.get() is None
@@ -0,0 +1,50 @@
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+from shapely.geometry import LineString, MultiLineString, MultiPolygon, Point, Polygon, box
+
+import utils.metrics.proportion as proportion
+
+
+def test_proportions_for_all_geometry_types():
+    buffer = box(0, 0, 10, 10)
+    geometries = gpd.GeoSeries([
+        LineString([(5, 5), (15, 5)]),                                     # moitié dans le buffer
+        MultiLineString([[(1, 1), (2, 1)], [(20, 1), (23, 1)]]),           # 1 m sur 4
+        Polygon([(5, 0), (15, 0), (15, 10), (5, 10)]),                     # moitié de l'aire
+        MultiPolygon([box(1, 1, 3, 3), box(20, 20, 22, 22)]),              # moitié de l'aire
+        box(2, 2, 4, 4),                                                   # emprise incluse
+        LineString([(20, 20), (30, 30)]),                                  # emprises disjointes
+        Point(5, 5),
+        Point(50, 50),
+    ], index=[10, 11, 12, 13, 14, 15, 16, 17])
+    buffers = gpd.GeoSeries([buffer] * len(geometries))
+
+    result = proportion.calculate_geometric_proportions(geometries, buffers)
+
+    assert result.index.tolist() == geometries.index.tolist()
+    assert result.tolist() == [0.5, 0.25, 0.5, 0.5, 1.0, 0.0, 1.0, 0.0]
+
+
+def test_proportions_match_exact_intersection():
+    rng = np.random.default_rng(0)
+    n = 300
+    starts = rng.uniform(0, 100, (n, 2))
+    lines = [LineString([tuple(s), tuple(s + rng.uniform(-30, 30, 2))]) for s in starts[: n // 2]]
+    polygons = [Point(*s).buffer(r) for s, r in zip(starts[n // 2:], rng.uniform(1, 15, n // 2))]
+    geometries = gpd.GeoSeries(lines + polygons)
+    buffers = gpd.GeoSeries([Point(*c).buffer(25) for c in rng.uniform(0, 100, (n, 2))])
+
+    result = proportion.calculate_geometric_proportions(geometries, buffers)
+
+    intersections = geometries.intersection(buffers)
+    measure = np.where(geometries.geom_type == "LineString", intersections.length / geometries.length,
+                       intersections.area / geometries.area)
+    pd.testing.assert_series_equal(result, pd.Series(np.round(measure, 4)), check_exact=False, atol=1e-4)
+
+
+def test_empty_and_degenerate_geometries_have_zero_proportion():
+    geometries = gpd.GeoSeries([Polygon(), LineString([(1, 1), (1, 1)]), None])
+    buffers = gpd.GeoSeries([box(0, 0, 10, 10)] * 3)
+
+    assert proportion.calculate_geometric_proportions(geometries, buffers).tolist() == [0.0, 0.0, 0.0]
@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+
+from utils.metrics.aggregation import GroupIndex
+from utils.metrics.sketches import HyperLogLogSketch, QuantileSketch
+
+QUANTILES = [0.5, 0.85, 0.95]
+
+
+def _trips(n=60000, seed=5):
+    rng = np.random.default_rng(seed)
+    # Deux grands groupes (esquisse compressée) et des petits groupes (mode exact)
+    groups = np.where(rng.random(n) < 0.98, rng.integers(0, 2, n), rng.integers(2, 40, n))
+    speed = rng.lognormal(3, 0.5, n)
+    speed[rng.random(n) < 0.05] = np.nan
+    return pd.DataFrame({"buffer_id": groups, "speed": speed})
+
+
+def _sketch(df, **options):
+    return QuantileSketch.from_values(GroupIndex(df, ["buffer_id"]), df, df["speed"], **options)
+
+
+def test_small_groups_are_exact_and_large_groups_are_compressed():
+    df = _trips()
+    sketch = _sketch(df, compression=100, exact_threshold=1000)
+    expected = df.groupby("buffer_id")["speed"].quantile(QUANTILES).unstack().to_numpy()
+    result = sketch.quantiles(QUANTILES)
+
+    counts = sketch.counts()
+    small = counts <= 1000
+    np.testing.assert_allclose(result[small], expected[small])
+    assert np.bincount(sketch.groups)[~small].max() <= 100
+
+    for group in np.flatnonzero(~small):
+        values = np.sort(df.loc[df["buffer_id"] == group, "speed"].dropna().to_numpy())
+        ranks = np.searchsorted(values, result[group]) / len(values)
+        np.testing.assert_allclose(ranks, QUANTILES, atol=0.005)
+
+
+def test_sketches_merge_across_chunks():
+    df = _trips()
+    whole = _sketch(df, compression=100, exact_threshold=1000)
+    chunks = [df.iloc[i::3] for i in range(3)]
+    merged = QuantileSketch.merge_all(_sketch(chunk, compression=100, exact_threshold=1000) for chunk in chunks)
+
+    assert merged.keys["buffer_id"].tolist() == whole.keys["buffer_id"].tolist()
+    np.testing.assert_allclose(merged.counts(), whole.counts())
+    small = whole.counts() <= 1000
+    np.testing.assert_allclose(merged.quantiles(QUANTILES)[small], whole.quantiles(QUANTILES)[small])
+    np.testing.assert_allclose(merged.quantiles(QUANTILES)[~small], whole.quantiles(QUANTILES)[~small], rtol=0.02)
+
+
+def test_hyperloglog_registers_merge_across_tiles_and_levels():
+    rng = np.random.default_rng(2)
+    n = 40000
+    df = pd.DataFrame({"cell": rng.integers(0, 8, n), "vehicle_id": rng.integers(0, 50000, n).astype(float)})
+    df.loc[df.index[:100], "vehicle_id"] = np.nan
+    whole = HyperLogLogSketch.from_values(GroupIndex(df, ["cell"]), df, df["vehicle_id"], precision=12)
+
+    tiles = [df.iloc[: n // 2], df.iloc[n // 2:].astype({"vehicle_id": "Int64"})]
+    merged = HyperLogLogSketch.merge_all(
+        HyperLogLogSketch.from_values(GroupIndex(tile, ["cell"]), tile, tile["vehicle_id"], precision=12) for tile in tiles)
+    np.testing.assert_array_equal(merged.registers, whole.registers)
+    np.testing.assert_array_equal(merged.ranks, whole.ranks)
+
+    exact = df.groupby("cell")["vehicle_id"].nunique().to_numpy()
+    assert (np.abs(whole.estimate() / exact - 1) <= 3 * whole.relative_error).all()
+
+    # Niveau supérieur de la pyramide : 4 mailles parentes de 2 mailles chacune
+    parent = whole.regroup(pd.DataFrame({"parent": whole.keys["cell"] // 2}))
+    exact_parent = df.groupby(df["cell"] // 2)["vehicle_id"].nunique().to_numpy()
+    assert parent.keys["parent"].tolist() == [0, 1, 2, 3]
+    assert (np.abs(parent.estimate() / exact_parent - 1) <= 3 * parent.relative_error).all()
+
+
+def test_hyperloglog_merges_chunks_mixing_integral_and_decimal_values():
+    chunks = [pd.DataFrame({"cell": [0, 0], "value": [1.0, 2.0]}),
+              pd.DataFrame({"cell": [0, 0], "value": [1.0, 2.5]}),
+              pd.DataFrame({"cell": [0, 0], "value": pd.array([2, 3], dtype="Int64")})]
+    merged = HyperLogLogSketch.merge_all(
+        HyperLogLogSketch.from_values(GroupIndex(chunk, ["cell"]), chunk, chunk["value"]) for chunk in chunks)
+    assert np.round(merged.estimate()).tolist() == [4]
@@ -0,0 +1,101 @@
+import os
+import pickle
+
+import numpy as np
+import osmnx as ox
+import pytest
+
+import utils.buffer.graph as graph
+import utils.buffer.network as network
+import utils.buffer.snapping as snapping
+
+
+@pytest.fixture
+def grid_graph(grid_osm_file):
+    return network.load_network_graph(grid_osm_file)
+
+
+def _random_points(G, n=200, seed=0):
+    xs = np.array([data["x"] for _, data in G.nodes(data=True)])
+    ys = np.array([data["y"] for _, data in G.nodes(data=True)])
+    rng = np.random.default_rng(seed)
+    return rng.uniform(xs.min(), xs.max(), n), rng.uniform(ys.min(), ys.max(), n)
+
+
+def test_snap_index_matches_osmnx(grid_graph):
+    X, Y = _random_points(grid_graph)
+    index = snapping.get_snap_index(grid_graph)
+
+    nodes, dist = index.nearest_nodes(X, Y, return_dist=True)
+    _, ox_dist = ox.distance.nearest_nodes(grid_graph, X, Y, return_dist=True)
+    np.testing.assert_allclose(dist, ox_dist)
+
+    _, edge_dist = index.nearest_edges(X, Y, return_dist=True)
+    _, ox_edge_dist = ox.distance.nearest_edges(grid_graph, X, Y, return_dist=True)
+    np.testing.assert_allclose(edge_dist, ox_edge_dist, atol=1e-6)
+
+    assert snapping.get_snap_index(grid_graph) is index
+
+
+def test_snap_index_rebuilt_for_clipped_graph(grid_graph):
+    X, Y = _random_points(grid_graph, n=3)
+    full_index = snapping.get_snap_index(grid_graph)
+    origins = network.gpd.GeoSeries(network.gpd.points_from_xy(X, Y), crs=grid_graph.graph["crs"])
+
+    clipped = graph.clip_graph(grid_graph, origins, 150)
+
+    clipped_index = snapping.get_snap_index(clipped)
+    assert clipped_index is not full_index
+    assert len(clipped_index.nodes) == clipped.number_of_nodes()
+
+
+def test_snap_results_cached_per_layer(grid_graph, tmp_path, monkeypatch):
+    X, Y = _random_points(grid_graph)
+    cache_dir = tmp_path / "snapping"
+    nodes, dist = snapping.snap_to_nodes(grid_graph, X, Y, cache_dir=str(cache_dir))
+    assert len(list(cache_dir.iterdir())) == 1
+
+    def fail(*args, **kwargs):
+        raise AssertionError("snapping should be read from the cache")
+    monkeypatch.setattr(snapping.SnapIndex, "nearest_nodes", fail)
+
+    cached_nodes, cached_dist = snapping.snap_to_nodes(grid_graph, X, Y, cache_dir=str(cache_dir))
+    np.testing.assert_array_equal(cached_nodes, nodes)
+    np.testing.assert_array_equal(cached_dist, dist)
+
+
+def test_unpickled_index_reattached_only_to_its_own_graph(grid_graph):
+    index = pickle.loads(pickle.dumps(snapping.get_snap_index(grid_graph)))
+    # Même nombre de nœuds, coordonnées décalées : l'index ne doit pas être réutilisé
+    moved = grid_graph.copy()
+    for _, data in moved.nodes(data=True):
+        data["x"] += 500
+    assert not index.matches(moved)
+    assert index.matches(grid_graph)
+
+
+def test_snap_cache_keeps_the_most_recent_layers(grid_graph, tmp_path, monkeypatch):
+    monkeypatch.setattr(snapping, "SNAP_CACHE_MAX_ENTRIES", 2)
+    cache_dir = tmp_path / "snapping"
+    for seed in range(4):
+        snapping.snap_to_nodes(grid_graph, *_random_points(grid_graph, n=5, seed=seed), cache_dir=str(cache_dir))
+    assert len(list(cache_dir.glob("*.npz"))) == 2 and not list(cache_dir.glob("*.tmp"))
+
+
+def test_snap_cache_entry_deleted_by_another_job_is_recomputed(grid_graph, tmp_path, monkeypatch):
+    X, Y = _random_points(grid_graph)
+    cache_dir = tmp_path / "snapping"
+    nodes, dist = snapping.snap_to_nodes(grid_graph, X, Y, cache_dir=str(cache_dir))
+
+    # Le _prune d'une autre tâche supprime l'entrée au moment de la lecture
+    load = np.load
+
+    def deleted(path, *args, **kwargs):
+        os.remove(path)
+        return load(path, *args, **kwargs)
+
+    monkeypatch.setattr(snapping.np, "load", deleted)
+    recomputed_nodes, recomputed_dist = snapping.snap_to_nodes(grid_graph, X, Y, cache_dir=str(cache_dir))
+    np.testing.assert_array_equal(recomputed_nodes, nodes)
+    np.testing.assert_array_equal(recomputed_dist, dist)
+    assert len(list(cache_dir.glob("*.npz"))) == 1
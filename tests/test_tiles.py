@@ -0,0 +1,150 @@
+import os
+import struct
+
+import geopandas as gpd
+import numpy as np
+import pytest
+from shapely.geometry import Point, Polygon
+
+from utils.visualisation.tiles import EXTENT, VectorTileCache, tile_bounds
+
+
+def _tile_of(lon, lat, z):
+    n = 2 ** z
+    x = int((lon + 180) / 360 * n)
+    y = int((1 - np.arcsinh(np.tan(np.radians(lat))) / np.pi) / 2 * n)
+    return z, x, y
+
+
+def _fields(data):
+    """Champs (numéro, valeur) d'un message protobuf : varint, fixed64 ou bytes."""
+    i = 0
+    while i < len(data):
+        key, i = _read_varint(data, i)
+        number, wire_type = key >> 3, key & 7
+        if wire_type == 0:
+            value, i = _read_varint(data, i)
+        elif wire_type == 1:
+            value, i = struct.unpack("<d", data[i:i + 8])[0], i + 8
+        else:
+            length, i = _read_varint(data, i)
+            value, i = data[i:i + length], i + length
+        yield number, value
+
+
+def _read_varint(data, i):
+    value = shift = 0
+    while True:
+        byte = data[i]
+        i += 1
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if byte < 0x80:
+            return value, i
+
+
+def _packed(data):
+    values, i = [], 0
+    while i < len(data):
+        value, i = _read_varint(data, i)
+        values.append(value)
+    return values
+
+
+def _unzigzag(value):
+    return (value >> 1) ^ -(value & 1)
+
+
+def _decode_geometry(commands):
+    """Chemins (listes de points en coordonnées de tuile) d'une géométrie MVT."""
+    paths, x, y, i = [], 0, 0, 0
+    while i < len(commands):
+        command, count = commands[i] & 7, commands[i] >> 3
+        i += 1
+        if command == 7:
+            continue
+        if command == 1:
+            paths.append([])
+        for _ in range(count):
+            x, y = x + _unzigzag(commands[i]), y + _unzigzag(commands[i + 1])
+            i += 2
+            paths[-1].append((x, y))
+    return paths
+
+
+def decode_tile(data):
+    layers = {}
+    for _, layer_data in _fields(data):
+        layer = dict(_fields(layer_data))
+        fields = list(_fields(layer_data))
+        keys = [value.decode() for number, value in fields if number == 3]
+        values = []
+        for _, value_data in (field for field in fields if field[0] == 4):
+            (number, value), = _fields(value_data)
+            values.append(value.decode() if number == 1 else _unzigzag(value) if number == 6
+                          else bool(value) if number == 7 else value)
+        features = []
+        for _, feature_data in (field for field in fields if field[0] == 2):
+            feature = dict(_fields(feature_data))
+            tags = _packed(feature.get(2, b""))
+            features.append({"id": feature[1], "type": feature[3], "paths": _decode_geometry(_packed(feature[4])),
+                             "properties": {keys[k]: values[v] for k, v in zip(tags[::2], tags[1::2])}})
+        layers[layer[1].decode()] = {"version": layer[15], "extent": layer[5], "features": features}
+    return layers
+
+
+def _signed_area(path):
+    x, y = np.array(path, dtype=float).T
+    return (np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y)) / 2
+
+
+def _write_layer(path):
+    ring = [(-73.58, 45.49), (-73.56, 45.49), (-73.56, 45.51), (-73.58, 45.51)]
+    hole = [(-73.575, 45.495), (-73.575, 45.505), (-73.565, 45.505), (-73.565, 45.495)]
+    gdf = gpd.GeoDataFrame({"name": ["zone", "arret"], "count": [-3, 7], "share": [0.25, np.nan], "open": [True, False]},
+                           geometry=[Polygon(ring, [hole]), Point(-73.57, 45.50)], crs="EPSG:4326")
+    gdf.to_file(path, driver="GeoJSON")
+
+
+def test_tiles_encode_clipped_quantized_features_with_attributes(tmp_path):
+    path = str(tmp_path / "zones.geojson")
+    _write_layer(path)
+    cache = VectorTileCache(root=str(tmp_path / "tiles"))
+
+    layer = decode_tile(cache.tile("zones", path, *_tile_of(-73.57, 45.50, 14)))["zones"]
+    assert (layer["version"], layer["extent"]) == (2, EXTENT)
+    polygon, point = sorted(layer["features"], key=lambda feature: feature["type"], reverse=True)
+    assert polygon["properties"] == {"name": "zone", "count": -3, "share": 0.25, "open": True}
+    assert point["properties"] == {"name": "arret", "count": 7, "open": False}
+    assert (point["type"], polygon["type"]) == (1, 3)
+
+    # Extérieur d'aire positive, trou d'aire négative ; coordonnées entières dans la tuile et sa marge
+    exterior, interior = polygon["paths"]
+    assert _signed_area(exterior) > 0 > _signed_area(interior)
+    assert all(-64 <= x <= EXTENT + 64 and -64 <= y <= EXTENT + 64 for x, y in exterior + interior)
+
+    # Tuile voisine vide, tuile hors grille refusée
+    z, x, y = _tile_of(-73.57, 45.50, 14)
+    assert cache.tile("zones", path, z, x + 10, y) == b""
+    with pytest.raises(ValueError):
+        tile_bounds(z, 2 ** z, y)
+
+
+def test_tiles_are_cached_on_disk_and_invalidated_by_a_new_layer(tmp_path):
+    path = str(tmp_path / "zones.geojson")
+    _write_layer(path)
+    root = tmp_path / "tiles"
+    cache = VectorTileCache(root=str(root))
+    z, x, y = _tile_of(-73.57, 45.50, 12)
+
+    first = cache.tile("zones", path, z, x, y)
+    assert VectorTileCache(root=str(root)).tile("zones", path, z, x, y) == first
+    assert cache.stats()["misses"] == 1
+    old_key = cache.layer_key(path)
+    assert os.listdir(root / "zones") == [old_key]
+
+    # Couche réécrite (nouvelle exécution du pipeline) : nouvelle empreinte, anciennes tuiles supprimées
+    gpd.GeoDataFrame({"name": ["seul"]}, geometry=[Point(-73.57, 45.50)], crs="EPSG:4326").to_file(path, driver="GeoJSON")
+    layer = decode_tile(cache.tile("zones", path, z, x, y))["zones"]
+    assert [feature["properties"] for feature in layer["features"]] == [{"name": "seul"}]
+    assert os.listdir(root / "zones") == [cache.layer_key(path)] != [old_key]
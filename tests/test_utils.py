@@ -1,50 +1,53 @@
+import json
+
+import geopandas as gpd
+import pandas as pd
 import pytest
-import mimetypes
-from src.utils import file_type
-
-def test_read_txt_success(tmpdir):
-    file_path = tmpdir.join("test.txt")
-    file_path.write("Hello, World!")
-    
-    result = file_type(str(file_path))
-    assert result["content"] == b"Hello, World!"
-    assert result["file_type"] == "text/plain"
-    assert result["encoding"] is None
-
-
-def test_read_geojson_success(tmpdir):
-    # Ajouter le type MIME pour les fichiers GeoJSON
-    mimetypes.add_type('application/geo+json', '.geojson')
-    
-    # Contenu GeoJSON exemple
-    geojson_content = '''
-    {
-        "type": "FeatureCollection",
-        "features": [
-            {
-                "type": "Feature",
-                "geometry": {
-                    "type": "Point",
-                    "coordinates": [102.0, 0.5]
-                },
-                "properties": {
-                    "prop0": "value0"
-                }
-            }
-        ]
-    }
-    '''
-
-    file_path = tmpdir.join("test.geojson")
-    file_path.write(geojson_content)
-    
-    result = file_type(str(file_path))
-    assert result["content"] == geojson_content.encode()
-    assert result["file_type"] == "application/geo+json"
-    assert result["encoding"] is None
-
-
-def test_read_file_not_found():
-    result = file_type("non_existent_file.txt")
-    
-    assert result["error"] == "File not found"
\ No newline at end of file
+from shapely.geometry import LineString, Point
+
+import utils.utils as utils
+
+
+def _write_geojson(path, features):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as file:
+        json.dump({"type": "FeatureCollection", "features": features}, file)
+
+
+def _feature(geometry, **properties):
+    return {"type": "Feature", "properties": properties, "geometry": geometry}
+
+
+def test_load_files_to_gdf_converts_to_parquet_and_drops_invalid_geometries(tmp_path):
+    path = tmp_path / "geojson" / "zones.geojson"
+    bowtie = {"type": "Polygon", "coordinates": [[[0, 0], [1, 1], [1, 0], [0, 1], [0, 0]]]}
+    square = {"type": "Polygon", "coordinates": [[[0, 0], [1, 0], [1, 1], [0, 1], [0, 0]]]}
+    _write_geojson(path, [_feature(square, zone="a"), _feature(bowtie, zone="b"), _feature(None, zone="c")])
+
+    data_files = [{"name": "zones", "path": str(path)}, {"name": "sans_chemin"}]
+    gdfs = utils.load_files_to_gdf(data_files)
+
+    assert list(gdfs) == ["zones"]
+    assert gdfs["zones"]["zone"].tolist() == ["a"]
+    parquet_path = tmp_path / "parquet" / "zones.parquet"
+    assert parquet_path.exists()
+    # Relu depuis le cache Parquet
+    assert utils.load_files_to_gdf(data_files)["zones"]["zone"].tolist() == ["a"]
+
+
+def test_geometry_columns_are_detected_and_renamed():
+    df = pd.DataFrame({"geom": [Point(0, 0)], "name": ["a"]})
+    assert utils.check_geometry_column(df) == "geom"
+    assert list(utils.rename_geometry_column(df).columns) == ["geometry", "name"]
+    assert utils.check_geometry_column(pd.DataFrame({"name": ["a"]})) is None
+
+
+def test_geometry_type_and_crs_detection():
+    points = gpd.GeoDataFrame(geometry=[Point(-73.57, 45.5), Point(-73.56, 45.5)])
+    assert utils.check_geometry_type(points) == "Point"
+    assert utils.determine_crs(points) == "EPSG:4326"
+    assert utils.determine_crs(gpd.GeoDataFrame(geometry=[Point(300000, 5040000)])) == "EPSG:32188"
+
+    mixed = gpd.GeoDataFrame(geometry=[Point(0, 0), LineString([(0, 0), (1, 1)])])
+    with pytest.raises(ValueError):
+        utils.check_geometry_type(mixed)